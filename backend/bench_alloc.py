@@ -0,0 +1,130 @@
+"""Memory allocated by the main requests, measured with tracemalloc.
+
+For each scenario the request's work is run once while tracing, with the
+result kept alive, and reported as the blocks (objects and buffers) it left
+allocated, their size and the peak traced memory during the call:
+
+- load:  turn a stored 200-ply game into a GameState (GET /games/{id} on a cache miss)
+- turn:  a human move and the easy bot's reply (POST /games/{id}/moves in a 1P game)
+- legal: legal moves of every white piece (GET /games/{id}/legal-moves, 16 requests)
+
+Each scenario is measured twice: as a baseline that builds a new Square and
+Piece for every use, which is what happened before the shared instances, and
+with the shared ``models.SQUARES`` / ``models.PIECES``. The baseline swaps
+those tables (and the modules' references to them) for lookalikes that
+construct a fresh instance on each lookup.
+
+Run with ``python bench_alloc.py``.
+"""
+import gc
+import random
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, Tuple
+
+from pydantic import ValidationError
+
+import models
+from models import BotDifficulty, Piece, PieceColor, Square
+import bitboard
+import database
+import game_logic
+from database import SQLAlchemyDatabase
+from game_cache import CacheSettings
+from game_logic import get_legal_moves
+from bot import get_bot_move
+from turns import apply_turn, build_human_move
+from bench_load import build_rows
+
+
+class _FreshSquares:
+    """Stands in for SQUARES: a new Square per lookup"""
+
+    def __getitem__(self, index: int) -> Square:
+        return Square(row=index >> 3, col=index & 7)
+
+
+class _FreshPieces:
+    """Stands in for PIECES: a new Piece per lookup"""
+
+    def __getitem__(self, key) -> Piece:
+        return Piece(type=key[0], color=key[1])
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except ValidationError:
+            return default
+
+
+class _FreshPieceIndex:
+    """Stands in for bitboard._PIECES: a new Piece per piece index"""
+
+    def __getitem__(self, index: int) -> Piece:
+        return Piece(type=bitboard.PIECE_TYPES[index % 6], color=bitboard.COLORS[index // 6])
+
+
+@contextmanager
+def uninterned() -> Iterator[None]:
+    """Build squares and pieces per use, as before they were shared"""
+    patches = [(models, "SQUARES", _FreshSquares()), (models, "PIECES", _FreshPieces()),
+               (bitboard, "SQUARES", _FreshSquares()), (bitboard, "_PIECES", _FreshPieceIndex()),
+               (game_logic, "PIECES", _FreshPieces()), (database, "PIECES", _FreshPieces())]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in patches]
+    for module, name, value in patches:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+
+def measure(work: Callable[[], object]) -> Tuple[int, int, int]:
+    """(blocks still allocated, their bytes, peak bytes) for one call of work"""
+    work()  # warm caches first
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = work()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    del result
+    return (sum(stat.count_diff for stat in stats), sum(stat.size_diff for stat in stats), peak)
+
+
+def main() -> None:
+    rows = SQLAlchemyDatabase("sqlite://", CacheSettings(max_games=0))
+    db_game, db_moves = build_rows(rows, 200)
+    start = rows._to_pydantic_game(*build_rows(rows, 0))
+
+    def load():
+        return rows._to_pydantic_game(db_game, db_moves)
+
+    def turn():
+        random.seed(0)
+        move = build_human_move(start, Square(row=6, col=4), Square(row=4, col=4))
+        state = apply_turn(start, move, False)
+        reply = get_bot_move(state.board, state.current_turn, False, [], BotDifficulty.EASY)
+        return apply_turn(state, reply.move, reply.declare_take_me)
+
+    def legal():
+        return [get_legal_moves(start.board, Square(row=row, col=col))
+                for row in (6, 7) for col in range(8)
+                if start.board[row][col] and start.board[row][col].color == PieceColor.WHITE]
+
+    print(f"{'scenario':<8} {'':<9} {'blocks':>8} {'retained':>10} {'peak':>10}")
+    for name, work in (("load", load), ("turn", turn), ("legal", legal)):
+        with uninterned():
+            baseline = measure(work)
+        shared = measure(work)
+        for label, (blocks, retained, peak) in (("per use", baseline), ("shared", shared)):
+            print(f"{name:<8} {label:<9} {blocks:>8} {retained / 1024:>8.1f}KB {peak / 1024:>8.1f}KB")
+        ratios = [before / max(after, 1) for before, after in zip(baseline, shared)]
+        print(f"{name:<8} {'reduction':<9} {ratios[0]:>7.1f}x {ratios[1]:>9.1f}x {ratios[2]:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
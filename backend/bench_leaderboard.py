@@ -0,0 +1,101 @@
+"""Leaderboard reads with and without the in-memory top lists.
+
+Fills a temporary SQLite database with ``--rows`` leaderboard rows (1M by
+default), split between the two game modes. It then times
+``get_leaderboard``, overall and per mode, as a database query (cache
+disabled) and as a cache hit. Then it times recording one result (the upsert
+plus the update of the cached lists), a keyset page at the top and halfway
+down, and the rank lookup of the first and the last player.
+
+Run with ``python bench_leaderboard.py``.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import timeit
+from datetime import datetime
+
+from models import GameMode, LeaderboardEntry
+from database import SQLAlchemyDatabase
+from database_models import DBLeaderboard
+from game_cache import CacheSettings
+from leaderboard_cache import LeaderboardCacheSettings
+
+BATCH = 50_000
+
+
+def fill(path: str, rows: int) -> None:
+    """Write the rows straight through sqlite3, which is much faster than one upsert each"""
+    rng = random.Random(0)
+    now = datetime.utcnow().isoformat(" ")
+    modes = [GameMode.SINGLE_PLAYER.value, GameMode.TWO_PLAYER.value]
+    conn = sqlite3.connect(path)
+    for start in range(0, rows, BATCH):
+        conn.executemany(
+            "INSERT INTO leaderboard (player_name, game_mode, wins, losses, draws, score, last_played) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(f"player{i}", modes[i % 2], rng.randrange(1000), rng.randrange(1000), rng.randrange(100),
+              rng.randrange(10_000), now) for i in range(start, min(start + BATCH, rows))]
+        )
+    conn.commit()
+    conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark cached leaderboard reads")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--reads", type=int, default=200, help="reads timed per case")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'leaderboard.db')}"
+        uncached = SQLAlchemyDatabase(url, CacheSettings(max_games=0), LeaderboardCacheSettings(size=0))
+        fill(os.path.join(tmp, "leaderboard.db"), args.rows)
+        cached = SQLAlchemyDatabase(url, CacheSettings(max_games=0),
+                                    LeaderboardCacheSettings(size=100, ttl_seconds=3600))
+
+        print(f"{args.rows} rows")
+        print(f"{'read':<18} {'database':>12} {'cached':>12} {'speedup':>8}")
+        for game_mode in (None, GameMode.SINGLE_PLAYER, GameMode.TWO_PLAYER):
+            for limit in (10, 100):
+                assert cached.get_leaderboard(game_mode, limit) == uncached.get_leaderboard(game_mode, limit)
+                query = timeit.timeit(lambda: uncached.get_leaderboard(game_mode, limit),
+                                      number=args.reads) / args.reads
+                hit = timeit.timeit(lambda: cached.get_leaderboard(game_mode, limit),
+                                    number=args.reads) / args.reads
+                name = f"{game_mode.value if game_mode else 'all'} top {limit}"
+                print(f"{name:<18} {query * 1e6:>10.0f}us {hit * 1e6:>10.0f}us {query / hit:>7.0f}x")
+
+        entry = LeaderboardEntry(player_name="player1", wins=1, losses=0, draws=0, score=3,
+                                 game_mode=GameMode.TWO_PLAYER)
+        for name, database in (("record (no cache)", uncached), ("record (cached)", cached)):
+            write = timeit.timeit(lambda: database.add_leaderboard_entry(entry), number=args.reads) / args.reads
+            print(f"{name:<18} {write * 1e6:>10.0f}us")
+        assert cached.get_leaderboard(limit=100) == uncached.get_leaderboard(limit=100)
+
+        session = uncached.get_session()
+        try:
+            ordered = uncached._top_statement(None, 1).with_only_columns(
+                DBLeaderboard.player_name, DBLeaderboard.wins, DBLeaderboard.score, DBLeaderboard.id)
+            deep = session.execute(ordered.offset(args.rows // 2)).one()
+            top = session.execute(ordered).one()
+            bottom = session.execute(ordered.offset(args.rows - 1)).one()
+        finally:
+            session.close()
+        cases = (
+            ("first page", lambda: uncached.get_leaderboard_page(None, 100)),
+            ("page at 50%", lambda: uncached.get_leaderboard_page(None, 100, (deep.wins, deep.score, deep.id))),
+            ("rank of #1", lambda: uncached.get_player_rank(top.player_name)),
+            ("rank of last", lambda: uncached.get_player_rank(bottom.player_name)),
+        )
+        for name, work in cases:
+            elapsed = timeit.timeit(work, number=max(1, args.reads // 20)) / max(1, args.reads // 20)
+            print(f"{name:<18} {elapsed * 1e6:>10.0f}us")
+        uncached.engine.dispose()
+        cached.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Per-read cost of turning a stored game into a GameState.
+
+Compares the trusted load path (``_GameRows._to_pydantic_game``) with full
+Pydantic validation of the same row, which is what every read did before,
+for games with 0, 50 and 200 plies of history. Works on in-memory rows, so
+no database is touched.
+
+Run with ``python bench_load.py``.
+"""
+import argparse
+import json
+import timeit
+from typing import Sequence
+
+from models import BotDifficulty, GameState, Player, Square
+from database import SQLAlchemyDatabase
+from database_models import DBGame, DBMove
+from game_cache import CacheSettings
+from game_logic import count_positions
+from state_codec import decode_state, encode_state
+from turns import apply_turn, build_human_move
+
+# A knight shuffle back to the start; its plies are repeated to make any history length
+SHUFFLE = [((7, 6), (5, 5)), ((0, 6), (2, 5)), ((5, 5), (7, 6)), ((2, 5), (0, 6))]
+
+
+def build_rows(rows: SQLAlchemyDatabase, plies: int):
+    """A stored game row and its move rows after ``plies`` plies"""
+    db_game = rows._new_game_row([{"name": "White"}, {"name": "Black"}], BotDifficulty.EASY, None)
+    db_game.message = None
+    db_game.created_at = db_game.updated_at
+    start = rows._to_pydantic_game(db_game)
+    state = start
+    for from_, to in SHUFFLE:
+        move = build_human_move(state, Square(row=from_[0], col=from_[1]), Square(row=to[0], col=to[1]))
+        state = apply_turn(state, move, False)
+    # The loader does not replay moves, so the repetition rule can be ignored here
+    cycle = len(SHUFFLE)
+    state = start.model_copy(update={
+        "move_history": [state.move_history[ply % cycle] for ply in range(plies)],
+        "move_count": plies,
+        "position_history": start.position_history + [state.position_history[1 + ply % cycle]
+                                                       for ply in range(plies)],
+    })
+    # The move rows a save would insert, kept in memory instead of written
+    db_game.state_blob = encode_state(state.board, state.take_me_state)
+    db_game.move_count = state.move_count
+    db_moves = [DBMove(**values) for values in rows._new_move_values(state, 0)]
+    return db_game, db_moves
+
+
+def load_validated(db_game: DBGame, db_moves: Sequence[DBMove]) -> GameState:
+    """The fully validated load: every nested model is checked again"""
+    board, take_me_state, piece_count = decode_state(db_game.state_blob)
+    position_history = json.loads(db_game.position_history_json) + [m.position_hash for m in db_moves]
+    move_history = [json.loads(m.move_json) for m in db_moves]
+    winner = next((p for p in db_game.players if p.id == db_game.winner_id), None)
+    return GameState(
+        id=db_game.id,
+        board=board.model_dump(),
+        current_turn=db_game.current_turn,
+        players=[Player.model_validate(p) for p in db_game.players],
+        status=db_game.status,
+        winner=Player.model_validate(winner) if winner else None,
+        take_me_state=take_me_state.model_dump(),
+        move_history=move_history,
+        move_count=len(move_history),
+        position_history=position_history,
+        position_counts=count_positions(position_history),
+        piece_count=piece_count,
+        bot_difficulty=db_game.bot_difficulty,
+        bot_time_budget_ms=db_game.bot_time_budget_ms,
+        message=db_game.message,
+        version=db_game.version or 0,
+        created_at=db_game.created_at,
+        updated_at=db_game.updated_at
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark loading games from stored rows")
+    parser.add_argument("--plies", type=int, nargs="+", default=[0, 50, 200])
+    parser.add_argument("--reads", type=int, default=500, help="reads timed per history length")
+    args = parser.parse_args()
+
+    rows = SQLAlchemyDatabase("sqlite://", CacheSettings(max_games=0))
+    print(f"{'plies':>6} {'validated':>12} {'trusted':>12} {'speedup':>8}")
+    for plies in args.plies:
+        db_game, db_moves = build_rows(rows, plies)
+        assert rows._to_pydantic_game(db_game, db_moves) == load_validated(db_game, db_moves)
+        validated = timeit.timeit(lambda: load_validated(db_game, db_moves), number=args.reads) / args.reads
+        trusted = timeit.timeit(lambda: rows._to_pydantic_game(db_game, db_moves), number=args.reads) / args.reads
+        print(f"{plies:>6} {validated * 1e6:>10.0f}us {trusted * 1e6:>10.0f}us {validated / trusted:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""Bitboard move generation for Take-Me Chess.
+
+Squares are indexed as ``row * 8 + col``, so bit ``i`` of a mask is the square
+``(i // 8, i % 8)`` and iterating bits from low to high walks the board in the
+same row-major order as ``BoardState``. A position is a list of 12 masks, one
+per (color, piece type), indexed by ``color * 6 + piece_type``.
+
+Take-Me rules only: no castling, no en passant and kings are ordinary pieces.
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from models import PIECES, SQUARES, BoardState, Piece, PieceColor, PieceType, Square
+
+WHITE, BLACK = 0, 1
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+COLORS = (PieceColor.WHITE, PieceColor.BLACK)
+PIECE_TYPES = (PieceType.PAWN, PieceType.KNIGHT, PieceType.BISHOP,
+               PieceType.ROOK, PieceType.QUEEN, PieceType.KING)
+COLOR_INDEX = {color: i for i, color in enumerate(COLORS)}
+TYPE_INDEX = {ptype: i for i, ptype in enumerate(PIECE_TYPES)}
+
+FULL = (1 << 64) - 1
+
+# Ray directions as (row delta, col delta). The first four increase the
+# square index, so the nearest blocker on them is the lowest set bit.
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1),
+              (-1, 0), (0, -1), (-1, -1), (-1, 1))
+POSITIVE_DIRECTIONS = (True, True, True, True, False, False, False, False)
+ROOK_DIRECTIONS = (0, 1, 4, 5)
+BISHOP_DIRECTIONS = (2, 3, 6, 7)
+QUEEN_DIRECTIONS = tuple(range(8))
+
+PAWN_START_ROW = (6, 1)
+PAWN_PROMOTION_ROW = (0, 7)
+PAWN_DIRECTION = (-1, 1)
+
+
+def _on_board(row: int, col: int) -> bool:
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _step_table(deltas) -> Tuple[int, ...]:
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        for dr, dc in deltas:
+            if _on_board(row + dr, col + dc):
+                mask |= 1 << ((row + dr) * 8 + col + dc)
+        table.append(mask)
+    return tuple(table)
+
+
+def _ray_table(dr: int, dc: int) -> Tuple[int, ...]:
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        r, c = row + dr, col + dc
+        while _on_board(r, c):
+            mask |= 1 << (r * 8 + c)
+            r += dr
+            c += dc
+        table.append(mask)
+    return tuple(table)
+
+
+KNIGHT_ATTACKS = _step_table([(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                              (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _step_table([(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1)
+                            if dr or dc])
+# Diagonal capture squares and single pushes, indexed [color][square]
+PAWN_ATTACKS = (_step_table([(-1, -1), (-1, 1)]), _step_table([(1, -1), (1, 1)]))
+PAWN_PUSHES = (_step_table([(-1, 0)]), _step_table([(1, 0)]))
+RAYS = tuple(_ray_table(dr, dc) for dr, dc in DIRECTIONS)
+
+
+def piece_index(color: int, ptype: int) -> int:
+    """Index of the (color, piece type) mask in a bitboard list"""
+    return color * 6 + ptype
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Yield the square index of every set bit, lowest first"""
+    while mask:
+        lsb = mask & -mask
+        yield lsb.bit_length() - 1
+        mask ^= lsb
+
+
+def square_index(square: Square) -> int:
+    return square.row * 8 + square.col
+
+
+def index_square(index: int) -> Square:
+    return SQUARES[index]
+
+
+def squares_to_mask(squares) -> int:
+    mask = 0
+    for square in squares:
+        mask |= 1 << (square.row * 8 + square.col)
+    return mask
+
+
+def mask_to_squares(mask: int) -> List[Square]:
+    """Convert a mask to Squares in row-major order (API boundary only)"""
+    return [index_square(sq) for sq in iter_bits(mask)]
+
+
+def from_board(board: BoardState) -> List[int]:
+    """Build the 12 piece masks for a BoardState"""
+    bbs = [0] * 12
+    for row in range(8):
+        for col, piece in enumerate(board[row]):
+            if piece:
+                bbs[COLOR_INDEX[piece.color] * 6 + TYPE_INDEX[piece.type]] |= 1 << (row * 8 + col)
+    return bbs
+
+
+def occupancy(bbs: List[int], color: int) -> int:
+    base = color * 6
+    return (bbs[base] | bbs[base + 1] | bbs[base + 2]
+            | bbs[base + 3] | bbs[base + 4] | bbs[base + 5])
+
+
+def piece_at(bbs: List[int], sq: int) -> Optional[Tuple[int, int]]:
+    """Return (color, piece type) of the piece on a square, or None"""
+    bit = 1 << sq
+    for i in range(12):
+        if bbs[i] & bit:
+            return divmod(i, 6)
+    return None
+
+
+def slider_attacks(sq: int, occupied: int, directions) -> int:
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_DIRECTIONS[d]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+
+def attacks_from(ptype: int, color: int, sq: int, occupied: int) -> int:
+    """Squares a piece attacks, i.e. could capture on if an enemy stood there"""
+    if ptype == PAWN:
+        return PAWN_ATTACKS[color][sq]
+    if ptype == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if ptype == KING:
+        return KING_ATTACKS[sq]
+    if ptype == BISHOP:
+        return slider_attacks(sq, occupied, BISHOP_DIRECTIONS)
+    if ptype == ROOK:
+        return slider_attacks(sq, occupied, ROOK_DIRECTIONS)
+    return slider_attacks(sq, occupied, QUEEN_DIRECTIONS)
+
+
+def pawn_pushes(color: int, sq: int, occupied: int) -> int:
+    push = PAWN_PUSHES[color][sq] & ~occupied
+    if push and sq >> 3 == PAWN_START_ROW[color]:
+        push |= PAWN_PUSHES[color][push.bit_length() - 1] & ~occupied
+    return push
+
+
+def piece_targets(ptype: int, color: int, sq: int, own: int, enemy: int) -> int:
+    """Destination squares for one piece"""
+    if ptype == PAWN:
+        return (PAWN_ATTACKS[color][sq] & enemy) | pawn_pushes(color, sq, own | enemy)
+    return attacks_from(ptype, color, sq, own | enemy) & ~own
+
+
+def generate_moves(bbs: List[int], color: int, target_mask: int = FULL) -> List[Tuple[int, int]]:
+    """All (from, to) square index pairs for a color, restricted to target_mask"""
+    own = occupancy(bbs, color)
+    enemy = occupancy(bbs, color ^ 1)
+    moves = []
+    for ptype in range(6):
+        for sq in iter_bits(bbs[color * 6 + ptype]):
+            targets = piece_targets(ptype, color, sq, own, enemy) & target_mask
+            for to in iter_bits(targets):
+                moves.append((sq, to))
+    return moves
+
+
+def generate_captures(bbs: List[int], color: int) -> List[Tuple[int, int]]:
+    return generate_moves(bbs, color, occupancy(bbs, color ^ 1))
+
+
+def move_index(bbs: List[int], color: int, target_mask: int = FULL) -> Dict[int, int]:
+    """From square -> target mask for every piece of a color with a move landing in target_mask"""
+    own = occupancy(bbs, color)
+    enemy = occupancy(bbs, color ^ 1)
+    index = {}
+    for ptype in range(6):
+        for sq in iter_bits(bbs[color * 6 + ptype]):
+            targets = piece_targets(ptype, color, sq, own, enemy) & target_mask
+            if targets:
+                index[sq] = targets
+    return index
+
+
+def has_moves(bbs: List[int], color: int, target_mask: int = FULL) -> bool:
+    """Whether a color has any move landing in target_mask"""
+    own = occupancy(bbs, color)
+    enemy = occupancy(bbs, color ^ 1)
+    for ptype in range(6):
+        for sq in iter_bits(bbs[color * 6 + ptype]):
+            if piece_targets(ptype, color, sq, own, enemy) & target_mask:
+                return True
+    return False
+
+
+class AttackMap:
+    """Squares attacked by each color and by how many pieces, built in one pass"""
+
+    __slots__ = ("occupied", "attacked", "counts")
+
+    def __init__(self, bbs: List[int]):
+        self.occupied = [occupancy(bbs, WHITE), occupancy(bbs, BLACK)]
+        self.attacked = [0, 0]
+        self.counts = (bytearray(64), bytearray(64))
+        all_pieces = self.occupied[WHITE] | self.occupied[BLACK]
+        for color in (WHITE, BLACK):
+            counts = self.counts[color]
+            attacked = 0
+            for ptype in range(6):
+                for sq in iter_bits(bbs[color * 6 + ptype]):
+                    attacks = attacks_from(ptype, color, sq, all_pieces)
+                    attacked |= attacks
+                    for target in iter_bits(attacks):
+                        counts[target] += 1
+            self.attacked[color] = attacked
+
+    def attackers(self, color: int, sq: int) -> int:
+        """Number of pieces of a color attacking a square"""
+        return self.counts[color][sq]
+
+    def exposed(self, color: int) -> int:
+        """Pieces of a color that the other color can capture"""
+        return self.attacked[color ^ 1] & self.occupied[color]
+
+    def capturable(self, attacker: int) -> int:
+        """Enemy pieces the attacking color can capture"""
+        return self.attacked[attacker] & self.occupied[attacker ^ 1]
+
+
+# Shared Piece per piece index
+_PIECES = tuple(PIECES[(PIECE_TYPES[index % 6], COLORS[index // 6])] for index in range(12))
+
+
+def to_piece(color: int, ptype: int) -> Piece:
+    return _PIECES[color * 6 + ptype]
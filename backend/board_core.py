@@ -0,0 +1,158 @@
+"""Compact mutable board used by the engine and the bot.
+
+The board is a 64-entry bytearray of piece codes (0 for empty, otherwise
+``bitboard.piece_index(color, type) + 1``) kept in sync with the 12 bitboards
+and an incremental Zobrist key. ``make_move``/``unmake_move`` work in place
+with an undo stack, so search and validation never allocate Pydantic objects;
+conversion to ``BoardState`` happens only when persisting or responding.
+"""
+from typing import Dict, List, Optional, Tuple
+from models import BoardState, Piece, PieceColor
+import bitboard
+import zobrist
+
+EMPTY = 0
+
+
+def piece_code(color: int, ptype: int) -> int:
+    return color * 6 + ptype + 1
+
+
+def code_color(code: int) -> int:
+    return (code - 1) // 6
+
+
+def code_type(code: int) -> int:
+    return (code - 1) % 6
+
+
+class CompactBoard:
+    __slots__ = ("squares", "bbs", "turn", "key", "_undo")
+
+    def __init__(self, squares: bytearray, turn: int = bitboard.WHITE):
+        self.squares = squares
+        self.turn = turn
+        self.bbs = [0] * 12
+        for sq, code in enumerate(squares):
+            if code:
+                self.bbs[code - 1] |= 1 << sq
+        self.key = zobrist.hash_bitboards(self.bbs, turn, False)
+        self._undo: List[Tuple[int, int, int, int, int]] = []
+
+    @classmethod
+    def from_board_state(cls, board: BoardState, turn: PieceColor = PieceColor.WHITE) -> "CompactBoard":
+        squares = bytearray(64)
+        for row in range(8):
+            for col, piece in enumerate(board[row]):
+                if piece:
+                    squares[row * 8 + col] = piece_code(bitboard.COLOR_INDEX[piece.color],
+                                                        bitboard.TYPE_INDEX[piece.type])
+        return cls(squares, bitboard.COLOR_INDEX[turn])
+
+    def to_board_state(self) -> BoardState:
+        return BoardState(root=[
+            [self.piece(row * 8 + col) for col in range(8)]
+            for row in range(8)
+        ])
+
+    def copy(self) -> "CompactBoard":
+        """Copy the position; the undo stack is not carried over"""
+        clone = CompactBoard.__new__(CompactBoard)
+        clone.squares = bytearray(self.squares)
+        clone.bbs = self.bbs[:]
+        clone.turn = self.turn
+        clone.key = self.key
+        clone._undo = []
+        return clone
+
+    def piece(self, sq: int) -> Optional[Piece]:
+        code = self.squares[sq]
+        if not code:
+            return None
+        return bitboard.to_piece(code_color(code), code_type(code))
+
+    def occupancy(self, color: int) -> int:
+        return bitboard.occupancy(self.bbs, color)
+
+    def piece_count(self, color: int) -> int:
+        return bitboard.occupancy(self.bbs, color).bit_count()
+
+    def generate_moves(self, target_mask: int = bitboard.FULL) -> List[Tuple[int, int]]:
+        """(from, to) pairs for the side to move"""
+        return bitboard.generate_moves(self.bbs, self.turn, target_mask)
+
+    def generate_captures(self) -> List[Tuple[int, int]]:
+        return bitboard.generate_captures(self.bbs, self.turn)
+
+    def move_index(self, target_mask: int = bitboard.FULL) -> Dict[int, int]:
+        """From square -> target mask for the side to move"""
+        return bitboard.move_index(self.bbs, self.turn, target_mask)
+
+    def has_moves(self, target_mask: int = bitboard.FULL) -> bool:
+        return bitboard.has_moves(self.bbs, self.turn, target_mask)
+
+    def capture_mask(self, color: int) -> int:
+        """Enemy pieces that a color can capture right now"""
+        return bitboard.AttackMap(self.bbs).capturable(color)
+
+    def attack_map(self) -> bitboard.AttackMap:
+        return bitboard.AttackMap(self.bbs)
+
+    def make_move(self, from_sq: int, to_sq: int, promotion: int = -1) -> int:
+        """Play a move in place and return the captured piece code (0 if none).
+
+        ``promotion`` is the bitboard piece type the mover becomes on to_sq,
+        or -1 to keep the moving piece as it is.
+        """
+        squares = self.squares
+        bbs = self.bbs
+        moved = squares[from_sq]
+        captured = squares[to_sq]
+        placed = moved if promotion < 0 else piece_code(code_color(moved), promotion)
+
+        self._undo.append((from_sq, to_sq, moved, captured, self.key))
+
+        bbs[moved - 1] ^= 1 << from_sq
+        if captured:
+            bbs[captured - 1] ^= 1 << to_sq
+        bbs[placed - 1] |= 1 << to_sq
+        squares[from_sq] = EMPTY
+        squares[to_sq] = placed
+
+        self.key ^= zobrist.move_delta(moved - 1, from_sq, to_sq, placed - 1, captured - 1)
+        self.turn ^= 1
+        return captured
+
+    def unmake_move(self) -> None:
+        from_sq, to_sq, moved, captured, key = self._undo.pop()
+        squares = self.squares
+        bbs = self.bbs
+        placed = squares[to_sq]
+
+        bbs[placed - 1] ^= 1 << to_sq
+        if captured:
+            bbs[captured - 1] |= 1 << to_sq
+        bbs[moved - 1] |= 1 << from_sq
+        squares[to_sq] = captured
+        squares[from_sq] = moved
+
+        self.key = key
+        self.turn ^= 1
+
+    def is_promotion(self, from_sq: int, to_sq: int) -> bool:
+        code = self.squares[from_sq]
+        return (code_type(code) == bitboard.PAWN
+                and to_sq >> 3 == bitboard.PAWN_PROMOTION_ROW[code_color(code)])
+
+
+def initial_board() -> CompactBoard:
+    """The standard starting position, white to move"""
+    squares = bytearray(64)
+    back_rank = (bitboard.ROOK, bitboard.KNIGHT, bitboard.BISHOP, bitboard.QUEEN,
+                 bitboard.KING, bitboard.BISHOP, bitboard.KNIGHT, bitboard.ROOK)
+    for col, ptype in enumerate(back_rank):
+        squares[col] = bitboard.piece_index(bitboard.BLACK, ptype) + 1
+        squares[8 + col] = bitboard.piece_index(bitboard.BLACK, bitboard.PAWN) + 1
+        squares[48 + col] = bitboard.piece_index(bitboard.WHITE, bitboard.PAWN) + 1
+        squares[56 + col] = bitboard.piece_index(bitboard.WHITE, ptype) + 1
+    return CompactBoard(squares, bitboard.WHITE)
@@ -2,9 +2,14 @@ import random
 from typing import List, Optional, Tuple
 from models import (
     BoardState, PieceColor, Square, Move, Piece, PieceType,
-    BotMoveResponse
+    BotMoveResponse, BotDifficulty
 )
-from game_logic import get_legal_moves, execute_move, should_promote, get_capture_moves
+from game_logic import should_promote
+import bitboard
+from board_core import CompactBoard
+from search import SearchLimits, TranspositionTable, expand_moves, search
+from tablebase import get_tablebase
+from opening_book import get_opening_book
 
 
 def generate_bot_name() -> str:
@@ -23,78 +28,108 @@ def generate_bot_avatar() -> str:
     return random.choice(avatars)
 
 
+# Search limits per difficulty so the CPU cost and latency of a bot turn are
+# bounded. The time budget can be overridden per game. EASY keeps the
+# original random strategy.
+DIFFICULTY_LIMITS = {
+    BotDifficulty.MEDIUM: SearchLimits(depth=3, node_budget=20_000, time_budget_ms=250),
+    BotDifficulty.HARD: SearchLimits(depth=8, node_budget=150_000, time_budget_ms=1000),
+}
+
+# Shared per process; entries from earlier moves are aged out by generation
+_transposition_table = TranspositionTable()
+
+
+def bot_limits(difficulty: BotDifficulty, time_budget_ms: Optional[int] = None) -> SearchLimits:
+    """Search limits for a difficulty, with an optional per-game time budget"""
+    limits = DIFFICULTY_LIMITS[difficulty]
+    if time_budget_ms is not None:
+        limits = limits._replace(time_budget_ms=time_budget_ms)
+    return limits
+
+
 def get_bot_move(
     board: BoardState,
     color: PieceColor,
     must_capture: bool = False,
-    capturable_pieces: List[Square] = []
+    capturable_pieces: List[Square] = [],
+    difficulty: BotDifficulty = BotDifficulty.EASY,
+    time_budget_ms: Optional[int] = None
 ) -> Optional[BotMoveResponse]:
     """
     Get a bot move for Take-Me Chess.
     Strategy: Try to give away pieces (opposite of normal chess!)
     """
-    possible_moves = []
-
-    # Get all pieces of the bot's color
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece and piece.color == color:
-                moves = get_legal_moves(board, Square(row=row, col=col))
+    core = CompactBoard.from_board_state(board, color)
 
-                # Filter moves if must capture
-                if must_capture:
-                    moves = [move for move in moves
-                            if any(cp.row == move.row and cp.col == move.col
-                                  for cp in capturable_pieces)]
+    if difficulty in DIFFICULTY_LIMITS:
+        return get_search_move(core, must_capture, bot_limits(difficulty, time_budget_ms))
 
-                for move in moves:
-                    possible_moves.append((Square(row=row, col=col), move))
+    # Filter moves if must capture
+    target_mask = bitboard.squares_to_mask(capturable_pieces) if must_capture else bitboard.FULL
+    possible_moves = core.generate_moves(target_mask)
 
     if not possible_moves:
         return None
 
     # Choose a move - prefer captures (since we want to lose pieces)
-    captures = []
-    non_captures = []
-
-    for from_square, to_square in possible_moves:
-        target = board[to_square.row][to_square.col]
-        if target and target.color != color:
-            captures.append((from_square, to_square))
-        else:
-            non_captures.append((from_square, to_square))
+    enemy = core.occupancy(core.turn ^ 1)
+    captures = [m for m in possible_moves if enemy >> m[1] & 1]
+    non_captures = [m for m in possible_moves if not enemy >> m[1] & 1]
 
     # Prefer captures if available
     move_pool = captures if captures else non_captures
 
     # Randomly select from available moves
-    from_square, to_square = random.choice(move_pool)
-
-    # Create the move
-    piece = board[from_square.row][from_square.col]
-    captured_piece = board[to_square.row][to_square.col] if board[to_square.row][to_square.col] else None
-
-    move = Move(
-        from_=from_square,
-        to=to_square,
-        piece=piece,
-        captured_piece=captured_piece,
-        is_promotion=should_promote(piece, to_square.row),
-        promotion_piece=PieceType.QUEEN if should_promote(piece, to_square.row) else None
-    )
+    from_sq, to_sq = random.choice(move_pool)
+    promotion = bitboard.QUEEN if core.is_promotion(from_sq, to_sq) else -1
 
     # Decide whether to declare Take Me!
-    # Bot declares if it has exposed pieces after the move
-    from game_logic import find_exposed_pieces, get_capturable_pieces_after_take_me
-
-    # Simulate the move
-    new_board = execute_move(board, move)
     # Bot declares if the OPPONENT can capture its pieces after the move
-    opponent_color = PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
-    capturable_by_opponent = get_capturable_pieces_after_take_me(new_board, opponent_color)
+    core.make_move(from_sq, to_sq, promotion)
+    declare_take_me = bool(core.capture_mask(core.turn))
+    core.unmake_move()
+
+    return BotMoveResponse(move=core_move_to_model(core, from_sq, to_sq, promotion),
+                           declare_take_me=declare_take_me)
+
+
+def get_search_move(core: CompactBoard, must_capture: bool, limits: SearchLimits) -> Optional[BotMoveResponse]:
+    """Pick a move with alpha-beta search. While must_capture is set only captures are searched."""
+    book = get_opening_book()
+    if book is not None:
+        # Opening positions are answered from the book, weighted so play still varies
+        move = book.choose(core, must_capture)
+        if move is not None and (move.from_sq, move.to_sq, move.promotion) in expand_moves(core, must_capture):
+            return BotMoveResponse(move=core_move_to_model(core, move.from_sq, move.to_sq, move.promotion),
+                                   declare_take_me=move.declare, depth=0, nodes=0)
+
+    tablebase = get_tablebase()
+    if tablebase is not None:
+        # Endgames in the tablebase are played perfectly without searching
+        probed = tablebase.best_move(core, must_capture)
+        if probed is not None:
+            (from_sq, to_sq, promotion, declare), _ = probed
+            return BotMoveResponse(move=core_move_to_model(core, from_sq, to_sq, promotion),
+                                   declare_take_me=declare, depth=0, nodes=0)
+
+    result = search(core, limits.depth, must_capture, limits.node_budget, _transposition_table,
+                    limits.time_budget_ms, tablebase=tablebase)
+    if result.move is None:
+        return None
+    move = result.move
+    return BotMoveResponse(move=core_move_to_model(core, move.from_sq, move.to_sq, move.promotion),
+                           declare_take_me=move.declare, depth=result.depth, nodes=result.nodes)
 
-    # Declare if there are pieces that the opponent MUST capture
-    declare_take_me = len(capturable_by_opponent) > 0
 
-    return BotMoveResponse(move=move, declare_take_me=declare_take_me)
\ No newline at end of file
+def core_move_to_model(core: CompactBoard, from_sq: int, to_sq: int, promotion: int = -1) -> Move:
+    """Build the API Move for a move that has not been played on core yet"""
+    piece = core.piece(from_sq)
+    return Move(
+        from_=bitboard.index_square(from_sq),
+        to=bitboard.index_square(to_sq),
+        piece=piece,
+        captured_piece=core.piece(to_sq),
+        is_promotion=should_promote(piece, to_sq >> 3),
+        promotion_piece=bitboard.PIECE_TYPES[promotion] if promotion >= 0 else None
+    )
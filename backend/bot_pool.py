@@ -0,0 +1,151 @@
+"""Process-pool execution of bot searches.
+
+Search is CPU bound, so running it on the event-loop thread stalls every
+other request. When BOT_WORKERS is above zero, bot turns go to a shared
+ProcessPoolExecutor: the root moves are split round-robin across the workers,
+each worker runs iterative deepening on its share with its own transposition
+table, and the shares' results are compared (see ``best_share_move``). With
+BOT_WORKERS=0 (the default, and what the tests use) searches run in-process on
+a worker thread, so the event loop keeps serving other requests. Each worker
+maps the tablebase file itself; the pages are shared through the OS page cache.
+
+The server starts the pool in its lifespan, and workers are started with
+``forkserver`` (``spawn`` where that is unavailable), never forked from the
+multi-threaded server process.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Sequence, Tuple
+
+from models import BoardState, BotDifficulty, BotMoveResponse, PieceColor, Square
+from board_core import CompactBoard
+from bot import DIFFICULTY_LIMITS, bot_limits, core_move_to_model, get_bot_move
+from search import SearchLimits, SearchMove, SearchResult, TranspositionTable, expand_moves, search
+from tablebase import get_tablebase
+from opening_book import get_opening_book
+
+logger = logging.getLogger(__name__)
+
+_workers = int(os.getenv("BOT_WORKERS", "0"))
+_executor: Optional[ProcessPoolExecutor] = None
+
+# Per worker process
+_worker_tt = TranspositionTable()
+
+
+def configure_pool(workers: int) -> None:
+    """Set the pool size; 0 runs searches in-process. Restarts any existing pool."""
+    global _workers
+    shutdown_pool()
+    _workers = workers
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """The search pool, started on first use; the server starts it at startup instead"""
+    global _executor
+    if _executor is None and _workers > 0:
+        _executor = ProcessPoolExecutor(max_workers=_workers, mp_context=_mp_context())
+    return _executor
+
+
+def _mp_context() -> multiprocessing.context.BaseContext:
+    # Forking the multi-threaded server can leave children stuck on locks held by
+    # other threads (database pool, to_thread workers); forkserver starts them clean
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def shutdown_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _search_share(squares: bytes, turn: int, must_capture: bool,
+                  root_moves: List[tuple], limits: SearchLimits) -> SearchResult:
+    """Worker entry point: search a share of the root moves"""
+    core = CompactBoard(bytearray(squares), turn)
+    return search(core, limits.depth, must_capture, limits.node_budget, _worker_tt,
+                  limits.time_budget_ms, root_moves, get_tablebase())
+
+
+def best_share_move(results: Sequence[SearchResult]) -> Tuple[Optional[SearchMove], int]:
+    """(move, depth) of the best result across root shares.
+
+    Shares stop at different iterative-deepening depths, and a shallow score
+    is not comparable with a deeper one, so results are compared at the
+    deepest depth every share completed, using each share's best move and
+    score from that depth. Shares that completed no depth have no comparable
+    score and are left out; if none completed one, the first share's move is
+    used.
+    """
+    searched = [r for r in results if r.by_depth]
+    if not searched:
+        return next((r.move for r in results if r.move is not None), None), 0
+    depth = min(len(r.by_depth) for r in searched)
+    move, _ = max((r.by_depth[depth - 1] for r in searched), key=lambda entry: entry[1])
+    return move, depth
+
+
+async def _search_in_thread(*args) -> Optional[BotMoveResponse]:
+    # The shared transposition table stores whole tuples keyed by the full hash,
+    # so searches on concurrent threads can use it safely
+    return await asyncio.to_thread(get_bot_move, *args)
+
+
+async def compute_bot_move(
+    board: BoardState,
+    color: PieceColor,
+    must_capture: bool = False,
+    capturable_pieces: List[Square] = [],
+    difficulty: BotDifficulty = BotDifficulty.EASY,
+    time_budget_ms: Optional[int] = None
+) -> Optional[BotMoveResponse]:
+    """Get a bot move without blocking the event loop on search"""
+    args = (board, color, must_capture, capturable_pieces, difficulty, time_budget_ms)
+    executor = get_executor()
+    if executor is None or difficulty not in DIFFICULTY_LIMITS:
+        return await _search_in_thread(*args)
+
+    core = CompactBoard.from_board_state(board, color)
+    tablebase = get_tablebase()
+    book = get_opening_book()
+    if ((tablebase is not None and tablebase.probe(core, must_capture) is not None)
+            or (book is not None and book.moves(core, must_capture))):
+        # A book or tablebase lookup is cheaper than shipping the position to a worker
+        return await _search_in_thread(*args)
+
+    moves = expand_moves(core, must_capture)
+    if not moves:
+        return None
+
+    limits = bot_limits(difficulty, time_budget_ms)
+    shares = [moves[i::_workers] for i in range(_workers) if moves[i::_workers]]
+    if limits.node_budget is not None:
+        # Keep the total work per bot turn the same as a single-process search
+        limits = limits._replace(node_budget=max(limits.node_budget // len(shares), 1))
+
+    loop = asyncio.get_running_loop()
+    squares = bytes(core.squares)
+    try:
+        results = await asyncio.gather(*(
+            loop.run_in_executor(executor, _search_share, squares, core.turn, must_capture, share, limits)
+            for share in shares
+        ))
+    except BrokenProcessPool:
+        logger.exception("Bot worker pool failed; searching in-process")
+        shutdown_pool()
+        return await _search_in_thread(*args)
+
+    move, depth = best_share_move(results)
+    return BotMoveResponse(
+        move=core_move_to_model(core, move.from_sq, move.to_sq, move.promotion),
+        declare_take_me=move.declare,
+        depth=depth,
+        nodes=sum(r.nodes for r in results)
+    )
@@ -1,220 +1,970 @@
+import asyncio
+import inspect as pyinspect
+import logging
 import os
 import json
-from datetime import datetime
-from typing import Dict, List, Optional
-from sqlalchemy import create_engine, desc
-from sqlalchemy.orm import sessionmaker, Session
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from pydantic import TypeAdapter
+from sqlalchemy import (
+    Connection, Executable, Insert, Row, Select, case, create_engine, delete, event, func, insert, inspect, select,
+    text, tuple_, update
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import aliased, joinedload, sessionmaker, Session
 from dotenv import load_dotenv
 
 from models import (
-    GameState, LeaderboardEntry, Player, Piece, PieceColor,
-    PieceType, BoardState, TakeMeState, GameStatus, GameMode
+    GameState, LeaderboardEntry, Move, Player, PIECES, PieceColor,
+    PieceType, BoardState, TakeMeState, GameStatus, GameMode, BotDifficulty
 )
-from database_models import Base, DBGame, DBPlayer, DBLeaderboard
-from game_logic import get_board_hash
+from database_models import Base, DBArchivedGame, DBGame, DBMove, DBPlayer, DBLeaderboard
+from game_logic import get_position_hash, count_positions
+from game_archive import ArchiveSettings, decode_game, encode_game
+from game_cache import CacheSettings, GameCache, StaleGameError
+from leaderboard_cache import LeaderboardCache, LeaderboardCacheSettings, RankKey, RankedEntry, rank_key
+from state_codec import decode_state, encode_state
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./take_me_chess.db")
 
-class SQLAlchemyDatabase:
-    def __init__(self, db_url: str):
-        self.engine = create_engine(
-            db_url, 
-            connect_args={"check_same_thread": False} if db_url.startswith("sqlite") else {}
-        )
-        Base.metadata.create_all(bind=self.engine)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+# Stored moves are parsed and built in one pass by pydantic-core
+_MOVE_LIST = TypeAdapter(List[Move])
 
-    def get_session(self) -> Session:
-        return self.SessionLocal()
 
-    def clear_database(self):
-        """Reset database for testing. Dropping and re-creating all tables."""
-        Base.metadata.drop_all(bind=self.engine)
-        Base.metadata.create_all(bind=self.engine)
+def _moves_from_json(move_jsons: Iterable[str]) -> List[Move]:
+    return _MOVE_LIST.validate_json("[" + ",".join(move_jsons) + "]")
+
+
+def _add_missing_columns(conn: Connection) -> None:
+    """Add columns introduced after a table was first created (create_all only creates tables)"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+
+# Indexes replaced by later ones, dropped where an older database still has them
+_RETIRED_INDEXES = {"leaderboard": ("ix_leaderboard_wins", "ix_leaderboard_mode_wins")}
+
+
+def _add_missing_indexes(conn: Connection) -> None:
+    """Create indexes introduced after a table was first created"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {i["name"] for i in inspector.get_indexes(table.name)}
+        for name in _RETIRED_INDEXES.get(table.name, ()):
+            if name in existing:
+                conn.execute(text(f"DROP INDEX {name}"))
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if table.name == DBLeaderboard.__tablename__ and index.unique:
+                _merge_duplicate_leaderboard_rows(conn)
+            index.create(conn)
+
+
+def _merge_duplicate_leaderboard_rows(conn: Connection) -> None:
+    """Collapse rows for the same player and mode, which the old read-then-write could create"""
+    key = (DBLeaderboard.player_name, DBLeaderboard.game_mode)
+    duplicates = conn.execute(
+        select(
+            *key,
+            func.sum(DBLeaderboard.wins).label("wins"),
+            func.sum(DBLeaderboard.losses).label("losses"),
+            func.sum(DBLeaderboard.draws).label("draws"),
+            func.sum(DBLeaderboard.score).label("score"),
+            func.max(DBLeaderboard.last_played).label("last_played"),
+        ).group_by(*key).having(func.count() > 1)
+    ).all()
+    for row in duplicates:
+        conn.execute(delete(DBLeaderboard).where(DBLeaderboard.player_name == row.player_name,
+                                                 DBLeaderboard.game_mode == row.game_mode))
+        conn.execute(insert(DBLeaderboard).values(**row._mapping))
+
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+class _GameRows:
+    """Conversion between GameState and the ORM rows, shared by the sync and async backends"""
 
     def _create_initial_board(self) -> BoardState:
         """Create the initial chess board setup"""
         board = [[None for _ in range(8)] for _ in range(8)]
         for col in range(8):
-            board[1][col] = Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
-            board[6][col] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+            board[1][col] = PIECES[(PieceType.PAWN, PieceColor.BLACK)]
+            board[6][col] = PIECES[(PieceType.PAWN, PieceColor.WHITE)]
         piece_order = [PieceType.ROOK, PieceType.KNIGHT, PieceType.BISHOP,
                       PieceType.QUEEN, PieceType.KING, PieceType.BISHOP,
                       PieceType.KNIGHT, PieceType.ROOK]
         for col in range(8):
-            board[0][col] = Piece(type=piece_order[col], color=PieceColor.BLACK)
-            board[7][col] = Piece(type=piece_order[col], color=PieceColor.WHITE)
+            board[0][col] = PIECES[(piece_order[col], PieceColor.BLACK)]
+            board[7][col] = PIECES[(piece_order[col], PieceColor.WHITE)]
         return BoardState(root=board)
 
-    def create_game(self, game_mode: GameMode, players_data: List[Dict]) -> GameState:
-        session = self.get_session()
-        try:
-            game_id = f"game_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    def _new_game_row(self, players_data: List[Dict], bot_difficulty: BotDifficulty,
+                      bot_time_budget_ms: Optional[int]) -> DBGame:
+        game_id = f"game_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        
+        initial_board = self._create_initial_board()
+        db_game = DBGame(
+            id=game_id,
+            status=GameStatus.ACTIVE,
+            current_turn=PieceColor.WHITE,
+            state_blob=encode_state(initial_board, TakeMeState(declared=False, exposed_pieces=[], capturable_pieces=[], must_capture=False)),
+            move_history_json=json.dumps([]),
+            position_history_json=json.dumps([get_position_hash(initial_board, PieceColor.WHITE, False)]),
+            move_count=0,
+            version=1,
+            bot_difficulty=bot_difficulty,
+            bot_time_budget_ms=bot_time_budget_ms,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        )
+        
+        for i, player_data in enumerate(players_data):
+            color = PieceColor.WHITE if i == 0 else PieceColor.BLACK
+            is_bot = player_data.get("is_bot", False)
+            name = player_data["name"]
+            player_id = f"player_{game_id}_{i}"
+            if is_bot and name == "":
+                name = f"Bot_{player_id}"
             
-            initial_board = self._create_initial_board()
-            db_game = DBGame(
-                id=game_id,
-                status=GameStatus.ACTIVE,
-                current_turn=PieceColor.WHITE,
-                board_json=json.dumps(initial_board.root, default=lambda o: o.model_dump()),
-                take_me_state_json=json.dumps(TakeMeState(declared=False, exposed_pieces=[], capturable_pieces=[], must_capture=False).model_dump()),
-                move_history_json=json.dumps([]),
-                position_history_json=json.dumps([get_board_hash(initial_board, PieceColor.WHITE, False)]),
-                piece_count_json=json.dumps({"white": 16, "black": 16}),
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
+            db_player = DBPlayer(
+                id=player_id,
+                game_id=game_id,
+                name=name,
+                color=color,
+                is_bot=is_bot,
+                score=0
             )
-            
-            for i, player_data in enumerate(players_data):
-                color = PieceColor.WHITE if i == 0 else PieceColor.BLACK
-                is_bot = player_data.get("is_bot", False)
-                name = player_data["name"]
-                player_id = f"player_{game_id}_{i}"
-                if is_bot and name == "":
-                    name = f"Bot_{player_id}"
-                
-                db_player = DBPlayer(
-                    id=player_id,
-                    game_id=game_id,
-                    name=name,
-                    color=color,
-                    is_bot=is_bot,
-                    score=0
-                )
-                db_game.players.append(db_player)
-            
+            db_game.players.append(db_player)
+        return db_game
+
+    def _save_lookup(self, game_id: str) -> Select:
+        """What a save needs to know about the stored game: its ply count and player scores"""
+        return (select(DBGame.move_count, DBPlayer.id, DBPlayer.score)
+                .outerjoin(DBPlayer, DBPlayer.game_id == DBGame.id)
+                .where(DBGame.id == game_id))
+
+    def _save_statements(self, game_state: GameState, lookup: Sequence[Row],
+                         expected_version: Optional[int] = None) -> List[Tuple[Executable, Optional[List[Dict]]]]:
+        """(statement, parameters) writing a state over the stored game, given its _save_lookup rows.
+
+        At most three statements: the game row, the new plies in one insert,
+        and the players whose score changed in one update. The game row update
+        comes first and only matches while the stored version is
+        ``expected_version`` (the version the state was loaded at), or, when
+        that is unknown, is not newer than the state; the caller runs the rest
+        only if it matched a row.
+        """
+        if not lookup:
+            return []  # deleted meanwhile
+        stored = lookup[0].move_count
+        values = dict(
+            status=game_state.status,
+            current_turn=game_state.current_turn,
+            winner_id=game_state.winner.id if game_state.winner else None,
+            # Rows still holding the JSON board columns move to the binary encoding here
+            state_blob=encode_state(game_state.board, game_state.take_me_state),
+            board_json=None,
+            take_me_state_json=None,
+            piece_count_json=None,
+            message=game_state.message,
+            version=game_state.version,
+            move_count=game_state.move_count,
+            updated_at=datetime.utcnow()
+        )
+        if stored is None:
+            # Game from before the moves table: move its whole history over once
+            stored = 0
+            values.update(move_history_json=json.dumps([]),
+                          position_history_json=json.dumps(game_state.position_history[:1]))
+
+        stored_version = func.coalesce(DBGame.version, 0)
+        guard = (stored_version == expected_version if expected_version is not None
+                 else stored_version <= game_state.version)
+        statements = [(update(DBGame).where(DBGame.id == game_state.id, guard).values(**values), None)]
+        new_moves = self._new_move_values(game_state, stored)
+        if new_moves:
+            statements.append((insert(DBMove), new_moves))
+
+        stored_scores = {row.id: row.score for row in lookup if row.id is not None}
+        changed = {p.id: p.score for p in game_state.players
+                   if p.id in stored_scores and stored_scores[p.id] != p.score}
+        if changed:
+            statements.append((
+                update(DBPlayer).where(DBPlayer.id.in_(changed)).values(score=case(changed, value=DBPlayer.id)),
+                None
+            ))
+        return statements
+
+    def _new_move_values(self, game_state: GameState, stored: int) -> List[Dict]:
+        """moves rows for the plies after the first ``stored``"""
+        # move_history may be only the tail of the game; new plies are always in it
+        first_ply = game_state.move_count - len(game_state.move_history)
+        return [
+            dict(
+                game_id=game_state.id,
+                ply=ply,
+                move_json=game_state.move_history[ply - first_ply].model_dump_json(by_alias=True),
+                position_hash=game_state.position_history[ply + 1]
+            )
+            for ply in range(stored, game_state.move_count)
+        ]
+
+    def _load_statement(self, game_id: str) -> Select:
+        # Players come in the same query
+        return select(DBGame).where(DBGame.id == game_id).options(joinedload(DBGame.players))
+
+    def _moves_statement(self, game_id: str) -> Select:
+        return select(DBMove).where(DBMove.game_id == game_id).order_by(DBMove.ply)
+
+    def _moves_page(self, game_state: GameState, offset: int, limit: int) -> Tuple[List[Move], int]:
+        # Cached and archived states hold the full history
+        return game_state.move_history[offset:offset + limit], game_state.move_count
+
+    def _delete_statements(self, game_ids: Sequence[str]) -> List[Executable]:
+        """Delete games with their moves and players; the games delete comes last"""
+        return [
+            delete(DBMove).where(DBMove.game_id.in_(game_ids)),
+            delete(DBPlayer).where(DBPlayer.game_id.in_(game_ids)),
+            delete(DBGame).where(DBGame.id.in_(game_ids)),
+        ]
+
+    def _finished_batch_statement(self, cutoff: datetime, limit: int) -> Select:
+        """The oldest won or drawn games not updated since cutoff, with their players"""
+        return (select(DBGame).options(joinedload(DBGame.players))
+                .where(DBGame.status.in_([GameStatus.WIN, GameStatus.DRAW]), DBGame.updated_at < cutoff)
+                .order_by(DBGame.updated_at).limit(limit))
+
+    def _abandoned_batch_statement(self, cutoff: datetime, limit: int) -> Select:
+        """Ids of the oldest active games not updated since cutoff"""
+        return (select(DBGame.id).where(DBGame.status == GameStatus.ACTIVE, DBGame.updated_at < cutoff)
+                .order_by(DBGame.updated_at).limit(limit))
+
+    def _batch_moves_statement(self, game_ids: Sequence[str]) -> Select:
+        return select(DBMove).where(DBMove.game_id.in_(game_ids)).order_by(DBMove.game_id, DBMove.ply)
+
+    def _archive_values(self, db_games: Sequence[DBGame], db_moves: Sequence[DBMove]) -> List[Dict]:
+        """archived_games rows for a batch of finished games"""
+        moves = defaultdict(list)
+        for db_move in db_moves:
+            moves[db_move.game_id].append(db_move)
+        now = datetime.utcnow()
+        return [
+            dict(
+                id=db_game.id,
+                status=db_game.status,
+                version=db_game.version or 0,
+                ended_at=db_game.updated_at,
+                archived_at=now,
+                data=encode_game(self._to_pydantic_game(db_game, moves[db_game.id]))
+            )
+            for db_game in db_games
+        ]
+
+    def _forget_games(self, game_ids: Sequence[str]) -> None:
+        for game_id in game_ids:
+            self.cache.discard(game_id)
+
+    def _forget_stale(self, states: Sequence[GameState]) -> None:
+        """Drop written-behind states that another process overtook; their moves are lost"""
+        for game_state in states:
+            logger.warning("Dropped cached update of game %s: the stored game is newer", game_state.id)
+        self.cache.discard_stale(list(states))
+
+    def _legacy_moves_page(self, move_history_json: str, offset: int, limit: int) -> Tuple[List[Move], int]:
+        moves = json.loads(move_history_json)
+        return _MOVE_LIST.validate_python(moves[offset:offset + limit]), len(moves)
+
+    def _leaderboard_upsert(self, entries: Sequence[LeaderboardEntry]) -> Insert:
+        """One INSERT ... ON CONFLICT DO UPDATE adding the results to each player's row, returning the rows"""
+        now = datetime.utcnow()
+        totals: Dict[Tuple[str, str], Dict] = {}
+        for entry in entries:
+            # A statement may not touch the same row twice, so results for one player are summed first
+            row = totals.setdefault((entry.player_name, entry.game_mode), dict(
+                player_name=entry.player_name,
+                game_mode=entry.game_mode,
+                wins=0, losses=0, draws=0, score=0,
+                last_played=now
+            ))
+            row["wins"] += entry.wins
+            row["losses"] += entry.losses
+            row["draws"] += entry.draws
+            row["score"] += entry.score
+
+        dialect = self.engine.dialect.name
+        if dialect not in _UPSERT_INSERTS:
+            raise ValueError(f"Leaderboard upserts are not supported on {dialect}")
+        statement = _UPSERT_INSERTS[dialect](DBLeaderboard).values(list(totals.values()))
+        excluded = statement.excluded
+        return statement.on_conflict_do_update(
+            index_elements=[DBLeaderboard.player_name, DBLeaderboard.game_mode],
+            set_=dict(
+                wins=DBLeaderboard.wins + excluded.wins,
+                losses=DBLeaderboard.losses + excluded.losses,
+                draws=DBLeaderboard.draws + excluded.draws,
+                score=DBLeaderboard.score + excluded.score,
+                last_played=excluded.last_played
+            )
+        ).returning(*DBLeaderboard.__table__.columns)
+
+    def _record_leaderboard(self, rows: Sequence[Row]) -> None:
+        """Update the cached top lists with rows returned by a committed upsert"""
+        self.leaderboard_cache.record(self._ranked(rows))
+
+    def _ranked(self, rows) -> List[RankedEntry]:
+        return [(rank_key(row), LeaderboardEntry.model_validate(row)) for row in rows]
+
+    def _top_statement(self, game_mode: Optional[GameMode], limit: int,
+                       after: Optional[RankKey] = None) -> Select:
+        """Leaderboard rows, best first, starting after the row with rank key ``after``"""
+        query = select(DBLeaderboard)
+        if game_mode:
+            query = query.where(DBLeaderboard.game_mode == game_mode)
+        if after is not None:
+            query = query.where(tuple_(DBLeaderboard.wins, DBLeaderboard.score, DBLeaderboard.id) < tuple_(*after))
+        return query.order_by(
+            DBLeaderboard.wins.desc(), DBLeaderboard.score.desc(), DBLeaderboard.id.desc()
+        ).limit(limit)
+
+    def _leaderboard_page(self, rows: Sequence[DBLeaderboard],
+                          limit: int) -> Tuple[List[LeaderboardEntry], Optional[RankKey]]:
+        """(entries, key to continue after or None on the last page) from a query for limit + 1 rows"""
+        ranked = self._ranked(rows[:limit])
+        return [entry for _, entry in ranked], ranked[-1][0] if len(rows) > limit else None
+
+    def _rank_statement(self, player_name: str, game_mode: Optional[GameMode]) -> Select:
+        """A player's rows with their rank in their mode and overall.
+
+        A rank is one plus the rows ahead in leaderboard order, counted on the
+        rank index: the count reads only index entries ahead of the player.
+        """
+        ahead = aliased(DBLeaderboard)
+        is_ahead = tuple_(ahead.wins, ahead.score, ahead.id) > tuple_(DBLeaderboard.wins, DBLeaderboard.score,
+                                                                     DBLeaderboard.id)
+
+        def rank(*conditions):
+            return select(func.count()).select_from(ahead).where(*conditions, is_ahead).scalar_subquery() + 1
+
+        query = select(
+            DBLeaderboard,
+            rank(ahead.game_mode == DBLeaderboard.game_mode).label("rank"),
+            rank().label("overall_rank")
+        ).where(DBLeaderboard.player_name == player_name)
+        if game_mode:
+            query = query.where(DBLeaderboard.game_mode == game_mode)
+        return query.order_by(DBLeaderboard.game_mode)
+
+    def _player_ranks(self, rows: Sequence[Row]) -> List[Tuple[int, int, LeaderboardEntry]]:
+        return [(row.rank, row.overall_rank, LeaderboardEntry.model_validate(row.DBLeaderboard)) for row in rows]
+
+    def _to_player(self, db_player: DBPlayer) -> Player:
+        return Player.model_construct(
+            id=db_player.id,
+            name=db_player.name,
+            color=PieceColor(db_player.color),
+            is_bot=db_player.is_bot,
+            avatar=db_player.avatar,
+            score=db_player.score
+        )
+
+    def _to_pydantic_game(self, db_game: DBGame, db_moves: Sequence[DBMove] = ()) -> GameState:
+        """Build the GameState for a row without validating it again.
+
+        Rows are only ever written from validated GameStates, so the models
+        are constructed directly; the moves, the bulk of a long game, go
+        through the cached move list adapter.
+        """
+        if db_game.state_blob is not None:
+            board, take_me_state, piece_count = decode_state(db_game.state_blob)
+        else:
+            board = BoardState(root=json.loads(db_game.board_json))
+            take_me_state = TakeMeState.model_validate(json.loads(db_game.take_me_state_json))
+            piece_count = json.loads(db_game.piece_count_json)
+        position_history = json.loads(db_game.position_history_json)
+        if db_game.move_count is not None:
+            move_history = _moves_from_json(m.move_json for m in db_moves)
+            position_history += [m.position_hash for m in db_moves]
+        else:
+            move_history = _MOVE_LIST.validate_json(db_game.move_history_json)
+
+        players = [self._to_player(p) for p in db_game.players]
+        winner = next((p for p in players if p.id == db_game.winner_id), None)
+
+        return GameState.model_construct(
+            id=db_game.id,
+            board=board,
+            current_turn=PieceColor(db_game.current_turn),
+            players=players,
+            status=GameStatus(db_game.status),
+            winner=winner,
+            selected_piece=None,
+            legal_moves=[],
+            take_me_state=take_me_state,
+            move_history=move_history,
+            move_count=len(move_history),
+            version=db_game.version or 0,
+            position_history=position_history,
+            position_counts=count_positions(position_history),
+            piece_count=piece_count,
+            bot_difficulty=BotDifficulty(db_game.bot_difficulty or BotDifficulty.EASY),
+            bot_time_budget_ms=db_game.bot_time_budget_ms,
+            message=db_game.message,
+            created_at=db_game.created_at,
+            updated_at=db_game.updated_at
+        )
+
+class SQLAlchemyDatabase(_GameRows):
+    def __init__(self, db_url: str, cache_settings: Optional[CacheSettings] = None,
+                 leaderboard_settings: Optional[LeaderboardCacheSettings] = None):
+        self.cache = GameCache(cache_settings or CacheSettings.from_env())
+        self.leaderboard_cache = LeaderboardCache(leaderboard_settings or LeaderboardCacheSettings.from_env())
+        self.engine = create_engine(
+            db_url, 
+            connect_args={"check_same_thread": False} if db_url.startswith("sqlite") else {}
+        )
+        with self.engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            _add_missing_columns(conn)
+            _add_missing_indexes(conn)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False,
+                                         bind=self.engine)
+
+    def get_session(self) -> Session:
+        return self.SessionLocal()
+
+    def clear_database(self):
+        """Reset database for testing. Dropping and re-creating all tables."""
+        self.cache.clear()
+        self.leaderboard_cache.clear()
+        Base.metadata.drop_all(bind=self.engine)
+        Base.metadata.create_all(bind=self.engine)
+
+    def create_game(self, game_mode: GameMode, players_data: List[Dict],
+                    bot_difficulty: BotDifficulty = BotDifficulty.EASY,
+                    bot_time_budget_ms: Optional[int] = None) -> GameState:
+        session = self.get_session()
+        try:
+            db_game = self._new_game_row(players_data, bot_difficulty, bot_time_budget_ms)
             session.add(db_game)
             session.commit()
-            session.refresh(db_game)
-            return self._to_pydantic_game(db_game)
+            # Everything the state needs is already on the new row, so nothing is read back
+            game_state = self._to_pydantic_game(db_game)
         finally:
             session.close()
+        self._persist_games(self.cache.put(game_state))
+        return game_state
 
     def get_game(self, game_id: str) -> Optional[GameState]:
+        cached = self.cache.get(game_id)
+        if cached is not None:
+            return cached
+        session = self.get_session()
+        try:
+            db_game = session.scalars(self._load_statement(game_id)).unique().first()
+            if not db_game:
+                # Finished games are read from the archive once moved there, and not cached
+                data = session.scalar(select(DBArchivedGame.data).where(DBArchivedGame.id == game_id))
+                return decode_game(data) if data is not None else None
+            db_moves = session.scalars(self._moves_statement(game_id)).all()
+            game_state = self._to_pydantic_game(db_game, db_moves)
+        finally:
+            session.close()
+        self._persist_games(self.cache.put(game_state))
+        return game_state
+
+    def get_game_version(self, game_id: str) -> Optional[int]:
+        """A game's version without loading it, or None when it does not exist"""
+        cached = self.cache.get(game_id)
+        if cached is not None:
+            return cached.version
         session = self.get_session()
         try:
-            db_game = session.query(DBGame).filter(DBGame.id == game_id).first()
-            if db_game:
-                return self._to_pydantic_game(db_game)
-            return None
+            row = session.query(DBGame.version).filter(DBGame.id == game_id).first()
+            if row is None:
+                row = session.query(DBArchivedGame.version).filter(DBArchivedGame.id == game_id).first()
         finally:
             session.close()
+        return None if row is None else row.version or 0
 
-    def update_game(self, game_state: GameState) -> GameState:
+    def get_moves(self, game_id: str, offset: int = 0, limit: int = 100) -> Optional[Tuple[List[Move], int]]:
+        """A page of a game's move history and the total number of moves"""
+        cached = self.cache.get(game_id)
+        if cached is not None:
+            return self._moves_page(cached, offset, limit)
         session = self.get_session()
         try:
-            db_game = session.query(DBGame).filter(DBGame.id == game_state.id).first()
-            if db_game:
-                db_game.status = game_state.status
-                db_game.current_turn = game_state.current_turn
-                db_game.winner_id = game_state.winner.id if game_state.winner else None
-                db_game.board_json = json.dumps(game_state.board.root, default=lambda o: o.model_dump())
-                db_game.take_me_state_json = json.dumps(game_state.take_me_state.model_dump())
-                db_game.move_history_json = json.dumps([m.model_dump(by_alias=True) for m in game_state.move_history])
-                db_game.position_history_json = json.dumps(game_state.position_history)
-                db_game.piece_count_json = json.dumps(game_state.piece_count)
-                db_game.message = game_state.message
-                db_game.updated_at = datetime.utcnow()
-                
-                # Update player scores
-                for p in game_state.players:
-                    db_p = session.query(DBPlayer).filter(DBPlayer.id == p.id).first()
-                    if db_p:
-                        db_p.score = p.score
-                
-                session.commit()
-                session.refresh(db_game)
-                return self._to_pydantic_game(db_game)
+            db_game = session.execute(
+                select(DBGame.move_count, DBGame.move_history_json).where(DBGame.id == game_id)
+            ).first()
+            if not db_game:
+                data = session.scalar(select(DBArchivedGame.data).where(DBArchivedGame.id == game_id))
+                return self._moves_page(decode_game(data), offset, limit) if data is not None else None
+            if db_game.move_count is None:
+                return self._legacy_moves_page(db_game.move_history_json, offset, limit)
+            rows = (session.query(DBMove.move_json).filter(DBMove.game_id == game_id)
+                    .order_by(DBMove.ply).offset(offset).limit(limit).all())
+            return _moves_from_json(row.move_json for row in rows), db_game.move_count
+        finally:
+            session.close()
+
+    def update_game(self, game_state: GameState, leaderboard_entries: Sequence[LeaderboardEntry] = (),
+                    expected_version: Optional[int] = None) -> GameState:
+        """Persist a game (and any leaderboard results it produced) in one transaction.
+
+        ``expected_version`` is the version the update was computed from. When
+        the stored game has moved on since, nothing is written and
+        StaleGameError is raised.
+
+        Updates to active games are only cached when write-behind is on; the
+        flush writes them later. Finished games are always written at once.
+        The caller's state is already final, so it is returned as-is instead of
+        being read back from the database.
+        """
+        if self.cache.write_behind and not leaderboard_entries and game_state.status == GameStatus.ACTIVE:
+            self._persist_games(self.cache.put(game_state, dirty=True, expected_version=expected_version))
             return game_state
+
+        session = self.get_session()
+        try:
+            if not self._save_game(session, game_state, expected_version):
+                self.cache.discard(game_state.id)
+                raise StaleGameError(game_state.id)
+            results = []
+            if leaderboard_entries:
+                results = session.execute(self._leaderboard_upsert(leaderboard_entries)).all()
+            session.commit()
         finally:
             session.close()
+        self._record_leaderboard(results)
+        self._persist_games(self.cache.put(game_state))
+        return game_state
 
-    def delete_game(self, game_id: str) -> bool:
+    def flush_games(self) -> int:
+        """Write every cached update that has not been persisted yet"""
+        dirty, evicted = self.cache.take_dirty()
+        try:
+            self._persist_games(dirty + evicted)
+        except Exception:
+            self.cache.mark_dirty(dirty)
+            for state in evicted:
+                self.cache.put(state, dirty=True)
+            raise
+        return len(dirty) + len(evicted)
+
+    def _persist_games(self, states: List[GameState]) -> None:
+        if not states:
+            return
         session = self.get_session()
         try:
-            db_game = session.query(DBGame).filter(DBGame.id == game_id).first()
-            if db_game:
-                session.delete(db_game)
-                session.commit()
-                return True
+            stale = [game_state for game_state in states if not self._save_game(session, game_state)]
+            session.commit()
+        finally:
+            session.close()
+        self._forget_stale(stale)
+
+    def _save_game(self, session: Session, game_state: GameState,
+                   expected_version: Optional[int] = None) -> bool:
+        """Write a state over the stored game; False when the stored version did not match"""
+        lookup = session.execute(self._save_lookup(game_state.id)).all()
+        statements = self._save_statements(game_state, lookup, expected_version)
+        if not statements:
+            return True
+        (game_update, _), *rest = statements
+        if not session.execute(game_update).rowcount:
             return False
+        for statement, parameters in rest:
+            session.execute(statement, parameters)
+        return True
+
+    def delete_game(self, game_id: str) -> bool:
+        self.cache.discard(game_id)
+        session = self.get_session()
+        try:
+            for statement in self._delete_statements([game_id]):
+                deleted = session.execute(statement).rowcount
+            if not deleted:
+                deleted = session.execute(delete(DBArchivedGame).where(DBArchivedGame.id == game_id)).rowcount
+            session.commit()
+            return deleted > 0
+        finally:
+            session.close()
+
+    def archive_games(self, settings: ArchiveSettings) -> Tuple[int, int]:
+        """Archive finished games and delete abandoned ones, a batch per transaction; (archived, deleted)"""
+        now = datetime.utcnow()
+        archived = deleted = 0
+        while True:
+            count = self._archive_batch(now - timedelta(seconds=settings.finished_after_seconds), settings.batch_size)
+            archived += count
+            if count < settings.batch_size:
+                break
+        while settings.abandoned_after_seconds > 0:
+            count = self._purge_batch(now - timedelta(seconds=settings.abandoned_after_seconds), settings.batch_size)
+            deleted += count
+            if count < settings.batch_size:
+                break
+        return archived, deleted
+
+    def _archive_batch(self, cutoff: datetime, limit: int) -> int:
+        session = self.get_session()
+        try:
+            db_games = session.scalars(self._finished_batch_statement(cutoff, limit)).unique().all()
+            if not db_games:
+                return 0
+            game_ids = [db_game.id for db_game in db_games]
+            db_moves = session.scalars(self._batch_moves_statement(game_ids)).all()
+            session.execute(insert(DBArchivedGame), self._archive_values(db_games, db_moves))
+            for statement in self._delete_statements(game_ids):
+                session.execute(statement)
+            session.commit()
         finally:
             session.close()
+        self._forget_games(game_ids)
+        return len(game_ids)
+
+    def _purge_batch(self, cutoff: datetime, limit: int) -> int:
+        session = self.get_session()
+        try:
+            game_ids = session.scalars(self._abandoned_batch_statement(cutoff, limit)).all()
+            if not game_ids:
+                return 0
+            for statement in self._delete_statements(game_ids):
+                session.execute(statement)
+            session.commit()
+        finally:
+            session.close()
+        self._forget_games(game_ids)
+        return len(game_ids)
 
     def get_leaderboard(self, game_mode: Optional[GameMode] = None, limit: int = 10) -> List[LeaderboardEntry]:
+        cached = self.leaderboard_cache.get(game_mode, limit)
+        if cached is not None:
+            return cached
+        fetch = self.leaderboard_cache.fetch_size(limit)
         session = self.get_session()
         try:
-            query = session.query(DBLeaderboard)
-            if game_mode:
-                query = query.filter(DBLeaderboard.game_mode == game_mode)
-            
-            db_entries = query.order_by(desc(DBLeaderboard.wins)).limit(limit).all()
-            return [LeaderboardEntry.model_validate(e) for e in db_entries]
+            ranked = self._ranked(session.scalars(self._top_statement(game_mode, fetch)).all())
+        finally:
+            session.close()
+        self.leaderboard_cache.put(game_mode, ranked, fetch)
+        return [entry for _, entry in ranked[:limit]]
+
+    def get_leaderboard_page(self, game_mode: Optional[GameMode] = None, limit: int = 10,
+                             after: Optional[RankKey] = None) -> Tuple[List[LeaderboardEntry], Optional[RankKey]]:
+        """A page of the leaderboard after the row with rank key ``after``, and the key of its last row"""
+        session = self.get_session()
+        try:
+            rows = session.scalars(self._top_statement(game_mode, limit + 1, after)).all()
+        finally:
+            session.close()
+        return self._leaderboard_page(rows, limit)
+
+    def get_player_rank(self, player_name: str,
+                        game_mode: Optional[GameMode] = None) -> List[Tuple[int, int, LeaderboardEntry]]:
+        """(rank in its mode, overall rank, entry) for each of a player's leaderboard rows"""
+        session = self.get_session()
+        try:
+            return self._player_ranks(session.execute(self._rank_statement(player_name, game_mode)).all())
         finally:
             session.close()
 
     def add_leaderboard_entry(self, entry: LeaderboardEntry) -> None:
         session = self.get_session()
         try:
-            db_entry = session.query(DBLeaderboard).filter(
-                DBLeaderboard.player_name == entry.player_name,
-                DBLeaderboard.game_mode == entry.game_mode
-            ).first()
-            
-            if db_entry:
-                db_entry.wins += entry.wins
-                db_entry.losses += entry.losses
-                db_entry.draws += entry.draws
-                db_entry.score += entry.score
-                db_entry.last_played = datetime.utcnow()
-            else:
-                db_entry = DBLeaderboard(
-                    player_name=entry.player_name,
-                    game_mode=entry.game_mode,
-                    wins=entry.wins,
-                    losses=entry.losses,
-                    draws=entry.draws,
-                    score=entry.score,
-                    last_played=datetime.utcnow()
-                )
-                session.add(db_entry)
-            
+            results = session.execute(self._leaderboard_upsert([entry])).all()
             session.commit()
         finally:
             session.close()
+        self._record_leaderboard(results)
+
+class AsyncSQLAlchemyDatabase(_GameRows):
+    """The same operations as SQLAlchemyDatabase on SQLAlchemy's asyncio extension.
+
+    Selected by an async driver in DATABASE_URL (``postgresql+asyncpg://`` or
+    ``sqlite+aiosqlite://``), so database round trips no longer block the event
+    loop. Tables are created by ``create_tables`` at application startup.
+    """
+
+    def __init__(self, db_url: str, cache_settings: Optional[CacheSettings] = None,
+                 leaderboard_settings: Optional[LeaderboardCacheSettings] = None):
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+        self.cache = GameCache(cache_settings or CacheSettings.from_env())
+        self.leaderboard_cache = LeaderboardCache(leaderboard_settings or LeaderboardCacheSettings.from_env())
+        self.engine = create_async_engine(db_url)
+        self.SessionLocal = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+
+    async def create_tables(self):
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(_add_missing_columns)
+            await conn.run_sync(_add_missing_indexes)
+
+    async def clear_database(self):
+        """Reset database for testing. Dropping and re-creating all tables."""
+        self.cache.clear()
+        self.leaderboard_cache.clear()
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def _load_game(self, session, game_id: str) -> Optional[DBGame]:
+        result = await session.execute(self._load_statement(game_id))
+        return result.unique().scalars().first()
+
+    async def create_game(self, game_mode: GameMode, players_data: List[Dict],
+                          bot_difficulty: BotDifficulty = BotDifficulty.EASY,
+                          bot_time_budget_ms: Optional[int] = None) -> GameState:
+        async with self.SessionLocal() as session:
+            db_game = self._new_game_row(players_data, bot_difficulty, bot_time_budget_ms)
+            session.add(db_game)
+            await session.commit()
+            game_state = self._to_pydantic_game(db_game)
+        await self._persist_games(self.cache.put(game_state))
+        return game_state
+
+    async def get_game(self, game_id: str) -> Optional[GameState]:
+        cached = self.cache.get(game_id)
+        if cached is not None:
+            return cached
+        async with self.SessionLocal() as session:
+            db_game = await self._load_game(session, game_id)
+            if not db_game:
+                # Finished games are read from the archive once moved there, and not cached
+                data = await session.scalar(select(DBArchivedGame.data).where(DBArchivedGame.id == game_id))
+                return decode_game(data) if data is not None else None
+            db_moves = await session.execute(self._moves_statement(game_id))
+            game_state = self._to_pydantic_game(db_game, db_moves.scalars().all())
+        await self._persist_games(self.cache.put(game_state))
+        return game_state
+
+    async def get_game_version(self, game_id: str) -> Optional[int]:
+        """A game's version without loading it, or None when it does not exist"""
+        cached = self.cache.get(game_id)
+        if cached is not None:
+            return cached.version
+        async with self.SessionLocal() as session:
+            result = await session.execute(select(DBGame.version).where(DBGame.id == game_id))
+            row = result.first()
+            if row is None:
+                result = await session.execute(select(DBArchivedGame.version).where(DBArchivedGame.id == game_id))
+                row = result.first()
+        return None if row is None else row.version or 0
+
+    async def get_moves(self, game_id: str, offset: int = 0,
+                        limit: int = 100) -> Optional[Tuple[List[Move], int]]:
+        """A page of a game's move history and the total number of moves"""
+        cached = self.cache.get(game_id)
+        if cached is not None:
+            return self._moves_page(cached, offset, limit)
+        async with self.SessionLocal() as session:
+            result = await session.execute(
+                select(DBGame.move_count, DBGame.move_history_json).where(DBGame.id == game_id)
+            )
+            db_game = result.first()
+            if not db_game:
+                data = await session.scalar(select(DBArchivedGame.data).where(DBArchivedGame.id == game_id))
+                return self._moves_page(decode_game(data), offset, limit) if data is not None else None
+            if db_game.move_count is None:
+                return self._legacy_moves_page(db_game.move_history_json, offset, limit)
+            rows = await session.execute(
+                select(DBMove.move_json).where(DBMove.game_id == game_id)
+                .order_by(DBMove.ply).offset(offset).limit(limit)
+            )
+            return _moves_from_json(rows.scalars()), db_game.move_count
+
+    async def update_game(self, game_state: GameState, leaderboard_entries: Sequence[LeaderboardEntry] = (),
+                          expected_version: Optional[int] = None) -> GameState:
+        """Persist a game (and any leaderboard results it produced) in one transaction"""
+        if self.cache.write_behind and not leaderboard_entries and game_state.status == GameStatus.ACTIVE:
+            await self._persist_games(self.cache.put(game_state, dirty=True, expected_version=expected_version))
+            return game_state
+
+        async with self.SessionLocal() as session:
+            if not await self._save_game(session, game_state, expected_version):
+                self.cache.discard(game_state.id)
+                raise StaleGameError(game_state.id)
+            results = []
+            if leaderboard_entries:
+                results = (await session.execute(self._leaderboard_upsert(leaderboard_entries))).all()
+            await session.commit()
+        self._record_leaderboard(results)
+        await self._persist_games(self.cache.put(game_state))
+        return game_state
+
+    async def flush_games(self) -> int:
+        """Write every cached update that has not been persisted yet"""
+        dirty, evicted = self.cache.take_dirty()
+        try:
+            await self._persist_games(dirty + evicted)
+        except Exception:
+            self.cache.mark_dirty(dirty)
+            for state in evicted:
+                self.cache.put(state, dirty=True)
+            raise
+        return len(dirty) + len(evicted)
+
+    async def _persist_games(self, states: List[GameState]) -> None:
+        if not states:
+            return
+        async with self.SessionLocal() as session:
+            stale = [game_state for game_state in states if not await self._save_game(session, game_state)]
+            await session.commit()
+        self._forget_stale(stale)
+
+    async def _save_game(self, session, game_state: GameState, expected_version: Optional[int] = None) -> bool:
+        lookup = (await session.execute(self._save_lookup(game_state.id))).all()
+        statements = self._save_statements(game_state, lookup, expected_version)
+        if not statements:
+            return True
+        (game_update, _), *rest = statements
+        if not (await session.execute(game_update)).rowcount:
+            return False
+        for statement, parameters in rest:
+            await session.execute(statement, parameters)
+        return True
+
+    async def delete_game(self, game_id: str) -> bool:
+        self.cache.discard(game_id)
+        async with self.SessionLocal() as session:
+            for statement in self._delete_statements([game_id]):
+                result = await session.execute(statement)
+            if not result.rowcount:
+                result = await session.execute(delete(DBArchivedGame).where(DBArchivedGame.id == game_id))
+            await session.commit()
+            return result.rowcount > 0
+
+    async def archive_games(self, settings: ArchiveSettings) -> Tuple[int, int]:
+        """Archive finished games and delete abandoned ones, a batch per transaction; (archived, deleted)"""
+        now = datetime.utcnow()
+        archived = deleted = 0
+        while True:
+            count = await self._archive_batch(now - timedelta(seconds=settings.finished_after_seconds),
+                                              settings.batch_size)
+            archived += count
+            if count < settings.batch_size:
+                break
+        while settings.abandoned_after_seconds > 0:
+            count = await self._purge_batch(now - timedelta(seconds=settings.abandoned_after_seconds),
+                                            settings.batch_size)
+            deleted += count
+            if count < settings.batch_size:
+                break
+        return archived, deleted
+
+    async def _archive_batch(self, cutoff: datetime, limit: int) -> int:
+        async with self.SessionLocal() as session:
+            result = await session.execute(self._finished_batch_statement(cutoff, limit))
+            db_games = result.unique().scalars().all()
+            if not db_games:
+                return 0
+            game_ids = [db_game.id for db_game in db_games]
+            db_moves = (await session.execute(self._batch_moves_statement(game_ids))).scalars().all()
+            await session.execute(insert(DBArchivedGame), self._archive_values(db_games, db_moves))
+            for statement in self._delete_statements(game_ids):
+                await session.execute(statement)
+            await session.commit()
+        self._forget_games(game_ids)
+        return len(game_ids)
+
+    async def _purge_batch(self, cutoff: datetime, limit: int) -> int:
+        async with self.SessionLocal() as session:
+            game_ids = (await session.execute(self._abandoned_batch_statement(cutoff, limit))).scalars().all()
+            if not game_ids:
+                return 0
+            for statement in self._delete_statements(game_ids):
+                await session.execute(statement)
+            await session.commit()
+        self._forget_games(game_ids)
+        return len(game_ids)
+
+    async def get_leaderboard(self, game_mode: Optional[GameMode] = None, limit: int = 10) -> List[LeaderboardEntry]:
+        cached = self.leaderboard_cache.get(game_mode, limit)
+        if cached is not None:
+            return cached
+        fetch = self.leaderboard_cache.fetch_size(limit)
+        async with self.SessionLocal() as session:
+            result = await session.execute(self._top_statement(game_mode, fetch))
+            ranked = self._ranked(result.scalars().all())
+        self.leaderboard_cache.put(game_mode, ranked, fetch)
+        return [entry for _, entry in ranked[:limit]]
+
+    async def get_leaderboard_page(self, game_mode: Optional[GameMode] = None, limit: int = 10,
+                                   after: Optional[RankKey] = None
+                                   ) -> Tuple[List[LeaderboardEntry], Optional[RankKey]]:
+        """A page of the leaderboard after the row with rank key ``after``, and the key of its last row"""
+        async with self.SessionLocal() as session:
+            result = await session.execute(self._top_statement(game_mode, limit + 1, after))
+            return self._leaderboard_page(result.scalars().all(), limit)
+
+    async def get_player_rank(self, player_name: str,
+                              game_mode: Optional[GameMode] = None) -> List[Tuple[int, int, LeaderboardEntry]]:
+        """(rank in its mode, overall rank, entry) for each of a player's leaderboard rows"""
+        async with self.SessionLocal() as session:
+            result = await session.execute(self._rank_statement(player_name, game_mode))
+            return self._player_ranks(result.all())
+
+    async def add_leaderboard_entry(self, entry: LeaderboardEntry) -> None:
+        async with self.SessionLocal() as session:
+            results = (await session.execute(self._leaderboard_upsert([entry]))).all()
+            await session.commit()
+        self._record_leaderboard(results)
+
+
+@contextmanager
+def count_statements(engine) -> Iterator[List[str]]:
+    """Collect the SQL statements run on an engine (sync or async) inside the block"""
+    statements = []
+    target = getattr(engine, "sync_engine", engine)
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(target, "before_cursor_execute", record)
+
+
+def create_database(db_url: str):
+    """Async backend for async drivers (asyncpg, aiosqlite), the sync one otherwise"""
+    if make_url(db_url).get_dialect().is_async:
+        return AsyncSQLAlchemyDatabase(db_url)
+    return SQLAlchemyDatabase(db_url)
+
+
+async def run_db(method, *args, **kwargs):
+    """Call a database method without blocking the event loop.
+
+    Async backend methods are awaited directly; sync backend methods (the
+    default, and what the tests use) run in a worker thread.
+    """
+    if pyinspect.iscoroutinefunction(method):
+        return await method(*args, **kwargs)
+    return await asyncio.to_thread(method, *args, **kwargs)
 
-    def _to_pydantic_game(self, db_game: DBGame) -> GameState:
-        board_data = json.loads(db_game.board_json)
-        take_me_data = json.loads(db_game.take_me_state_json)
-        move_history_data = json.loads(db_game.move_history_json)
-        position_history = json.loads(db_game.position_history_json)
-        piece_count = json.loads(db_game.piece_count_json)
-        
-        winner = None
-        if db_game.winner_id:
-            for p in db_game.players:
-                if p.id == db_game.winner_id:
-                    winner = Player.model_validate(p)
-                    break
-        
-        return GameState(
-            id=db_game.id,
-            board=BoardState(root=board_data),
-            current_turn=db_game.current_turn,
-            players=[Player.model_validate(p) for p in db_game.players],
-            status=db_game.status,
-            winner=winner,
-            take_me_state=TakeMeState.model_validate(take_me_data),
-            move_history=move_history_data, # Pydantic will validate from dict list
-            position_history=position_history,
-            piece_count=piece_count,
-            message=db_game.message,
-            created_at=db_game.created_at,
-            updated_at=db_game.updated_at
-        )
 
 # Global database instance
-db = SQLAlchemyDatabase(DATABASE_URL)
\ No newline at end of file
+db = create_database(DATABASE_URL)
\ No newline at end of file
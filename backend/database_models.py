@@ -1,7 +1,7 @@
 import json
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, Boolean, DateTime, ForeignKey, Index, LargeBinary, Text
 from sqlalchemy.orm import declarative_base, relationship
 
 Base = declarative_base()
@@ -21,6 +21,10 @@ class DBPlayer(Base):
 
 class DBGame(Base):
     __tablename__ = "games"
+    __table_args__ = (
+        # The archiver's scans: finished and abandoned games by age
+        Index("ix_games_status_updated", "status", "updated_at"),
+    )
     
     id = Column(String, primary_key=True)
     status = Column(String)
@@ -33,15 +37,54 @@ class DBGame(Base):
     move_history_json = Column(Text)
     position_history_json = Column(Text)
     piece_count_json = Column(Text)
+    # Board and Take Me! state in the state_codec encoding; the board, take-me
+    # and piece count JSON columns are NULL once this is set
+    state_blob = Column(LargeBinary, nullable=True)
+    # Plies stored in the moves table; NULL for games whose history is still in the JSON columns
+    move_count = Column(Integer, nullable=True)
+    # Bumped by every update and served as the game's ETag; NULL (read as 0) for older rows
+    version = Column(Integer, nullable=True)
     
+    bot_difficulty = Column(String, nullable=True)
+    bot_time_budget_ms = Column(Integer, nullable=True)
     message = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     players = relationship("DBPlayer", back_populates="game", cascade="all, delete-orphan")
 
+class DBMove(Base):
+    """One ply of a game's history; rows are only ever appended"""
+    __tablename__ = "moves"
+
+    game_id = Column(String, ForeignKey("games.id", ondelete="CASCADE"), primary_key=True)
+    ply = Column(Integer, primary_key=True)
+    move_json = Column(Text)
+    # Position hash after this ply (the initial one is in games.position_history_json)
+    position_hash = Column(String)
+
+class DBArchivedGame(Base):
+    """A finished game moved out of the games tables, stored as one game_archive record"""
+    __tablename__ = "archived_games"
+
+    id = Column(String, primary_key=True)
+    status = Column(String)
+    # Kept outside the record so conditional GETs need not decompress it
+    version = Column(Integer)
+    ended_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    data = Column(LargeBinary)
+
 class DBLeaderboard(Base):
     __tablename__ = "leaderboard"
+    __table_args__ = (
+        # One row per player and mode; results are added to it with an upsert
+        Index("ux_leaderboard_player_mode", "player_name", "game_mode", unique=True),
+        # Leaderboard order (wins, then score, then id), overall and within a mode. Pages
+        # and ranks are index range scans on these, never a sort of the whole table
+        Index("ix_leaderboard_rank", "wins", "score", "id"),
+        Index("ix_leaderboard_mode_rank", "game_mode", "wins", "score", "id"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     player_name = Column(String)
@@ -0,0 +1,70 @@
+"""Archive of finished games and cleanup of abandoned ones.
+
+Almost every request touches active games, yet the games, players and moves
+tables kept every game ever played. The archiver runs in the background
+every ``ARCHIVE_INTERVAL_SECONDS``:
+
+- Won and drawn games untouched for ``ARCHIVE_FINISHED_AFTER_SECONDS`` are
+  moved to the ``archived_games`` table. Each one becomes a single
+  zlib-compressed record (see ``encode_game``). ``GET /games/{id}`` and the
+  move history still read them from there.
+- Active games untouched for ``ABANDONED_GAME_TTL_SECONDS`` are deleted.
+
+Both steps select by the ``(status, updated_at)`` index. They work in
+transactions of at most ``ARCHIVE_BATCH_SIZE`` games, so the hot tables are
+never locked for long.
+
+Record layout, compressed as a whole::
+
+    u16 n + n bytes   board and Take Me! state (state_codec encoding)
+    JSON              every other GameState field, moves included
+"""
+import json
+import os
+import struct
+import zlib
+from typing import NamedTuple
+
+from models import GameState
+from game_logic import count_positions
+from state_codec import decode_state, encode_state
+
+# Fields rebuilt from the state encoding, or per-turn values a finished game does not need
+_NOT_IN_RECORD = {"board", "take_me_state", "piece_count", "selected_piece", "legal_moves"}
+
+
+class ArchiveSettings(NamedTuple):
+    interval_seconds: float = 300.0
+    finished_after_seconds: float = 3600.0
+    abandoned_after_seconds: float = 3 * 24 * 3600.0
+    batch_size: int = 200
+
+    @classmethod
+    def from_env(cls) -> "ArchiveSettings":
+        defaults = cls._field_defaults
+        return cls(
+            interval_seconds=float(os.getenv("ARCHIVE_INTERVAL_SECONDS", defaults["interval_seconds"])),
+            finished_after_seconds=float(os.getenv("ARCHIVE_FINISHED_AFTER_SECONDS",
+                                                   defaults["finished_after_seconds"])),
+            abandoned_after_seconds=float(os.getenv("ABANDONED_GAME_TTL_SECONDS",
+                                                    defaults["abandoned_after_seconds"])),
+            batch_size=int(os.getenv("ARCHIVE_BATCH_SIZE", defaults["batch_size"])),
+        )
+
+
+def encode_game(game_state: GameState) -> bytes:
+    state = encode_state(game_state.board, game_state.take_me_state)
+    fields = game_state.model_dump_json(by_alias=True, exclude=_NOT_IN_RECORD).encode()
+    return zlib.compress(struct.pack(">H", len(state)) + state + fields, 9)
+
+
+def decode_game(data: bytes) -> GameState:
+    raw = zlib.decompress(data)
+    (state_size,) = struct.unpack_from(">H", raw)
+    board, take_me_state, piece_count = decode_state(raw[2:2 + state_size])
+    fields = json.loads(raw[2 + state_size:])
+    game_state = GameState.model_validate({
+        **fields, "board": board, "take_me_state": take_me_state, "piece_count": piece_count
+    })
+    game_state.position_counts = count_positions(game_state.position_history)
+    return game_state
@@ -0,0 +1,195 @@
+"""In-memory cache of active games in front of the database backends.
+
+A game is only touched by its two players, so the backends keep recently
+used GameStates here and serve ``get_game`` without a database read. By
+default every update is written through immediately and the cache only saves
+reads. With ``GAME_CACHE_WRITE_BEHIND_MS`` above 0, updates to active games
+are written behind instead: they are marked dirty and persisted on the next
+flush, when the game ends, or when the entry is evicted. Write-behind is only
+safe with a single API process, since other processes read the stale rows and
+a late flush overwrites their newer state.
+
+The cache is bounded by entry count and by an estimate of the memory used by
+each game; the least recently used games are evicted first, and games idle
+for longer than ``GAME_CACHE_IDLE_SECONDS`` are evicted on each flush.
+
+The cache is per process: run a single API process per database, or set
+``GAME_CACHE_SIZE=0`` to disable it.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from models import GameState
+
+# Rough per-game memory: the board and players, plus each recorded move and position hash
+GAME_BYTES = 8_000
+MOVE_BYTES = 1_500
+POSITION_BYTES = 120
+
+
+class StaleGameError(Exception):
+    """A game update computed from an older version than the one stored"""
+
+    def __init__(self, game_id: str):
+        super().__init__(f"Game {game_id} was updated by another request")
+        self.game_id = game_id
+
+
+class CacheSettings(NamedTuple):
+    max_games: int = 1000
+    max_bytes: int = 64 * 1024 * 1024
+    idle_seconds: float = 600.0
+    write_behind_ms: int = 0
+
+    @classmethod
+    def from_env(cls) -> "CacheSettings":
+        return cls(
+            max_games=int(os.getenv("GAME_CACHE_SIZE", cls._field_defaults["max_games"])),
+            max_bytes=int(os.getenv("GAME_CACHE_MEMORY_MB", 64)) * 1024 * 1024,
+            idle_seconds=float(os.getenv("GAME_CACHE_IDLE_SECONDS", cls._field_defaults["idle_seconds"])),
+            write_behind_ms=int(os.getenv("GAME_CACHE_WRITE_BEHIND_MS", cls._field_defaults["write_behind_ms"])),
+        )
+
+
+class _Entry:
+    __slots__ = ("state", "dirty", "size", "touched")
+
+    def __init__(self, state: GameState, dirty: bool):
+        self.state = state
+        self.dirty = dirty
+        self.size = estimate_size(state)
+        self.touched = time.monotonic()
+
+
+def estimate_size(state: GameState) -> int:
+    return GAME_BYTES + MOVE_BYTES * len(state.move_history) + POSITION_BYTES * len(state.position_history)
+
+
+class GameCache:
+    """Thread-safe LRU of GameStates with dirty tracking; does no I/O itself.
+
+    Methods that can evict return the dirty states that were pushed out; the
+    backend must persist them.
+    """
+
+    def __init__(self, settings: CacheSettings):
+        self.settings = settings
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.max_games > 0
+
+    @property
+    def write_behind(self) -> bool:
+        return self.enabled and self.settings.write_behind_ms > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, game_id: str) -> Optional[GameState]:
+        with self._lock:
+            entry = self._entries.get(game_id)
+            if entry is None:
+                return None
+            entry.touched = time.monotonic()
+            self._entries.move_to_end(game_id)
+            return entry.state
+
+    def put(self, state: GameState, dirty: bool = False,
+            expected_version: Optional[int] = None) -> List[GameState]:
+        """Cache a state (dirty when it still has to be written) and return evicted dirty states.
+
+        With ``expected_version``, a cached state of the game at any other
+        version raises StaleGameError: the update was computed from an old copy.
+        """
+        if not self.enabled:
+            return [state] if dirty else []
+        with self._lock:
+            current = self._entries.get(state.id)
+            if expected_version is not None and current is not None and current.state.version != expected_version:
+                raise StaleGameError(state.id)
+            # The new state supersedes any unflushed one for the same game
+            old = self._entries.pop(state.id, None)
+            if old is not None:
+                self._bytes -= old.size
+            entry = _Entry(state, dirty)
+            self._entries[state.id] = entry
+            self._bytes += entry.size
+            return self._evict_over_limits()
+
+    def discard(self, game_id: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(game_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def take_dirty(self) -> Tuple[List[GameState], List[GameState]]:
+        """(dirty states to flush, dirty states evicted for idleness); all are marked clean"""
+        with self._lock:
+            evicted = self._evict_idle()
+            dirty = []
+            for entry in self._entries.values():
+                if entry.dirty:
+                    entry.dirty = False
+                    dirty.append(entry.state)
+            return dirty, evicted
+
+    def mark_dirty(self, states: List[GameState]) -> None:
+        """Re-mark states whose flush failed, unless they were replaced meanwhile"""
+        with self._lock:
+            for state in states:
+                entry = self._entries.get(state.id)
+                if entry is not None and entry.state is state:
+                    entry.dirty = True
+
+    def discard_stale(self, states: List[GameState]) -> None:
+        """Drop states whose write lost to a newer stored version, unless they were replaced meanwhile"""
+        with self._lock:
+            for state in states:
+                entry = self._entries.get(state.id)
+                if entry is not None and entry.state is state:
+                    del self._entries[state.id]
+                    self._bytes -= entry.size
+
+    def _pop_lru(self) -> _Entry:
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry.size
+        return entry
+
+    def _evict_over_limits(self) -> List[GameState]:
+        evicted = []
+        while self._entries and (len(self._entries) > self.settings.max_games
+                                 or self._bytes > self.settings.max_bytes):
+            entry = self._pop_lru()
+            if entry.dirty:
+                evicted.append(entry.state)
+        return evicted
+
+    def _evict_idle(self) -> List[GameState]:
+        evicted = []
+        cutoff = time.monotonic() - self.settings.idle_seconds
+        # Entries are in LRU order, so idle ones are at the front
+        while self._entries and next(iter(self._entries.values())).touched < cutoff:
+            entry = self._pop_lru()
+            if entry.dirty:
+                evicted.append(entry.state)
+        return evicted
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "games": len(self._entries),
+                "bytes": self._bytes,
+                "dirty": sum(1 for entry in self._entries.values() if entry.dirty),
+            }
@@ -0,0 +1,123 @@
+"""Push of game updates to WebSocket subscribers.
+
+Instead of polling ``GET /games/{id}``, clients connect to
+``/games/{id}/ws`` and receive one JSON message per update. Each message
+carries ``seq``, the number of plies played once it is applied:
+
+- ``sync``: sent on connect. It holds the board, the Take Me! state, the scores,
+  the side to move and the status. With ``?since=<ply>`` it also holds the moves
+  played after that ply, so a reconnecting client can catch up without
+  refetching the history.
+- ``delta``: one update, carrying only what changed. That is the moves played
+  (``from_ply`` is the ply of the first one), the squares whose piece changed,
+  and the Take Me! state, scores, side to move, status, winner and message.
+- ``resync``: the client fell too far behind. It should reconnect with
+  ``since`` set to its last ``seq``.
+- ``ended``: the game was deleted.
+
+A delta's ``from_ply`` equals the ``seq`` of the message before it, so a
+gap means an update was missed; reconnecting with ``since`` recovers it.
+
+Subscribers are tracked per process, like the game cache, so a game's
+players must be served by the same API process.
+"""
+import asyncio
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from models import GameState, Move
+
+# Updates buffered per subscriber before it is told to resync
+QUEUE_SIZE = 64
+
+
+def _piece_json(piece) -> Optional[Dict[str, str]]:
+    return piece.model_dump(mode="json") if piece else None
+
+
+def _moves_json(moves: List[Move]) -> List[Dict[str, Any]]:
+    return [move.model_dump(mode="json", by_alias=True) for move in moves]
+
+
+def _status_json(game_state: GameState) -> Dict[str, Any]:
+    return {
+        "seq": game_state.move_count,
+        "take_me_state": game_state.take_me_state.model_dump(mode="json"),
+        "scores": {player.id: player.score for player in game_state.players},
+        "current_turn": game_state.current_turn.value,
+        "status": game_state.status.value,
+        "winner": game_state.winner.id if game_state.winner else None,
+        "message": game_state.message,
+    }
+
+
+def sync_message(game_state: GameState, since: int, moves: List[Move]) -> Dict[str, Any]:
+    """The full position, plus the moves played after ply ``since``"""
+    return {
+        "type": "sync",
+        "from_ply": since,
+        "moves": _moves_json(moves),
+        "board": [[_piece_json(piece) for piece in row] for row in game_state.board],
+        **_status_json(game_state),
+    }
+
+
+def delta_message(before: GameState, after: GameState) -> Dict[str, Any]:
+    """What changed between two states of a game"""
+    played = after.move_count - before.move_count
+    changed = []
+    for row, (old_row, new_row) in enumerate(zip(before.board, after.board)):
+        for col, (old, new) in enumerate(zip(old_row, new_row)):
+            if old is not new and old != new:
+                changed.append({"row": row, "col": col, "piece": _piece_json(new)})
+    return {
+        "type": "delta",
+        "from_ply": before.move_count,
+        "moves": _moves_json(after.move_history[-played:] if played > 0 else []),
+        "changed": changed,
+        **_status_json(after),
+    }
+
+
+class GameHub:
+    """Per-game subscriber queues; publishing never blocks on a slow client"""
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, game_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers[game_id].add(queue)
+        return queue
+
+    def unsubscribe(self, game_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(game_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[game_id]
+
+    def has_subscribers(self, game_id: str) -> bool:
+        return game_id in self._subscribers
+
+    def publish(self, game_id: str, message: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers.get(game_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind: drop its backlog and have it reconnect from its last seq
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+    def publish_update(self, before: GameState, after: GameState) -> None:
+        """Publish the delta between two states, if anyone is listening"""
+        if self.has_subscribers(after.id):
+            self.publish(after.id, delta_message(before, after))
+
+    def publish_ended(self, game_id: str) -> None:
+        self.publish(game_id, {"type": "ended"})
+
+
+hub = GameHub()
@@ -1,8 +1,22 @@
+from collections import Counter
 from typing import List, Optional, Dict, Tuple
 from models import (
-    BoardState, Piece, PieceType, PieceColor, Square, Move,
+    BoardState, Piece, PIECES, PieceType, PieceColor, Square, Move,
     TakeMeState, GameState, Player, GameStatus
 )
+import bitboard
+import zobrist
+from board_core import CompactBoard
+
+# Piece values for scoring
+PIECE_VALUES = {
+    PieceType.KING: 0,
+    PieceType.QUEEN: 9,
+    PieceType.ROOK: 5,
+    PieceType.BISHOP: 3,
+    PieceType.KNIGHT: 3,
+    PieceType.PAWN: 1
+}
 
 
 def is_valid_square(row: int, col: int) -> bool:
@@ -16,99 +30,42 @@ def get_legal_moves(board: BoardState, square: Square, ignore_take_me: bool = Fa
     if not piece:
         return []
 
-    moves = []
-    row, col = square.row, square.col
-    direction = -1 if piece.color == PieceColor.WHITE else 1
-
-    if piece.type == PieceType.PAWN:
-        # Forward move
-        new_row = row + direction
-        if is_valid_square(new_row, col) and not board[new_row][col]:
-            moves.append(Square(row=new_row, col=col))
-            # Double move from starting position
-            start_row = 6 if piece.color == PieceColor.WHITE else 1
-            if row == start_row:
-                double_row = row + 2 * direction
-                if is_valid_square(double_row, col) and not board[double_row][col]:
-                    moves.append(Square(row=double_row, col=col))
-
-        # Diagonal captures
-        for dc in [-1, 1]:
-            capture_col = col + dc
-            if is_valid_square(new_row, capture_col):
-                target = board[new_row][capture_col]
-                if target and target.color != piece.color:
-                    moves.append(Square(row=new_row, col=capture_col))
-
-    elif piece.type == PieceType.KNIGHT:
-        knight_moves = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1)]
-        for dr, dc in knight_moves:
-            new_row, new_col = row + dr, col + dc
-            if is_valid_square(new_row, new_col):
-                target = board[new_row][new_col]
-                if not target or target.color != piece.color:
-                    moves.append(Square(row=new_row, col=new_col))
-
-    elif piece.type == PieceType.BISHOP:
-        # Diagonal moves
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            while is_valid_square(r, c):
-                target = board[r][c]
-                if target:
-                    if target.color != piece.color:
-                        moves.append(Square(row=r, col=c))
-                    break
-                moves.append(Square(row=r, col=c))
-                r += dr
-                c += dc
-
-    elif piece.type == PieceType.ROOK:
-        # Horizontal and vertical moves
-        directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            while is_valid_square(r, c):
-                target = board[r][c]
-                if target:
-                    if target.color != piece.color:
-                        moves.append(Square(row=r, col=c))
-                    break
-                moves.append(Square(row=r, col=c))
-                r += dr
-                c += dc
-
-    elif piece.type == PieceType.QUEEN:
-        # Combination of bishop and rook moves
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1),
-                     (-1, 0), (1, 0), (0, -1), (0, 1)]
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            while is_valid_square(r, c):
-                target = board[r][c]
-                if target:
-                    if target.color != piece.color:
-                        moves.append(Square(row=r, col=c))
-                    break
-                moves.append(Square(row=r, col=c))
-                r += dr
-                c += dc
-
-    elif piece.type == PieceType.KING:
-        # One square in any direction
-        for dr in [-1, 0, 1]:
-            for dc in [-1, 0, 1]:
-                if dr == 0 and dc == 0:
-                    continue
-                r, c = row + dr, col + dc
-                if is_valid_square(r, c):
-                    target = board[r][c]
-                    if not target or target.color != piece.color:
-                        moves.append(Square(row=r, col=c))
-
-    return moves
+    bbs = bitboard.from_board(board)
+    color = bitboard.COLOR_INDEX[piece.color]
+    own = bitboard.occupancy(bbs, color)
+    enemy = bitboard.occupancy(bbs, color ^ 1)
+    targets = bitboard.piece_targets(
+        bitboard.TYPE_INDEX[piece.type], color, bitboard.square_index(square), own, enemy
+    )
+    return bitboard.mask_to_squares(targets)
+
+
+def legal_move_index(game_state) -> Dict[int, int]:
+    """From square index -> target mask for the side to move, with must-capture applied.
+
+    Built once per state and kept on it, so piece clicks and move validation
+    are lookups instead of move generation. It is never stored with the game:
+    only the game cache keeps states between requests, so with the cache off
+    each request builds it again.
+    """
+    if game_state.legal_move_index is None:
+        core = CompactBoard.from_board_state(game_state.board, game_state.current_turn)
+        game_state.legal_move_index = core.move_index(must_capture_mask(game_state.take_me_state))
+    return game_state.legal_move_index
+
+
+def legal_targets(game_state, square: Square) -> List[Square]:
+    """Destinations of the piece on square, with must-capture applied.
+
+    Pieces of the side not to move get their pseudo-legal targets, so clients
+    can show what they threaten.
+    """
+    piece = game_state.board[square.row][square.col]
+    if piece and piece.color != game_state.current_turn:
+        allowed = must_capture_mask(game_state.take_me_state)
+        return [target for target in get_legal_moves(game_state.board, square)
+                if allowed >> bitboard.square_index(target) & 1]
+    return bitboard.mask_to_squares(legal_move_index(game_state).get(bitboard.square_index(square), 0))
 
 
 def execute_move(board: BoardState, move: Move) -> BoardState:
@@ -122,10 +79,7 @@ def execute_move(board: BoardState, move: Move) -> BoardState:
 
     # Handle promotion
     if move.is_promotion and move.promotion_piece:
-        new_board[move.to.row][move.to.col] = Piece(
-            type=move.promotion_piece,
-            color=piece.color
-        )
+        new_board[move.to.row][move.to.col] = PIECES[(move.promotion_piece, piece.color)]
 
     return new_board
 
@@ -164,126 +118,136 @@ def get_board_hash(board: BoardState, current_turn: PieceColor, must_capture: bo
     return f"{board_str}:{current_turn[0]}:{must_capture}"
 
 
-def check_game_over(game_state) -> Optional[Tuple[str, Optional[Player]]]:
-    """Check if the game is over and return (status, winner)"""
-    piece_count = count_pieces(game_state.board)
-    
+def get_position_hash(board: BoardState, current_turn: PieceColor, must_capture: bool) -> str:
+    """Generate the Zobrist key of a position, formatted for position_history"""
+    key = zobrist.hash_bitboards(bitboard.from_board(board), bitboard.COLOR_INDEX[current_turn], must_capture)
+    return zobrist.format_hash(key)
+
+
+def next_position_hash(previous_hash: Optional[str], move: Move, new_board: BoardState,
+                       next_turn: PieceColor, must_capture_before: bool, must_capture_after: bool) -> str:
+    """Hash of the position after a move, updated incrementally from the previous hash.
+
+    Games started before Zobrist hashing keep using the legacy string hash so
+    repetition counting stays consistent with their stored position history.
+    """
+    if previous_hash is None:
+        return get_position_hash(new_board, next_turn, must_capture_after)
+    if not zobrist.is_zobrist_hash(previous_hash):
+        return get_board_hash(new_board, next_turn, must_capture_after)
+
+    color = bitboard.COLOR_INDEX[move.piece.color]
+    moved = bitboard.piece_index(color, bitboard.TYPE_INDEX[move.piece.type])
+    placed = moved
+    if move.is_promotion and move.promotion_piece:
+        placed = bitboard.piece_index(color, bitboard.TYPE_INDEX[move.promotion_piece])
+    captured = -1
+    if move.captured_piece:
+        captured = bitboard.piece_index(bitboard.COLOR_INDEX[move.captured_piece.color],
+                                        bitboard.TYPE_INDEX[move.captured_piece.type])
+    delta = zobrist.move_delta(moved, bitboard.square_index(move.from_), bitboard.square_index(move.to),
+                               placed, captured)
+    key = zobrist.update_hash(zobrist.parse_hash(previous_hash), delta, must_capture_before, must_capture_after)
+    return zobrist.format_hash(key)
+
+
+def count_positions(position_history: List[str]) -> Dict[str, int]:
+    """Build the hash -> occurrences map used for repetition checks"""
+    return dict(Counter(position_history))
+
+
+def record_position(game_state, position_hash: str) -> Tuple[List[str], Dict[str, int]]:
+    """Return the position history and repetition counts with a new position added"""
+    # Copied so the state it came from (possibly cached) is left untouched
+    counts = dict(game_state.position_counts)
+    if not counts and game_state.position_history:
+        counts = count_positions(game_state.position_history)
+    counts[position_hash] = counts.get(position_hash, 0) + 1
+    return game_state.position_history + [position_hash], counts
+
+
+def apply_move(core: CompactBoard, move: Move) -> int:
+    """Play a Move on a compact board in place and return the captured piece code"""
+    promotion = -1
+    if move.is_promotion and move.promotion_piece:
+        promotion = bitboard.TYPE_INDEX[move.promotion_piece]
+    return core.make_move(bitboard.square_index(move.from_), bitboard.square_index(move.to), promotion)
+
+
+def must_capture_mask(take_me_state: TakeMeState) -> int:
+    """Squares the side to move is allowed to land on"""
+    if take_me_state.must_capture:
+        return bitboard.squares_to_mask(take_me_state.capturable_pieces)
+    return bitboard.FULL
+
+
+def evaluate_game_over(core: CompactBoard, players: List[Player], target_mask: int = bitboard.FULL,
+                       repetitions: int = 0) -> Optional[Tuple[str, Optional[Player]]]:
+    """Check game over on a compact board whose side to move is core.turn"""
     # 1. Win by losing all pieces
-    if piece_count["white"] == 0:
-        winner = next((p for p in game_state.players if p.color == PieceColor.WHITE), None)
+    if not core.occupancy(bitboard.WHITE):
+        winner = next((p for p in players if p.color == PieceColor.WHITE), None)
         return (GameStatus.WIN, winner)
-    if piece_count["black"] == 0:
-        winner = next((p for p in game_state.players if p.color == PieceColor.BLACK), None)
+    if not core.occupancy(bitboard.BLACK):
+        winner = next((p for p in players if p.color == PieceColor.BLACK), None)
         return (GameStatus.WIN, winner)
-        
-    # 2. Check stalemate (no legal moves for current player)
-    current_color = game_state.current_turn
-    has_moves = False
-    for row in range(8):
-        for col in range(8):
-            piece = game_state.board[row][col]
-            if piece and piece.color == current_color:
-                moves = get_legal_moves(game_state.board, Square(row=row, col=col))
-                
-                # Filter if must capture
-                if game_state.take_me_state.must_capture:
-                    moves = [m for m in moves if any(cp.row == m.row and cp.col == m.col 
-                                                   for cp in game_state.take_me_state.capturable_pieces)]
-                
-                if moves:
-                    has_moves = True
-                    break
-        if has_moves:
-            break
-            
-    if not has_moves:
-        # Stalemate - player has no legal moves, this is a draw
+
+    # 2. Stalemate - player has no legal moves, this is a draw
+    if not core.has_moves(target_mask):
         return (GameStatus.DRAW, None)
-        
+
     # 3. Threefold Repetition
-    current_hash = get_board_hash(game_state.board, game_state.current_turn, game_state.take_me_state.must_capture)
-    count = 0
-    for h in game_state.position_history:
-        if h == current_hash:
-            count += 1
-    
-    if count >= 3:
+    if repetitions >= 3:
         return (GameStatus.DRAW, None)
-        
+
     return None
 
 
+def check_game_over(game_state) -> Optional[Tuple[str, Optional[Player]]]:
+    """Check if the game is over and return (status, winner)"""
+    core = CompactBoard.from_board_state(game_state.board, game_state.current_turn)
+
+    # The caller has already appended the current position to the history
+    if game_state.position_history:
+        current_hash = game_state.position_history[-1]
+    else:
+        current_hash = get_position_hash(game_state.board, game_state.current_turn,
+                                         game_state.take_me_state.must_capture)
+    if game_state.position_counts:
+        count = game_state.position_counts.get(current_hash, 0)
+    else:
+        count = game_state.position_history.count(current_hash)
+
+    return evaluate_game_over(core, game_state.players, must_capture_mask(game_state.take_me_state), count)
+
+
 def check_stalemate(board: BoardState, color: PieceColor) -> bool:
     """Check if the current player is in stalemate"""
     # Simplified check - no legal moves
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece and piece.color == color:
-                moves = get_legal_moves(board, Square(row=row, col=col))
-                if moves:
-                    return False
-    return True
+    return not bitboard.has_moves(bitboard.from_board(board), bitboard.COLOR_INDEX[color])
 
 
-def find_exposed_pieces(board: BoardState, color: PieceColor) -> List[Square]:
+def build_attack_map(board: BoardState) -> bitboard.AttackMap:
+    """Compute which squares each color attacks, for both colors at once"""
+    return bitboard.AttackMap(bitboard.from_board(board))
+
+
+def find_exposed_pieces(board: BoardState, color: PieceColor,
+                        attack_map: Optional[bitboard.AttackMap] = None) -> List[Square]:
     """Find pieces that are under attack"""
-    exposed = []
-    enemy_color = PieceColor.BLACK if color == PieceColor.WHITE else PieceColor.WHITE
-
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece and piece.color == color:
-                # Check if any enemy piece can capture this piece
-                enemy_can_capture = False
-                for enemy_row in range(8):
-                    for enemy_col in range(8):
-                        enemy_piece = board[enemy_row][enemy_col]
-                        if enemy_piece and enemy_piece.color == enemy_color:
-                            enemy_moves = get_legal_moves(board, Square(row=enemy_row, col=enemy_col))
-                            if any(move.row == row and move.col == col for move in enemy_moves):
-                                enemy_can_capture = True
-                                break
-                    if enemy_can_capture:
-                        break
-
-                if enemy_can_capture:
-                    exposed.append(Square(row=row, col=col))
-
-    return exposed
-
-
-def get_capturable_pieces_after_take_me(board: BoardState, attacker_color: PieceColor) -> List[Square]:
-    """Get pieces that can be captured after Take Me! declaration"""
-    capturable_squares = set()
-
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece and piece.color == attacker_color:
-                moves = get_legal_moves(board, Square(row=row, col=col))
-                for move in moves:
-                    target = board[move.row][move.col]
-                    if target and target.color != attacker_color:
-                        capturable_squares.add(f"{move.row},{move.col}")
-
-    return [Square(row=int(key.split(',')[0]), col=int(key.split(',')[1]))
-            for key in capturable_squares]
+    attacks = attack_map or build_attack_map(board)
+    return bitboard.mask_to_squares(attacks.exposed(bitboard.COLOR_INDEX[color]))
+
+
+def get_capturable_pieces_after_take_me(board: BoardState, attacker_color: PieceColor,
+                                        attack_map: Optional[bitboard.AttackMap] = None) -> List[Square]:
+    """Get pieces that can be captured after Take Me! declaration, in board order (row, then column)"""
+    attacks = attack_map or build_attack_map(board)
+    return bitboard.mask_to_squares(attacks.capturable(bitboard.COLOR_INDEX[attacker_color]))
 
 
 def get_capture_moves(board: BoardState, color: PieceColor) -> List[Tuple[Square, Square]]:
     """Get all possible capture moves for a color"""
-    captures = []
-
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece and piece.color == color:
-                moves = get_legal_moves(board, Square(row=row, col=col))
-                for move in moves:
-                    target = board[move.row][move.col]
-                    if target and target.color != color:
-                        captures.append((Square(row=row, col=col), move))
-
-    return captures
\ No newline at end of file
+    bbs = bitboard.from_board(board)
+    return [(bitboard.index_square(from_sq), bitboard.index_square(to_sq))
+            for from_sq, to_sq in bitboard.generate_captures(bbs, bitboard.COLOR_INDEX[color])]
@@ -0,0 +1,123 @@
+"""In-memory top-N leaderboard in front of the database backends.
+
+``get_leaderboard`` is the most frequent read, and each call used to sort the
+whole leaderboard table. The backends now keep the top
+``LEADERBOARD_CACHE_SIZE`` rows overall and per game mode, and serve any
+``limit`` up to that size from memory.
+
+Rows are ordered by ``rank_key``: wins, then score, then id, best first.
+Recorded results keep the lists current without a reload. The upsert returns
+each changed row, and the row is moved to its new place in the cached lists.
+A row outside a full list only enters it by passing the last row. A listed
+row that falls behind the last row could have been passed by unlisted ones,
+so that list is dropped and reloaded on the next read.
+
+Results recorded by other API processes are not seen. Each list is therefore
+reloaded once it is ``LEADERBOARD_CACHE_TTL_SECONDS`` old, which bounds how
+stale a worker's leaderboard can get.
+"""
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from models import GameMode, LeaderboardEntry
+
+RankKey = Tuple[int, int, int]
+RankedEntry = Tuple[RankKey, LeaderboardEntry]
+
+
+def rank_key(row) -> RankKey:
+    """Leaderboard order of a row, highest first"""
+    return (row.wins, row.score, row.id)
+
+
+class LeaderboardCacheSettings(NamedTuple):
+    size: int = 100
+    ttl_seconds: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "LeaderboardCacheSettings":
+        return cls(
+            size=int(os.getenv("LEADERBOARD_CACHE_SIZE", cls._field_defaults["size"])),
+            ttl_seconds=float(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", cls._field_defaults["ttl_seconds"])),
+        )
+
+
+class _Top:
+    __slots__ = ("entries", "complete", "loaded")
+
+    def __init__(self, entries: List[RankedEntry], complete: bool):
+        self.entries = entries
+        # The list holds every row of its mode, so any new row belongs in it
+        self.complete = complete
+        self.loaded = time.monotonic()
+
+
+class LeaderboardCache:
+    """Thread-safe top-N lists keyed by game mode (None for all modes); does no I/O itself"""
+
+    def __init__(self, settings: LeaderboardCacheSettings):
+        self.settings = settings
+        self._tops: Dict[Optional[GameMode], _Top] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.size > 0
+
+    def fetch_size(self, limit: int) -> int:
+        """Rows to query on a miss, so the result can also be cached"""
+        return max(limit, self.settings.size) if self.enabled else limit
+
+    def get(self, game_mode: Optional[GameMode], limit: int) -> Optional[List[LeaderboardEntry]]:
+        with self._lock:
+            top = self._tops.get(game_mode)
+            if top is None:
+                return None
+            if time.monotonic() - top.loaded > self.settings.ttl_seconds:
+                del self._tops[game_mode]
+                return None
+            if limit > len(top.entries) and not top.complete:
+                return None
+            return [entry for _, entry in top.entries[:limit]]
+
+    def put(self, game_mode: Optional[GameMode], entries: List[RankedEntry], fetched: int) -> None:
+        """Cache the rows a query for the top ``fetched`` returned, best first"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._tops[game_mode] = _Top(list(entries), len(entries) < fetched)
+
+    def record(self, rows: Iterable[RankedEntry]) -> None:
+        """Move rows just written to their place in the cached lists"""
+        with self._lock:
+            for key, row in rows:
+                for game_mode in (None, row.game_mode):
+                    top = self._tops.get(game_mode)
+                    if top is not None and not self._place(top, key, row):
+                        del self._tops[game_mode]
+
+    def _place(self, top: _Top, key: RankKey, row: LeaderboardEntry) -> bool:
+        """Move a row in a list; False when the list can no longer be trusted"""
+        # Keys end with the row id, so the row's old place is the key with the same id
+        old_key = next((k for k, _ in top.entries if k[2] == key[2]), None)
+        entries = [(k, entry) for k, entry in top.entries if k[2] != key[2]]
+        if not top.complete:
+            if old_key is None:
+                # Not listed: it only enters by passing the last row, which it pushes out
+                if key <= entries[-1][0]:
+                    return True
+                entries.pop()
+            elif key < old_key and not (entries and key > entries[-1][0]):
+                return False
+        position = len(entries)
+        while position > 0 and entries[position - 1][0] < key:
+            position -= 1
+        entries.insert(position, (key, row))
+        top.entries = entries
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tops.clear()
@@ -1,62 +1,78 @@
-from fastapi import FastAPI, HTTPException, Query
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 from datetime import datetime
 from models import *
-from database import db
-from game_logic import get_legal_moves, execute_move, should_promote, check_game_over, count_pieces, get_capture_moves, find_exposed_pieces, get_capturable_pieces_after_take_me, get_board_hash
-from bot import get_bot_move
+from database import AsyncSQLAlchemyDatabase, StaleGameError, db, run_db
+from game_logic import legal_move_index, legal_targets
+import bitboard
+from bot_pool import get_executor, shutdown_pool
+from turns import TurnError, is_bot_turn, leaderboard_entries, play_bot_turn, play_turn
+from tablebase import get_tablebase
+from opening_book import get_opening_book
+from game_events import hub, sync_message
+from game_archive import ArchiveSettings
+
+logger = logging.getLogger(__name__)
+archive_settings = ArchiveSettings.from_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if isinstance(db, AsyncSQLAlchemyDatabase):
+        await db.create_tables()
+    # Map the endgame tablebase and opening book and start the bot search
+    # workers (each if configured) before the first bot turn
+    get_tablebase()
+    get_opening_book()
+    get_executor()
+    if db.cache.write_behind and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        logger.warning("GAME_CACHE_WRITE_BEHIND_MS is set with WEB_CONCURRENCY above 1: workers will read "
+                       "stale games and overwrite each other's moves; use one worker or write-behind 0")
+    flusher = asyncio.create_task(flush_game_cache()) if db.cache.write_behind else None
+    archiver = asyncio.create_task(archive_games()) if archive_settings.interval_seconds > 0 else None
+    yield
+    if flusher:
+        flusher.cancel()
+    if archiver:
+        archiver.cancel()
+    # Write out any cached moves before the process exits
+    await run_db(db.flush_games)
+    shutdown_pool()
+
+
+async def flush_game_cache():
+    """Persist write-behind game updates on the configured interval"""
+    while True:
+        await asyncio.sleep(db.cache.settings.write_behind_ms / 1000)
+        try:
+            await run_db(db.flush_games)
+        except Exception:
+            logger.exception("Failed to flush cached games; retrying on the next interval")
+
+
+async def archive_games():
+    """Move finished games to the archive and delete abandoned ones on the configured interval"""
+    while True:
+        await asyncio.sleep(archive_settings.interval_seconds)
+        try:
+            archived, deleted = await run_db(db.archive_games, archive_settings)
+            if archived or deleted:
+                logger.info("Archived %d finished games, deleted %d abandoned games", archived, deleted)
+        except Exception:
+            logger.exception("Failed to archive games; retrying on the next interval")
+
 
 app = FastAPI(
     title="Take-Me Chess API",
     description="Backend API for Take-Me Chess game",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-# Piece values for scoring
-PIECE_VALUES = {
-    PieceType.KING: 0,
-    PieceType.QUEEN: 9,
-    PieceType.ROOK: 5,
-    PieceType.BISHOP: 3,
-    PieceType.KNIGHT: 3,
-    PieceType.PAWN: 1
-}
-
-def update_leaderboard_on_game_over(game_state: GameState):
-    """Update leaderboard entries for all human players when game ends"""
-    if game_state.status not in [GameStatus.WIN, GameStatus.DRAW]:
-        return
-
-    # Map game mode
-    game_mode = GameMode.SINGLE_PLAYER if any(p.is_bot for p in game_state.players) else GameMode.TWO_PLAYER
-
-    for player in game_state.players:
-        if player.is_bot:
-            continue
-            
-        wins = 0
-        losses = 0
-        draws = 0
-        
-        if game_state.status == GameStatus.DRAW:
-            draws = 1
-        elif game_state.winner and game_state.winner.id == player.id:
-            wins = 1
-        else:
-            losses = 1
-            
-        entry = LeaderboardEntry(
-            player_name=player.name,
-            wins=wins,
-            losses=losses,
-            draws=draws,
-            score=player.score,
-            game_mode=game_mode,
-            last_played=datetime.now()
-        )
-        db.add_leaderboard_entry(entry)
-
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -80,31 +96,83 @@ async def root():
 async def create_game(request: CreateGameRequest):
     """Create a new game session"""
     try:
-        game_state = db.create_game(request.game_mode, request.players)
+        game_state = await run_db(db.create_game, request.game_mode, request.players,
+                                  request.bot_difficulty, request.bot_time_budget_ms)
         return game_state
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create game: {str(e)}")
 
 
 @app.get("/games/{game_id}", response_model=GameState)
-async def get_game(game_id: str):
-    """Get game state"""
-    game_state = db.get_game(game_id)
+async def get_game(game_id: str, response: Response,
+                   history_limit: Optional[int] = Query(None, ge=0),
+                   since_ply: Optional[int] = Query(None, ge=0),
+                   if_none_match: Optional[str] = Header(None)):
+    """Get game state, with only the last ``history_limit`` moves or the moves from ``since_ply`` if given.
+
+    The response carries the game's version as its ETag; a request whose
+    If-None-Match still matches gets a 304 without the game being loaded.
+    """
+    if if_none_match:
+        version = await run_db(db.get_game_version, game_id)
+        if version is None:
+            raise HTTPException(status_code=404, detail="Game not found")
+        if etag_matches(if_none_match, game_etag(version)):
+            return Response(status_code=304, headers={"ETag": game_etag(version)})
+
+    game_state = await run_db(db.get_game, game_id)
     if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
-    return game_state
+    response.headers["ETag"] = game_etag(game_state.version)
+    if since_ply is not None:
+        since_limit = max(game_state.move_count - since_ply, 0)
+        history_limit = since_limit if history_limit is None else min(history_limit, since_limit)
+    return truncate_history(game_state, history_limit)
+
+
+def game_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@app.get("/games/{game_id}/moves")
+async def get_moves(game_id: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=500)):
+    """Page through a game's move history"""
+    page = await run_db(db.get_moves, game_id, offset, limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Game not found")
+    moves, move_count = page
+    return {"moves": moves, "offset": offset, "move_count": move_count}
+
+
+def truncate_history(game_state: GameState, history_limit: Optional[int]) -> GameState:
+    """A response copy holding only the last history_limit moves and positions"""
+    if history_limit is None:
+        return game_state
+    return game_state.model_copy(update={
+        "move_history": game_state.move_history[-history_limit:] if history_limit else [],
+        "position_history": game_state.position_history[-history_limit:] if history_limit else []
+    })
 
 
 @app.delete("/games/{game_id}")
 async def end_game(game_id: str):
     """End game session"""
-    game_state = db.get_game(game_id)
+    game_state = await run_db(db.get_game, game_id)
     if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    success = db.delete_game(game_id)
+    success = await run_db(db.delete_game, game_id)
     if not success:
         raise HTTPException(status_code=500, detail="Failed to end game")
+    hub.publish_ended(game_id)
 
     return {
         "message": "Game ended successfully",
@@ -113,107 +181,16 @@ async def end_game(game_id: str):
 
 
 @app.post("/games/{game_id}/moves", response_model=GameState)
-async def make_move(game_id: str, request: MakeMoveRequest):
+async def make_move(game_id: str, request: MakeMoveRequest,
+                    history_limit: Optional[int] = Query(None, ge=0)):
     """Make a move"""
-    game_state = db.get_game(game_id)
-    if not game_state:
-        raise HTTPException(status_code=404, detail="Game not found")
-
-    if game_state.status != GameStatus.ACTIVE:
-        raise HTTPException(status_code=400, detail="Game is not active")
-
-    # Check if it's the player's turn
-    piece = game_state.board[request.from_.row][request.from_.col]
-    if not piece or piece.color != game_state.current_turn:
-        raise HTTPException(status_code=403, detail="Not your turn")
-
-    # Validate the move
-    legal_moves = get_legal_moves(game_state.board, request.from_)
-    if not any(move.row == request.to.row and move.col == request.to.col for move in legal_moves):
-        raise HTTPException(status_code=400, detail="Invalid move")
-
-    # Filter moves if must capture
-    if game_state.take_me_state.must_capture:
-        capturable_moves = [move for move in legal_moves
-                           if any(cp.row == move.row and cp.col == move.col
-                                 for cp in game_state.take_me_state.capturable_pieces)]
-        if not any(move.row == request.to.row and move.col == request.to.col for move in capturable_moves):
-            raise HTTPException(status_code=400, detail="Must capture exposed piece")
-
-    # Create the move
-    captured_piece = game_state.board[request.to.row][request.to.col]
-    move = Move(
-        from_=request.from_,
-        to=request.to,
-        piece=piece,
-        captured_piece=captured_piece,
-        is_promotion=should_promote(piece, request.to.row),
-        promotion_piece=request.promotion_piece if should_promote(piece, request.to.row) else None
-    )
-
-    # Execute the move
-    new_board = execute_move(game_state.board, move)
-    new_piece_count = count_pieces(new_board)
-
-    # Update game state
-    next_turn = PieceColor.BLACK if game_state.current_turn == PieceColor.WHITE else PieceColor.WHITE
-    
-    # New state after the move
-    new_take_me_state = TakeMeState(declared=False, exposed_pieces=[], capturable_pieces=[], must_capture=False)
-    new_position_hash = get_board_hash(new_board, next_turn, new_take_me_state.must_capture)
-    new_position_history = game_state.position_history + [new_position_hash]
-
-    # Check game over with NEW state
-    game_over = check_game_over(game_state.copy(update={
-        "board": new_board, 
-        "current_turn": next_turn, 
-        "take_me_state": new_take_me_state,
-        "position_history": new_position_history
-    }))
-    
-    updated_game = game_state.copy(update={
-        "board": new_board,
-        "current_turn": next_turn,
-        "selected_piece": None,
-        "legal_moves": [],
-        "message": None,
-        "move_history": game_state.move_history + [move],
-        "position_history": new_position_history,
-        "take_me_state": new_take_me_state,
-        "piece_count": new_piece_count,
-        "status": game_over[0] if game_over else GameStatus.ACTIVE,
-        "winner": game_over[1] if game_over else None,
-        "updated_at": datetime.now()
-    })
-
-    # Update score if there was a capture
-    if captured_piece:
-        points = PIECE_VALUES.get(captured_piece.type, 0)
-        # Award points to the player whose piece was captured
-        for player in updated_game.players:
-            if player.color == captured_piece.color:
-                player.score += points
-                break
-
-    db.update_game(updated_game)
-    
-    if game_over:
-        update_leaderboard_on_game_over(updated_game)
-    
-    # If next player is bot, make bot move
-    if not game_over and any(p.is_bot and p.color == next_turn for p in updated_game.players):
-        await get_bot_move_endpoint(game_id)
-        # Fetch the latest state after bot move
-        final_game_state = db.get_game(game_id)
-        return final_game_state if final_game_state else updated_game
-
-    return updated_game
+    return truncate_history(await run_human_turn(game_id, request, declare_take_me=False), history_limit)
 
 
 @app.post("/games/{game_id}/moves/validate", response_model=ValidationResponse)
 async def validate_move(game_id: str, request: MakeMoveRequest):
     """Validate a potential move"""
-    game_state = db.get_game(game_id)
+    game_state = await run_db(db.get_game, game_id)
     if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
 
@@ -221,15 +198,9 @@ async def validate_move(game_id: str, request: MakeMoveRequest):
     if not piece or piece.color != game_state.current_turn:
         return ValidationResponse(valid=False, error="Not your turn")
 
-    legal_moves = get_legal_moves(game_state.board, request.from_)
-
-    # Filter for must capture
-    if game_state.take_me_state.must_capture:
-        legal_moves = [move for move in legal_moves
-                      if any(cp.row == move.row and cp.col == move.col
-                            for cp in game_state.take_me_state.capturable_pieces)]
-
-    is_valid = any(move.row == request.to.row and move.col == request.to.col for move in legal_moves)
+    targets = legal_move_index(game_state).get(bitboard.square_index(request.from_), 0)
+    is_valid = bool(targets >> bitboard.square_index(request.to) & 1)
+    legal_moves = bitboard.mask_to_squares(targets)
 
     return ValidationResponse(
         valid=is_valid,
@@ -239,217 +210,54 @@ async def validate_move(game_id: str, request: MakeMoveRequest):
 
 
 @app.post("/games/{game_id}/take-me", response_model=GameState)
-async def declare_take_me(game_id: str, request: DeclareTakeMeRequest):
+async def declare_take_me(game_id: str, request: DeclareTakeMeRequest,
+                          history_limit: Optional[int] = Query(None, ge=0)):
     """Declare Take Me!"""
-    game_state = db.get_game(game_id)
-    if not game_state:
-        raise HTTPException(status_code=404, detail="Game not found")
+    return truncate_history(await run_human_turn(game_id, request, declare_take_me=True), history_limit)
 
-    if game_state.status != GameStatus.ACTIVE:
-        raise HTTPException(status_code=400, detail="Game is not active")
 
-    piece = game_state.board[request.from_.row][request.from_.col]
-    if not piece or piece.color != game_state.current_turn:
-        raise HTTPException(status_code=403, detail="Not your turn")
-
-    # Validate the move
-    legal_moves = get_legal_moves(game_state.board, request.from_)
-    if not any(move.row == request.to.row and move.col == request.to.col for move in legal_moves):
-        raise HTTPException(status_code=400, detail="Invalid move")
-
-    # Create the move
-    captured_piece = game_state.board[request.to.row][request.to.col]
-    move = Move(
-        from_=request.from_,
-        to=request.to,
-        piece=piece,
-        captured_piece=captured_piece,
-        is_promotion=should_promote(piece, request.to.row),
-        promotion_piece=request.promotion_piece if should_promote(piece, request.to.row) else None
-    )
+async def run_human_turn(game_id: str, request, declare_take_me: bool) -> GameState:
+    """Load once, play the move and any bot reply in memory, then write once"""
+    game_state = await run_db(db.get_game, game_id)
+    if not game_state:
+        raise HTTPException(status_code=404, detail="Game not found")
 
-    # Execute the move
-    new_board = execute_move(game_state.board, move)
-    new_piece_count = count_pieces(new_board)
-
-    # Find exposed pieces and capturable pieces
-    exposed_pieces = find_exposed_pieces(new_board, game_state.current_turn)
-    next_turn_color = PieceColor.BLACK if game_state.current_turn == PieceColor.WHITE else PieceColor.WHITE
-    capturable_pieces = get_capturable_pieces_after_take_me(new_board, next_turn_color)
-
-    # Update game state
-    next_turn = PieceColor.BLACK if game_state.current_turn == PieceColor.WHITE else PieceColor.WHITE
-    
-    new_take_me_state = TakeMeState(
-        declared=True,
-        declarer=game_state.current_turn,
-        exposed_pieces=exposed_pieces,
-        capturable_pieces=capturable_pieces,
-        must_capture=len(capturable_pieces) > 0
-    )
+    try:
+        updated_game = await play_turn(game_state, request.from_, request.to,
+                                       request.promotion_piece, declare_take_me)
+    except TurnError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    # CHECK FOR PENALTY: "Take Me!" but no captures possible
-    message = None
-    if len(capturable_pieces) == 0:
-        new_take_me_state.declared = False # Reset declaration
-        message = "take who??"
-        # Deduct 5 points from the current player
-        for p in game_state.players:
-            if p.color == game_state.current_turn:
-                p.score -= 5
-                break
-    new_position_hash = get_board_hash(new_board, next_turn, new_take_me_state.must_capture)
-    new_position_history = game_state.position_history + [new_position_hash]
-
-    # Check game over
-    game_over = check_game_over(game_state.copy(update={
-        "board": new_board, 
-        "current_turn": next_turn,
-        "take_me_state": new_take_me_state,
-        "position_history": new_position_history
-    }))
-
-    updated_game = game_state.copy(update={
-        "board": new_board,
-        "current_turn": next_turn,
-        "selected_piece": None,
-        "legal_moves": [],
-        "take_me_state": new_take_me_state,
-        "message": message,
-        "move_history": game_state.move_history + [move],
-        "position_history": new_position_history,
-        "piece_count": new_piece_count,
-        "status": game_over[0] if game_over else GameStatus.ACTIVE,
-        "winner": game_over[1] if game_over else None,
-        "updated_at": datetime.now()
-    })
+    updated_game = await save_turn(game_state, updated_game)
+    hub.publish_update(game_state, updated_game)
+    return updated_game
 
-    # Update score if there was a capture
-    if captured_piece:
-        points = PIECE_VALUES.get(captured_piece.type, 0)
-        # Award points to the player whose piece was captured
-        for player in updated_game.players:
-            if player.color == captured_piece.color:
-                player.score += points
-                break
-
-    db.update_game(updated_game)
-    
-    if game_over:
-        update_leaderboard_on_game_over(updated_game)
-    
-    # If next player is bot, make bot move
-    if not game_over and any(p.is_bot and p.color == next_turn for p in updated_game.players):
-        await get_bot_move_endpoint(game_id)
-        # Fetch the latest state after bot move
-        final_game_state = db.get_game(game_id)
-        return final_game_state if final_game_state else updated_game
 
-    return updated_game
+async def save_turn(game_state: GameState, updated_game: GameState) -> GameState:
+    """Write a turn computed from ``game_state``; 409 when another request saved the game first"""
+    try:
+        return await run_db(db.update_game, updated_game, leaderboard_entries(updated_game), game_state.version)
+    except StaleGameError:
+        raise HTTPException(status_code=409, detail="Game was updated by another request; reload it")
 
 
 @app.post("/games/{game_id}/bot-move")
-async def get_bot_move_endpoint(game_id: str):
-    """Get bot move"""
-    game_state = db.get_game(game_id)
+async def get_bot_move_endpoint(game_id: str, difficulty: Optional[BotDifficulty] = None):
+    """Get bot move, optionally overriding the game's bot difficulty"""
+    game_state = await run_db(db.get_game, game_id)
     if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
 
     if game_state.status != GameStatus.ACTIVE:
         raise HTTPException(status_code=400, detail="Game is not active")
 
-    # Find bot player
-    bot_player = next((p for p in game_state.players if p.is_bot and p.color == game_state.current_turn), None)
-    if not bot_player:
+    if not is_bot_turn(game_state):
         raise HTTPException(status_code=403, detail="Not bot's turn")
 
-    # Get bot move
-    bot_result = get_bot_move(
-        game_state.board,
-        game_state.current_turn,
-        game_state.take_me_state.must_capture,
-        game_state.take_me_state.capturable_pieces
-    )
-
-    if not bot_result:
-        # Bot has no moves - end game
-        updated_game = game_state.copy(update={
-            "status": GameStatus.DRAW,
-            "updated_at": datetime.now()
-        })
-        db.update_game(updated_game)
-        return {
-            "gameState": updated_game,
-            "botMove": None
-        }
-
-    # Execute bot move
-    new_board = execute_move(game_state.board, bot_result.move)
-    new_piece_count = count_pieces(new_board)
-
-    # Update take me state if bot declared
-    take_me_state = TakeMeState(declared=False, exposed_pieces=[], capturable_pieces=[], must_capture=False)
-    if bot_result.declare_take_me:
-        exposed_pieces = find_exposed_pieces(new_board, game_state.current_turn)
-        next_turn_color = PieceColor.BLACK if game_state.current_turn == PieceColor.WHITE else PieceColor.WHITE
-        capturable_pieces = get_capturable_pieces_after_take_me(new_board, next_turn_color)
-        take_me_state = TakeMeState(
-            declared=True,
-            declarer=game_state.current_turn,
-            exposed_pieces=exposed_pieces,
-            capturable_pieces=capturable_pieces,
-            must_capture=len(capturable_pieces) > 0
-        )
-
-    # Check game over after bot move
-    next_turn = PieceColor.BLACK if game_state.current_turn == PieceColor.WHITE else PieceColor.WHITE
-    new_position_hash = get_board_hash(new_board, next_turn, take_me_state.must_capture)
-    new_position_history = game_state.position_history + [new_position_hash]
-
-    game_over = check_game_over(game_state.copy(update={
-        "board": new_board, 
-        "current_turn": next_turn, 
-        "take_me_state": take_me_state,
-        "position_history": new_position_history
-    }))
-
-    updated_game = game_state.copy(update={
-        "board": new_board,
-        "current_turn": next_turn,
-        "selected_piece": None,
-        "legal_moves": [],
-        "take_me_state": take_me_state,
-        "move_history": game_state.move_history + [bot_result.move],
-        "position_history": new_position_history,
-        "piece_count": new_piece_count,
-        "status": game_over[0] if game_over else GameStatus.ACTIVE,
-        "winner": game_over[1] if game_over else None,
-        "updated_at": datetime.now()
-    })
-
-    # Update score if there was a capture
-    if bot_result.move.captured_piece:
-        points = PIECE_VALUES.get(bot_result.move.captured_piece.type, 0)
-        # Award points to the player whose piece was captured
-        for player in updated_game.players:
-            if player.color == bot_result.move.captured_piece.color:
-                player.score += points
-                break
-
-    # Penalty check for bot's "Take Me!" declaration
-    if take_me_state.declared and not take_me_state.must_capture:
-        take_me_state.declared = False
-        updated_game.message = "take who??"
-        for player in updated_game.players:
-            if player.color == game_state.current_turn:
-                player.score -= 5
-                break
-        updated_game.take_me_state = take_me_state
-
-    db.update_game(updated_game)
-
-    if game_over:
-        update_leaderboard_on_game_over(updated_game)
+    # Get bot move (searched in the worker pool when one is configured)
+    updated_game, bot_result = await play_bot_turn(game_state, difficulty)
+    await save_turn(game_state, updated_game)
+    hub.publish_update(game_state, updated_game)
 
     return {
         "gameState": updated_game,
@@ -464,20 +272,79 @@ async def get_legal_moves_endpoint(
     col: int = Query(..., ge=0, le=7)
 ):
     """Get legal moves for a piece"""
-    game_state = db.get_game(game_id)
+    game_state = await run_db(db.get_game, game_id)
+    if not game_state:
+        raise HTTPException(status_code=404, detail="Game not found")
+
+    return {"legal_moves": legal_targets(game_state, SQUARES[row * 8 + col])}
+
+
+@app.get("/games/{game_id}/legal-moves/all")
+async def get_all_legal_moves(game_id: str):
+    """Legal moves of every piece of the side to move, in one response"""
+    game_state = await run_db(db.get_game, game_id)
     if not game_state:
         raise HTTPException(status_code=404, detail="Game not found")
 
-    square = Square(row=row, col=col)
-    legal_moves = get_legal_moves(game_state.board, square)
+    return {
+        "current_turn": game_state.current_turn,
+        "must_capture": game_state.take_me_state.must_capture,
+        "moves": [
+            {"from": bitboard.index_square(from_sq), "to": bitboard.mask_to_squares(targets)}
+            for from_sq, targets in sorted(legal_move_index(game_state).items())
+        ]
+    }
 
-    # Filter for must capture
-    if game_state.take_me_state.must_capture:
-        legal_moves = [move for move in legal_moves
-                      if any(cp.row == move.row and cp.col == move.col
-                            for cp in game_state.take_me_state.capturable_pieces)]
 
-    return {"legal_moves": legal_moves}
+@app.websocket("/games/{game_id}/ws")
+async def game_updates(websocket: WebSocket, game_id: str, since: Optional[int] = None):
+    """Stream a game's updates as deltas; ``since`` resyncs a client that has seen that many plies"""
+    # Subscribed before the read, so no update published meanwhile is lost; the
+    # sender skips the ones the snapshot already holds
+    queue = hub.subscribe(game_id)
+    sender = None
+    try:
+        game_state = await run_db(db.get_game, game_id)
+        if not game_state:
+            await websocket.close(code=4404, reason="Game not found")
+            return
+        await websocket.accept()
+        sender = asyncio.create_task(send_game_updates(websocket, game_state, since, queue))
+        # Clients only listen; this returns when they disconnect
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if sender:
+            sender.cancel()
+        hub.unsubscribe(game_id, queue)
+
+
+async def send_game_updates(websocket: WebSocket, game_state: GameState, since: Optional[int],
+                            queue: asyncio.Queue) -> None:
+    synced = game_state.move_count
+    since = synced if since is None else max(0, min(since, synced))
+    missed = []
+    if since < synced:
+        page = await run_db(db.get_moves, game_state.id, since, synced - since)
+        if page is None:
+            # Deleted or purged between the game read and the moves read
+            await websocket.send_json({"type": "ended"})
+            await websocket.close()
+            return
+        missed, _ = page
+    await websocket.send_json(sync_message(game_state, since, missed))
+
+    while True:
+        message = await queue.get()
+        # Moves already in the sync were published just after it was read
+        if message["type"] == "delta" and message["moves"] and message["seq"] <= synced:
+            continue
+        await websocket.send_json(message)
+        if message["type"] in ("resync", "ended"):
+            await websocket.close()
+            return
 
 
 @app.get("/leaderboard", response_model=List[LeaderboardEntry])
@@ -486,16 +353,54 @@ async def get_leaderboard(
     limit: int = Query(10, ge=1, le=100)
 ):
     """Get leaderboard"""
-    return db.get_leaderboard(game_mode, limit)
+    return await run_db(db.get_leaderboard, game_mode, limit)
+
+
+def leaderboard_cursor(key: Optional[Tuple[int, int, int]]) -> Optional[str]:
+    """Opaque cursor for the row after which the next page starts"""
+    return ":".join(map(str, key)) if key else None
+
+
+def parse_leaderboard_cursor(cursor: str) -> Tuple[int, int, int]:
+    try:
+        wins, score, row_id = (int(part) for part in cursor.split(":"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return wins, score, row_id
+
+
+@app.get("/leaderboard/page")
+async def get_leaderboard_page(
+    game_mode: Optional[GameMode] = None,
+    limit: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """Page through the whole leaderboard; pass next_cursor back to get the following page"""
+    after = parse_leaderboard_cursor(cursor) if cursor else None
+    entries, last = await run_db(db.get_leaderboard_page, game_mode, limit, after)
+    return {"entries": entries, "next_cursor": leaderboard_cursor(last)}
+
+
+@app.get("/leaderboard/rank/{player_name}")
+async def get_player_rank(player_name: str, game_mode: Optional[GameMode] = None):
+    """A player's position on the leaderboard of each mode they have played, and overall"""
+    ranks = await run_db(db.get_player_rank, player_name, game_mode)
+    if not ranks:
+        raise HTTPException(status_code=404, detail="Player not on the leaderboard")
+    return {
+        "player_name": player_name,
+        "ranks": [{"game_mode": entry.game_mode, "rank": rank, "overall_rank": overall_rank, "entry": entry}
+                  for rank, overall_rank, entry in ranks]
+    }
 
 
 @app.post("/leaderboard")
 async def submit_game_result(entry: LeaderboardEntry):
     """Submit game result"""
-    db.add_leaderboard_entry(entry)
+    await run_db(db.add_leaderboard_entry, entry)
     return {
         "message": "Game result recorded successfully",
-        "updated_leaderboard": db.get_leaderboard(limit=10)
+        "updated_leaderboard": await run_db(db.get_leaderboard, limit=10)
     }
 
 
@@ -1,6 +1,6 @@
 from enum import Enum
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, RootModel
+from pydantic import BaseModel, Field, RootModel, field_validator
 from pydantic.config import ConfigDict
 from datetime import datetime
 
@@ -23,11 +23,46 @@ class Piece(BaseModel):
     type: PieceType
     color: PieceColor
 
+    model_config = ConfigDict(frozen=True)
+
 
 class Square(BaseModel):
     row: int = Field(ge=0, le=7)
     col: int = Field(ge=0, le=7)
 
+    model_config = ConfigDict(frozen=True)
+
+
+# Squares and pieces are immutable, so one shared instance of each is enough.
+# SQUARES is indexed by row * 8 + col; PIECES is keyed by (type, color).
+SQUARES = tuple(Square.model_construct(row=index >> 3, col=index & 7) for index in range(64))
+PIECES = {(ptype, color): Piece.model_construct(type=ptype, color=color)
+          for ptype in PieceType for color in PieceColor}
+
+
+def intern_square(value: Any, handler):
+    """Wrap validator resolving a square to its shared instance"""
+    if isinstance(value, Square):
+        return SQUARES[value.row * 8 + value.col]
+    if isinstance(value, dict):
+        row, col = value.get("row"), value.get("col")
+        if type(row) is int and type(col) is int and 0 <= row <= 7 and 0 <= col <= 7:
+            return SQUARES[row * 8 + col]
+    return handler(value)
+
+
+def intern_piece(value: Any, handler):
+    """Wrap validator resolving a piece to its shared instance"""
+    if isinstance(value, Piece):
+        return PIECES[(value.type, value.color)]
+    if isinstance(value, dict):
+        ptype, color = value.get("type"), value.get("color")
+        if isinstance(ptype, str) and isinstance(color, str):
+            piece = PIECES.get((ptype, color))
+            if piece is not None:
+                return piece
+    return handler(value)
+
 
 class Move(BaseModel):
     from_: Square = Field(alias="from")
@@ -39,6 +74,9 @@ class Move(BaseModel):
 
     model_config = ConfigDict(validate_by_name=True, from_attributes=True)
 
+    _intern_squares = field_validator("from_", "to", mode="wrap")(intern_square)
+    _intern_pieces = field_validator("piece", "captured_piece", mode="wrap")(intern_piece)
+
 
 class BoardState(RootModel[List[List[Optional[Piece]]]]):
     root: List[List[Optional[Piece]]] = Field(min_length=8, max_length=8)
@@ -76,6 +114,12 @@ class GameMode(str, Enum):
     TWO_PLAYER = "2P"
 
 
+class BotDifficulty(str, Enum):
+    EASY = "easy"
+    MEDIUM = "medium"
+    HARD = "hard"
+
+
 class TakeMeState(BaseModel):
     declared: bool
     declarer: Optional[PieceColor] = None
@@ -94,9 +138,21 @@ class GameState(BaseModel):
     selected_piece: Optional[Square] = None
     legal_moves: List[Square] = []
     take_me_state: TakeMeState
+    # May hold only the most recent moves; move_count is the full length
     move_history: List[Move] = []
+    move_count: int = 0
+    # Increases with every update; the ETag of GET /games/{id}
+    version: int = 0
     position_history: List[str] = []
+    # hash -> occurrences in position_history; rebuilt on load, never serialized
+    position_counts: Dict[str, int] = Field(default_factory=dict, exclude=True)
+    # from square index -> mask of target squares for the side to move, with
+    # must-capture applied; built once per turn and kept only while the state
+    # is held by the game cache, never serialized (see game_logic.legal_move_index)
+    legal_move_index: Optional[Dict[int, int]] = Field(None, exclude=True)
     piece_count: Dict[str, int] = Field(default_factory=lambda: {"white": 16, "black": 16})
+    bot_difficulty: BotDifficulty = BotDifficulty.EASY
+    bot_time_budget_ms: Optional[int] = None
     message: Optional[str] = None
     created_at: datetime
     updated_at: datetime
@@ -120,6 +176,8 @@ class LeaderboardEntry(BaseModel):
 class CreateGameRequest(BaseModel):
     game_mode: GameMode
     players: List[Dict[str, Any]] = Field(min_length=2, max_length=2)
+    bot_difficulty: BotDifficulty = BotDifficulty.EASY
+    bot_time_budget_ms: Optional[int] = Field(None, ge=10, le=10_000)
 
 
 class MakeMoveRequest(BaseModel):
@@ -141,6 +199,8 @@ class DeclareTakeMeRequest(BaseModel):
 class BotMoveResponse(BaseModel):
     move: Move
     declare_take_me: bool
+    depth: Optional[int] = None
+    nodes: Optional[int] = None
 
 
 class ValidationResponse(BaseModel):
@@ -0,0 +1,228 @@
+"""Take-Me Chess opening book.
+
+Every 1P game starts from the same position, so the first few bot moves are
+computed offline and looked up instead of searched. The builder walks the
+opening tree from the initial position: at each book position every root move
+is scored by search and moves within ``margin`` of the best are kept with a
+weight that falls off with the score gap. The tree is walked once for the bot
+on each side, up to ``plies``: below the bot's own positions it continues
+with the kept moves only, below the opponent's with every legal reply, so the
+bot stays in book whatever the human opens with.
+
+A position is keyed by its Zobrist key (``CompactBoard.key``, with
+``zobrist.MUST_CAPTURE`` mixed in while a capture is pending). Entries are
+fixed-size records sorted by key, so a lookup is a binary search straight
+over the mapped file with nothing to parse at startup.
+
+File layout (little endian)::
+
+    b"TMOB" | u16 version | u16 reserved | u32 entry count
+    entry count x (u64 key | u8 from | u8 to | i8 promotion | u8 declare | u16 weight)
+
+Generate with ``python opening_book.py opening_book.bin --plies 4``.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from board_core import CompactBoard, initial_board
+import bitboard
+import zobrist
+from search import SearchMove, TranspositionTable, expand_moves, search
+
+MAGIC = b"TMOB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+ENTRY = struct.Struct("<QBBbBH")
+KEY = struct.Struct("<Q")
+
+MAX_WEIGHT = 0xFFFF
+
+
+def book_key(core: CompactBoard, must_capture: bool) -> int:
+    """Book key for the side to move on core"""
+    return core.key ^ zobrist.MUST_CAPTURE if must_capture else core.key
+
+
+class OpeningBookBuilder:
+    """Collects weighted book moves by searching the opening tree"""
+
+    def __init__(self, depth: int = 4, margin: int = 30, node_budget: Optional[int] = None,
+                 verbose: bool = False):
+        self.depth = depth
+        self.margin = margin
+        self.node_budget = node_budget
+        self.verbose = verbose
+        self.entries: Dict[int, List[Tuple[SearchMove, int]]] = {}
+        self._tt = TranspositionTable()
+
+    def scored_moves(self, core: CompactBoard, must_capture: bool) -> List[Tuple[SearchMove, int]]:
+        """Every root move with its search score, best first"""
+        scored = []
+        for move in expand_moves(core, must_capture):
+            result = search(core, self.depth, must_capture, self.node_budget, self._tt,
+                            root_moves=[move])
+            if result.move is not None:
+                scored.append((result.move, result.score))
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored
+
+    def build(self, core: CompactBoard, plies: int, must_capture: bool = False) -> None:
+        """Add book moves for both sides in core and the positions below it, ``plies`` deep"""
+        for side in (bitboard.WHITE, bitboard.BLACK):
+            self._build(core, plies, must_capture, side, set())
+
+    def _build(self, core: CompactBoard, plies: int, must_capture: bool, side: int,
+               visited: Set[Tuple[int, int]]) -> None:
+        """Walk the tree for the bot playing ``side``: its own choices are pruned to the
+        book moves, every reply of the opponent is expanded"""
+        if plies <= 0:
+            return
+        key = book_key(core, must_capture)
+        if (key, plies) in visited:
+            return
+        visited.add((key, plies))
+        if core.turn == side:
+            children = [(move.from_sq, move.to_sq, move.promotion, move.declare)
+                        for move, _ in self._book_moves(core, must_capture, key)]
+        else:
+            children = self._replies(core, must_capture)
+        for from_sq, to_sq, promotion, declare in children:
+            core.make_move(from_sq, to_sq, promotion)
+            try:
+                self._build(core, plies - 1, declare, side, visited)
+            finally:
+                core.unmake_move()
+
+    def _book_moves(self, core: CompactBoard, must_capture: bool, key: int) -> List[Tuple[SearchMove, int]]:
+        """Weighted moves within ``margin`` of the best, scored once per position"""
+        if key in self.entries:
+            return self.entries[key]
+        started = time.monotonic()
+        scored = self.scored_moves(core, must_capture)
+        if not scored:
+            return []
+        best_score = scored[0][1]
+        book = []
+        for move, score in scored:
+            gap = best_score - score
+            if gap > self.margin:
+                break
+            # Linear fall-off: the best move gets MAX_WEIGHT, a move at the margin a sliver
+            book.append((move, max(1, MAX_WEIGHT * (self.margin + 1 - gap) // (self.margin + 1))))
+        self.entries[key] = book
+        if self.verbose:
+            print(f"{len(self.entries)} positions, {len(book)} book moves in {time.monotonic() - started:.1f}s")
+        return book
+
+    def _replies(self, core: CompactBoard, must_capture: bool) -> List[Tuple[int, int, int, bool]]:
+        """Every legal move of the side to move, with and without a Take Me! declaration"""
+        replies = []
+        for from_sq, to_sq, promotion in expand_moves(core, must_capture):
+            replies.append((from_sq, to_sq, promotion, False))
+            core.make_move(from_sq, to_sq, promotion)
+            try:
+                # Declaring only changes the position when it forces a capture
+                if core.capture_mask(core.turn):
+                    replies.append((from_sq, to_sq, promotion, True))
+            finally:
+                core.unmake_move()
+        return replies
+
+    def write(self, path: str) -> None:
+        records = sorted(
+            (key, move.from_sq, move.to_sq, move.promotion, int(move.declare), weight)
+            for key, book in self.entries.items()
+            for move, weight in book
+        )
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, len(records)))
+            for record in records:
+                f.write(ENTRY.pack(*record))
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} Take-Me opening book")
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def _key_at(self, index: int) -> int:
+        return KEY.unpack_from(self._mm, HEADER.size + index * ENTRY.size)[0]
+
+    def moves(self, core: CompactBoard, must_capture: bool) -> List[Tuple[SearchMove, int]]:
+        """Book moves with their weights, empty when the position is not in the book"""
+        key = book_key(core, must_capture)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        moves = []
+        while lo < self.count:
+            entry_key, from_sq, to_sq, promotion, declare, weight = ENTRY.unpack_from(
+                self._mm, HEADER.size + lo * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((SearchMove(from_sq, to_sq, promotion, bool(declare)), weight))
+            lo += 1
+        return moves
+
+    def choose(self, core: CompactBoard, must_capture: bool,
+               rng: Optional[random.Random] = None) -> Optional[SearchMove]:
+        """A weighted random book move, or None when out of book"""
+        moves = self.moves(core, must_capture)
+        if not moves:
+            return None
+        rng = rng or random
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+_book: Optional[OpeningBook] = None
+_book_loaded = False
+
+
+def get_opening_book() -> Optional[OpeningBook]:
+    """The opening book named by OPENING_BOOK_PATH, opened once per process"""
+    global _book, _book_loaded
+    if not _book_loaded:
+        _book_loaded = True
+        path = os.getenv("OPENING_BOOK_PATH")
+        if path and os.path.exists(path):
+            _book = OpeningBook(path)
+    return _book
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the Take-Me Chess opening book")
+    parser.add_argument("output", help="path of the opening book file to write")
+    parser.add_argument("--plies", type=int, default=4, help="how many plies of the opening to cover")
+    parser.add_argument("--depth", type=int, default=4, help="search depth used to score each move")
+    parser.add_argument("--margin", type=int, default=30,
+                        help="keep moves scoring within this much of the best one")
+    parser.add_argument("--node-budget", type=int, default=None, help="node budget per scored move")
+    args = parser.parse_args()
+
+    builder = OpeningBookBuilder(args.depth, args.margin, args.node_budget, verbose=True)
+    builder.build(initial_board(), args.plies)
+    builder.write(args.output)
+    print(f"Wrote {sum(len(book) for book in builder.entries.values())} book moves "
+          f"for {len(builder.entries)} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Negamax alpha-beta search for Take-Me Chess.
+
+The goal is to lose material: a side with no pieces left wins, a side with no
+legal moves draws. After every move the mover may declare "Take Me!"; when the
+opponent then has a capture available it must capture, so a declaration is a
+separate child of the move. Declaring with nothing capturable only costs
+score points and is never searched.
+
+Scores are from the side to move's point of view. Search state lives on a
+CompactBoard that is mutated with make/unmake; nothing here allocates Pydantic
+objects. When a tablebase is given, positions it covers are scored exactly
+instead of being searched.
+"""
+import random
+import time
+from typing import List, NamedTuple, Optional, Tuple
+from board_core import CompactBoard
+import bitboard
+import zobrist
+from tablebase import Tablebase, LOSS as TABLEBASE_LOSS, WIN as TABLEBASE_WIN
+
+WIN = 1_000_000
+WIN_THRESHOLD = WIN - 1000
+INFINITY = WIN + 1
+
+PIECE_WEIGHT = 1000
+# Small tie-breaker on top of the piece count, indexed by bitboard piece type
+MATERIAL = (10, 30, 30, 50, 90, 20)
+
+PROMOTIONS = (bitboard.QUEEN, bitboard.KING, bitboard.ROOK, bitboard.BISHOP, bitboard.KNIGHT)
+
+# Forced captures keep being searched past the nominal depth, up to this many plies
+MAX_CAPTURE_EXTENSION = 4
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+class SearchMove(NamedTuple):
+    from_sq: int
+    to_sq: int
+    promotion: int
+    declare: bool
+
+
+class SearchResult(NamedTuple):
+    move: Optional[SearchMove]
+    score: int
+    depth: int
+    nodes: int
+    # (best move, score) after each completed depth, depth 1 first
+    by_depth: Tuple[Tuple[SearchMove, int], ...] = ()
+
+
+class SearchLimits(NamedTuple):
+    depth: int
+    node_budget: Optional[int] = None
+    time_budget_ms: Optional[int] = None
+
+
+class SearchAborted(Exception):
+    pass
+
+
+class TranspositionTable:
+    """Fixed-size table of two-slot buckets.
+
+    Slot 0 keeps the deepest result seen for a bucket (replaced by an equal or
+    deeper search, or by any entry from a newer search); slot 1 is always
+    replaced. Memory stays bounded by ``2 * size`` entries.
+    """
+
+    __slots__ = ("size", "mask", "entries", "generation")
+
+    def __init__(self, size_bits: int = 16):
+        self.size = 1 << size_bits
+        self.mask = self.size - 1
+        self.entries: List[Optional[tuple]] = [None] * (2 * self.size)
+        self.generation = 0
+
+    def new_search(self) -> None:
+        self.generation += 1
+
+    def probe(self, key: int) -> Optional[tuple]:
+        index = (key & self.mask) << 1
+        entries = self.entries
+        entry = entries[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = entries[index + 1]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, flag: int, score: int, move: Optional[tuple]) -> None:
+        index = (key & self.mask) << 1
+        entries = self.entries
+        deep = entries[index]
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.generation:
+            entries[index] = (key, depth, flag, score, move, self.generation)
+        else:
+            entries[index + 1] = (key, depth, flag, score, move, self.generation)
+
+
+def evaluate(core: CompactBoard) -> int:
+    """Static score for the side to move: fewer own pieces is better"""
+    bbs = core.bbs
+    me = core.turn * 6
+    them = (core.turn ^ 1) * 6
+    score = 0
+    for ptype in range(6):
+        diff = bbs[them + ptype].bit_count() - bbs[me + ptype].bit_count()
+        score += diff * (PIECE_WEIGHT + MATERIAL[ptype])
+    return score
+
+
+def expand_moves(core: CompactBoard, must_capture: bool) -> List[tuple]:
+    """(from, to, promotion) moves for the side to move, one per promotion choice"""
+    target = core.occupancy(core.turn ^ 1) if must_capture else bitboard.FULL
+    moves = []
+    for from_sq, to_sq in core.generate_moves(target):
+        if core.is_promotion(from_sq, to_sq):
+            moves.extend((from_sq, to_sq, p) for p in PROMOTIONS)
+        else:
+            moves.append((from_sq, to_sq, -1))
+    return moves
+
+
+def _to_tt(score: int, ply: int) -> int:
+    if score > WIN_THRESHOLD:
+        return score + ply
+    if score < -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _from_tt(score: int, ply: int) -> int:
+    if score > WIN_THRESHOLD:
+        return score - ply
+    if score < -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+def _tablebase_score(probed: Tuple[int, int], ply: int) -> int:
+    result, distance = probed
+    if result == TABLEBASE_WIN:
+        return WIN - ply - distance
+    if result == TABLEBASE_LOSS:
+        return -(WIN - ply - distance)
+    return 0
+
+
+class Searcher:
+    """Alpha-beta searcher over a CompactBoard; one instance per bot move"""
+
+    def __init__(self, core: CompactBoard, tt: Optional[TranspositionTable] = None,
+                 node_budget: Optional[int] = None, deadline: Optional[float] = None,
+                 root_moves: Optional[List[tuple]] = None, tablebase: Optional[Tablebase] = None):
+        self.core = core
+        self.tablebase = tablebase
+        self.root_moves = set(root_moves) if root_moves is not None else None
+        self.tt = tt or TranspositionTable()
+        self.node_budget = node_budget
+        self.deadline = deadline
+        self.nodes = 0
+        self.killers: List[List[Optional[tuple]]] = [[None, None] for _ in range(128)]
+        self.history = {}
+        self.path: List[int] = []
+
+    def _check_limits(self) -> None:
+        if self.node_budget is not None and self.nodes >= self.node_budget:
+            raise SearchAborted()
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise SearchAborted()
+
+    def _ordered_moves(self, must_capture: bool, tt_move: Optional[tuple], ply: int) -> List[tuple]:
+        moves = expand_moves(self.core, must_capture)
+        if ply == 0:
+            # Equal-scoring root moves are common; shuffle so the first one searched varies
+            random.shuffle(moves)
+
+        killers = self.killers[ply] if ply < len(self.killers) else (None, None)
+        history = self.history
+
+        def order(move):
+            if move == tt_move:
+                return -3_000_000
+            if move == killers[0] or move == killers[1]:
+                return -2_000_000
+            return -history.get(move, 0)
+
+        moves.sort(key=order)
+        return moves
+
+    def _remember_cutoff(self, move: tuple, depth: int, ply: int) -> None:
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[move] = self.history.get(move, 0) + depth * depth
+
+    def _declare_options(self):
+        """Yield the no-declare / declare options for the move just played on the core"""
+        core = self.core
+        yield False
+        # Opponent (now to move) can capture one of the mover's pieces
+        if core.has_moves(core.occupancy(core.turn ^ 1)):
+            yield True
+
+    def negamax(self, depth: int, alpha: int, beta: int, must_capture: bool, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes & 255 == 0:
+            self._check_limits()
+
+        core = self.core
+        own = core.occupancy(core.turn)
+        if not own:
+            return WIN - ply
+        if not core.occupancy(core.turn ^ 1):
+            return -(WIN - ply)
+
+        key = (core.key ^ zobrist.MUST_CAPTURE) if must_capture else core.key
+        if ply and key in self.path:
+            return 0
+
+        tablebase = self.tablebase
+        if (tablebase is not None and ply
+                and (own | core.occupancy(core.turn ^ 1)).bit_count() <= tablebase.max_pieces):
+            probed = tablebase.probe(core, must_capture)
+            if probed is not None:
+                return _tablebase_score(probed, ply)
+
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move = entry[4]
+            if entry[1] >= depth and ply:
+                score = _from_tt(entry[3], ply)
+                flag = entry[2]
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score >= beta:
+                    return score
+                if flag == UPPER and score <= alpha:
+                    return score
+
+        if depth <= 0 and (not must_capture or depth <= -MAX_CAPTURE_EXTENSION):
+            return evaluate(core)
+
+        moves = self._ordered_moves(must_capture, tt_move and tt_move[:3], ply)
+        if not moves:
+            return 0
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        self.path.append(key)
+        try:
+            for move in moves:
+                core.make_move(*move)
+                try:
+                    for declare in self._declare_options():
+                        score = -self.negamax(depth - 1, -beta, -alpha, declare, ply + 1)
+                        if score > best_score:
+                            best_score = score
+                            best_move = move + (declare,)
+                        if score > alpha:
+                            alpha = score
+                        if alpha >= beta:
+                            break
+                finally:
+                    core.unmake_move()
+                if alpha >= beta:
+                    # Only quiet moves become killers; captures are already cheap to find
+                    if not core.squares[move[1]]:
+                        self._remember_cutoff(move, depth, ply)
+                    break
+        finally:
+            self.path.pop()
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, _to_tt(best_score, ply), best_move)
+        return best_score
+
+    def search_root(self, depth: int, must_capture: bool) -> Tuple[Optional[SearchMove], int, bool]:
+        """Search the root to a fixed depth.
+
+        Returns (best move, score, completed). When a limit is hit part-way,
+        completed is False and the best move is the best among the root moves
+        that finished; SearchAborted is raised if none did.
+        """
+        core = self.core
+        key = (core.key ^ zobrist.MUST_CAPTURE) if must_capture else core.key
+        entry = self.tt.probe(key)
+        tt_move = entry[4][:3] if entry is not None and entry[4] else None
+        moves = self._ordered_moves(must_capture, tt_move, 0)
+        if self.root_moves is not None:
+            moves = [move for move in moves if move in self.root_moves]
+        if not moves:
+            return None, 0, True
+
+        alpha = -INFINITY
+        best_move = None
+        self.path.append(key)
+        try:
+            for move in moves:
+                core.make_move(*move)
+                try:
+                    for declare in self._declare_options():
+                        score = -self.negamax(depth - 1, -INFINITY, -alpha, declare, 1)
+                        if score > alpha or best_move is None:
+                            alpha = score
+                            best_move = SearchMove(move[0], move[1], move[2], declare)
+                except SearchAborted:
+                    if best_move is None:
+                        raise
+                    return best_move, alpha, False
+                finally:
+                    core.unmake_move()
+        finally:
+            self.path.pop()
+
+        self.tt.store(key, depth, EXACT, alpha, tuple(best_move))
+        return best_move, alpha, True
+
+
+def search(core: CompactBoard, depth: int, must_capture: bool = False,
+           node_budget: Optional[int] = None, tt: Optional[TranspositionTable] = None,
+           time_budget_ms: Optional[int] = None, root_moves: Optional[List[tuple]] = None,
+           tablebase: Optional[Tablebase] = None) -> SearchResult:
+    """Iterative deepening from the side to move on core.
+
+    Searches depth 1, 2, ... up to ``depth`` and stops when the node budget or
+    the wall-clock budget runs out. The move comes from the last completed
+    depth; a partially searched depth only replaces it when the previous best
+    move (searched first) already finished at the new depth.
+
+    ``root_moves`` restricts the root to a subset of (from, to, promotion)
+    moves, which is how parallel workers split the root between them.
+    Positions covered by ``tablebase`` are scored exactly below the root.
+    """
+    deadline = time.monotonic() + time_budget_ms / 1000 if time_budget_ms is not None else None
+    searcher = Searcher(core, tt, node_budget, deadline, root_moves, tablebase)
+    searcher.tt.new_search()
+
+    best_move = None
+    best_score = 0
+    completed_depth = 0
+    by_depth = []
+    for current_depth in range(1, depth + 1):
+        try:
+            move, score, completed = searcher.search_root(current_depth, must_capture)
+        except SearchAborted:
+            break
+        if move is None:
+            break
+        best_move, best_score = move, score
+        if not completed:
+            break
+        completed_depth = current_depth
+        by_depth.append((move, score))
+        if abs(score) > WIN_THRESHOLD:
+            break
+
+    if best_move is None:
+        moves = searcher._ordered_moves(must_capture, None, 0)
+        if root_moves is not None:
+            moves = [move for move in moves if move in searcher.root_moves]
+        best_move = SearchMove(*moves[0], False) if moves else None
+    return SearchResult(best_move, best_score, completed_depth, searcher.nodes, tuple(by_depth))
@@ -0,0 +1,199 @@
+"""Bot-vs-bot self-play for measuring engine throughput.
+
+Plays games between two bots across a process pool without HTTP or the
+database. Every turn goes through ``turns.apply_turn`` like the endpoints in
+``main.py``, so the rules are the same: Take Me! declarations force a capture
+of an exposed piece, a declaration with nothing to capture costs 5 points,
+captures score for the side that lost the piece, pawns promote as the bot
+chooses, and the game ends when a side has no pieces (it wins), the side to
+move has no moves (draw) or a position occurs for the third time (draw). Games longer than ``--max-plies`` are counted as
+unfinished.
+
+Games can be dumped to a compact file (little endian)::
+
+    b"TMSP" | u16 version | u32 game count
+    per game: u8 result | u16 ply count | ply count x (u8 from | u8 to | u8 flags)
+
+where flags is the promotion piece type + 1 in the low 3 bits (0 for none)
+and 0x8 for a Take Me! declaration.
+
+Run with ``python selfplay.py --games 200 --workers 4``.
+"""
+import argparse
+import os
+import random
+import struct
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from models import BotDifficulty, GameState, GameStatus, PieceColor, Player, TakeMeState
+import bitboard
+from board_core import initial_board
+from bot import get_bot_move
+from game_logic import get_position_hash
+from turns import TAKE_WHO_MESSAGE, apply_turn
+
+MAGIC = b"TMSP"
+VERSION = 1
+HEADER = struct.Struct("<4sHI")
+GAME_HEADER = struct.Struct("<BH")
+PLY = struct.Struct("<BBB")
+
+WHITE_WIN, BLACK_WIN, DRAW, UNFINISHED = 0, 1, 2, 3
+RESULT_NAMES = ("white wins", "black wins", "draw", "unfinished")
+
+DECLARE_FLAG = 0x8
+
+
+class GameRecord(NamedTuple):
+    result: int
+    moves: bytes            # PLY records, one per ply
+    scores: Dict[str, int]
+    penalties: int
+    seconds: float
+
+    @property
+    def plies(self) -> int:
+        return len(self.moves) // PLY.size
+
+
+def play_game(seed: int, white: BotDifficulty = BotDifficulty.EASY,
+              black: BotDifficulty = BotDifficulty.EASY, max_plies: int = 400,
+              time_budget_ms: Optional[int] = None) -> GameRecord:
+    """Play one bot-vs-bot game from the initial position"""
+    random.seed(seed)
+    started = time.perf_counter()
+    now = datetime.now()
+    board = initial_board().to_board_state()
+    game = GameState(
+        id=f"selfplay_{seed}",
+        board=board,
+        current_turn=PieceColor.WHITE,
+        players=[Player(id="white", name="White", color=PieceColor.WHITE, is_bot=True),
+                 Player(id="black", name="Black", color=PieceColor.BLACK, is_bot=True)],
+        status=GameStatus.ACTIVE,
+        take_me_state=TakeMeState(declared=False),
+        position_history=[get_position_hash(board, PieceColor.WHITE, False)],
+        created_at=now,
+        updated_at=now
+    )
+    difficulties = {PieceColor.WHITE: white, PieceColor.BLACK: black}
+    moves = bytearray()
+    penalties = 0
+    result = UNFINISHED
+
+    while len(moves) < max_plies * PLY.size:
+        bot_result = get_bot_move(game.board, game.current_turn, game.take_me_state.must_capture,
+                                  game.take_me_state.capturable_pieces, difficulties[game.current_turn],
+                                  time_budget_ms)
+        if bot_result is None:
+            # Same as the bot endpoint: a bot without moves ends the game drawn
+            result = DRAW
+            break
+
+        move = bot_result.move
+        game = apply_turn(game, move, bot_result.declare_take_me)
+        if game.message == TAKE_WHO_MESSAGE:
+            penalties += 1
+
+        flags = (bitboard.TYPE_INDEX[move.promotion_piece] + 1) if move.is_promotion and move.promotion_piece else 0
+        if bot_result.declare_take_me:
+            flags |= DECLARE_FLAG
+        moves += PLY.pack(bitboard.square_index(move.from_), bitboard.square_index(move.to), flags)
+
+        if game.status == GameStatus.DRAW:
+            result = DRAW
+            break
+        if game.status == GameStatus.WIN:
+            result = WHITE_WIN if game.winner.color == PieceColor.WHITE else BLACK_WIN
+            break
+
+    return GameRecord(result, bytes(moves), {p.id: p.score for p in game.players}, penalties,
+                      time.perf_counter() - started)
+
+
+def _play_game_args(args: tuple) -> GameRecord:
+    return play_game(*args)
+
+
+def run_selfplay(games: int, workers: int, white: BotDifficulty, black: BotDifficulty,
+                 max_plies: int = 400, time_budget_ms: Optional[int] = None,
+                 seed: int = 0) -> List[GameRecord]:
+    """Play ``games`` games, across ``workers`` processes when above zero"""
+    jobs = [(seed + i, white, black, max_plies, time_budget_ms) for i in range(games)]
+    if workers <= 0:
+        return [_play_game_args(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_play_game_args, jobs, chunksize=max(1, games // (workers * 4))))
+
+
+def write_games(path: str, records: List[GameRecord]) -> None:
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for record in records:
+            f.write(GAME_HEADER.pack(record.result, record.plies))
+            f.write(record.moves)
+
+
+def read_games(path: str) -> List[tuple]:
+    """(result, [(from, to, flags), ...]) per game from a dump file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} self-play dump")
+    games = []
+    offset = HEADER.size
+    for _ in range(count):
+        result, plies = GAME_HEADER.unpack_from(data, offset)
+        offset += GAME_HEADER.size
+        games.append((result, list(PLY.iter_unpack(data[offset:offset + plies * PLY.size]))))
+        offset += plies * PLY.size
+    return games
+
+
+def summarize(records: List[GameRecord], seconds: float) -> str:
+    plies = sum(record.plies for record in records)
+    results = Counter(record.result for record in records)
+    lines = [
+        f"{len(records)} games, {plies} moves in {seconds:.2f}s",
+        f"games/sec: {len(records) / seconds:.2f}",
+        f"moves/sec: {plies / seconds:.1f}",
+        f"average game length: {plies / max(len(records), 1):.1f} plies",
+        f"take who?? penalties: {sum(record.penalties for record in records)}",
+        "results:",
+    ]
+    for result, name in enumerate(RESULT_NAMES):
+        count = results.get(result, 0)
+        lines.append(f"  {name:<11} {count:>6}  ({100 * count / max(len(records), 1):.1f}%)")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    difficulties = [d.value for d in BotDifficulty]
+    parser = argparse.ArgumentParser(description="Run Take-Me Chess bot-vs-bot self-play")
+    parser.add_argument("--games", type=int, default=100, help="number of games to play")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes; 0 plays in-process")
+    parser.add_argument("--white", choices=difficulties, default=BotDifficulty.EASY.value)
+    parser.add_argument("--black", choices=difficulties, default=BotDifficulty.EASY.value)
+    parser.add_argument("--max-plies", type=int, default=400, help="count longer games as unfinished")
+    parser.add_argument("--time-budget-ms", type=int, default=None, help="per-move budget for search bots")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--dump", help="write the games to this file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    records = run_selfplay(args.games, args.workers, BotDifficulty(args.white), BotDifficulty(args.black),
+                           args.max_plies, args.time_budget_ms, args.seed)
+    print(summarize(records, time.perf_counter() - started))
+    if args.dump:
+        write_games(args.dump, records)
+        print(f"Wrote {len(records)} games to {args.dump}")
+
+
+if __name__ == "__main__":
+    main()
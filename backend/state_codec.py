@@ -0,0 +1,83 @@
+"""Compact binary encoding of the board and Take Me! state for persistence.
+
+Layout::
+
+    u8 version
+    64 bytes   board, one CompactBoard piece code per square (0 = empty)
+    u8 flags   bit 0 declared, bit 1 must_capture, bit 2 declarer set, bit 3 declarer is black
+    u8 n + n bytes   exposed piece squares (0-63)
+    u8 n + n bytes   capturable piece squares (0-63)
+
+Piece counts are not stored; they are recounted from the board. A typical
+state is about 70 bytes, against roughly 3 KB for the JSON columns it replaces.
+"""
+from typing import Dict, List, Tuple
+
+from models import BoardState, PieceColor, Square, TakeMeState
+import bitboard
+from board_core import CompactBoard, code_color
+
+VERSION = 1
+BOARD_OFFSET = 1
+FLAGS_OFFSET = BOARD_OFFSET + 64
+
+DECLARED = 0x1
+MUST_CAPTURE = 0x2
+HAS_DECLARER = 0x4
+DECLARER_BLACK = 0x8
+
+
+def _encode_squares(squares: List[Square]) -> bytes:
+    return bytes([len(squares)]) + bytes(square.row * 8 + square.col for square in squares)
+
+
+def _decode_squares(data: bytes, offset: int) -> Tuple[List[Square], int]:
+    count = data[offset]
+    start = offset + 1
+    return [bitboard.index_square(sq) for sq in data[start:start + count]], start + count
+
+
+def encode_state(board: BoardState, take_me_state: TakeMeState) -> bytes:
+    flags = 0
+    if take_me_state.declared:
+        flags |= DECLARED
+    if take_me_state.must_capture:
+        flags |= MUST_CAPTURE
+    if take_me_state.declarer is not None:
+        flags |= HAS_DECLARER
+        if take_me_state.declarer == PieceColor.BLACK:
+            flags |= DECLARER_BLACK
+    return b"".join((
+        bytes([VERSION]),
+        bytes(CompactBoard.from_board_state(board).squares),
+        bytes([flags]),
+        _encode_squares(take_me_state.exposed_pieces),
+        _encode_squares(take_me_state.capturable_pieces),
+    ))
+
+
+def decode_state(data: bytes) -> Tuple[BoardState, TakeMeState, Dict[str, int]]:
+    """(board, take-me state, piece count) from an encoded state"""
+    if data[0] != VERSION:
+        raise ValueError(f"Unsupported state encoding version {data[0]}")
+    squares = bytearray(data[BOARD_OFFSET:FLAGS_OFFSET])
+    flags = data[FLAGS_OFFSET]
+    exposed, offset = _decode_squares(data, FLAGS_OFFSET + 1)
+    capturable, _ = _decode_squares(data, offset)
+
+    declarer = None
+    if flags & HAS_DECLARER:
+        declarer = PieceColor.BLACK if flags & DECLARER_BLACK else PieceColor.WHITE
+    take_me_state = TakeMeState.model_construct(
+        declared=bool(flags & DECLARED),
+        declarer=declarer,
+        exposed_pieces=exposed,
+        capturable_pieces=capturable,
+        must_capture=bool(flags & MUST_CAPTURE)
+    )
+
+    piece_count = {"white": 0, "black": 0}
+    for code in squares:
+        if code:
+            piece_count["black" if code_color(code) == bitboard.BLACK else "white"] += 1
+    return CompactBoard(squares).to_board_state(), take_me_state, piece_count
@@ -0,0 +1,430 @@
+"""Take-Me Chess endgame tablebases.
+
+Offline retrograde analysis of small endgames under Take-Me rules: a side with
+no pieces left wins, a side with no legal moves draws (stalemate), pawns
+promote to any of queen, rook, bishop, knight or king, and after each move
+the mover may declare "Take Me!" so the opponent must capture if it can.
+Threefold repetition is ignored, as usual for tablebases.
+
+Every table covers one material signature such as ``"KQk"`` (white pieces
+upper case, black lower case, in ``bitboard`` piece-index order). A state is
+(piece squares, side to move, must-capture flag) and is stored as one byte:
+the top two bits hold DRAW/WIN/LOSS for the side to move and the low six bits
+the distance to the end of the game in plies, capped at 63.
+
+File layout (little endian)::
+
+    b"TMTB" | u16 version | u16 table count
+    table count x (8-byte signature | u64 offset | u64 length)
+    table data
+
+Tables are probed through ``mmap`` so worker processes share one copy of the
+pages. Tables are dense (``64 ** n * 4`` bytes, no symmetry reduction) and
+built in pure Python, so generation stops at three pieces: a three-piece
+table takes one to two minutes and there are 288 of them. Generate the
+two-piece tables with ``python tablebase.py tablebases.bin --max-pieces 2``,
+or pick three-piece endgames with ``--signatures KQk KRk``.
+
+Known gap: endgames of four or more pieces have no tables and are left to the
+search. Covering them needs index compression (symmetry, piece permutations)
+and a faster generator than this one.
+"""
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import bitboard
+from board_core import CompactBoard
+
+MAGIC = b"TMTB"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+DIRECTORY_ENTRY = struct.Struct("<8sQQ")
+
+DRAW, WIN, LOSS = 0, 1, 2
+MAX_DISTANCE = 63
+
+PIECE_LETTERS = "PNBRQKpnbrqk"
+PROMOTIONS = (bitboard.QUEEN, bitboard.ROOK, bitboard.BISHOP, bitboard.KNIGHT, bitboard.KING)
+
+# No pieces left for the side to move: it has already won
+_TERMINAL_WIN = (WIN, 0)
+
+
+def signature_of(pieces: Sequence[int]) -> str:
+    """Material signature for bitboard piece indices"""
+    return "".join(PIECE_LETTERS[p] for p in sorted(pieces))
+
+
+def parse_signature(signature: str) -> List[int]:
+    return sorted(PIECE_LETTERS.index(letter) for letter in signature)
+
+
+def encode(result: int, distance: int) -> int:
+    return (result << 6) | min(distance, MAX_DISTANCE)
+
+
+def decode(value: int) -> Tuple[int, int]:
+    return value >> 6, value & MAX_DISTANCE
+
+
+def state_index(squares: Sequence[int], stm: int, must_capture: bool) -> int:
+    index = 0
+    for sq in squares:
+        index = index * 64 + sq
+    return (index * 2 + stm) * 2 + int(must_capture)
+
+
+def _better(a: Optional[Tuple[int, int]], b: Tuple[int, int]) -> Tuple[int, int]:
+    """Pick the better (result, distance) for the side choosing between them"""
+    if a is None:
+        return b
+    rank_a = (2, -a[1]) if a[0] == WIN else (1, 0) if a[0] == DRAW else (0, a[1])
+    rank_b = (2, -b[1]) if b[0] == WIN else (1, 0) if b[0] == DRAW else (0, b[1])
+    return b if rank_b > rank_a else a
+
+
+def _negate(value: Tuple[int, int]) -> Tuple[int, int]:
+    """Child value (for the child's side to move) as seen by the mover"""
+    result, distance = value
+    if result == WIN:
+        return (LOSS, distance + 1)
+    if result == LOSS:
+        return (WIN, distance + 1)
+    return (DRAW, 0)
+
+
+def _position_bitboards(pieces: Sequence[int], squares: Sequence[int]) -> List[int]:
+    bbs = [0] * 12
+    for piece, sq in zip(pieces, squares):
+        bbs[piece] |= 1 << sq
+    return bbs
+
+
+def _valid_position(pieces: Sequence[int], squares: Sequence[int]) -> bool:
+    if len(set(squares)) != len(squares):
+        return False
+    for piece, sq in zip(pieces, squares):
+        if piece % 6 == bitboard.PAWN and sq >> 3 in (0, 7):
+            return False
+    return True
+
+
+class TablebaseGenerator:
+    """Builds tables by retrograde analysis, generating smaller tables first"""
+
+    def __init__(self, verbose: bool = False):
+        self.tables: Dict[str, bytearray] = {}
+        self.verbose = verbose
+
+    def generate(self, signature: str) -> bytearray:
+        if signature not in self.tables:
+            self.tables[signature] = self._generate_table(signature)
+        return self.tables[signature]
+
+    def _lookup(self, placed: List[Tuple[int, int]], stm: int, must_capture: bool) -> Tuple[int, int]:
+        """Value for the side to move of a position in another table"""
+        colors = {piece // 6 for piece, _ in placed}
+        if stm not in colors:
+            return _TERMINAL_WIN
+        if stm ^ 1 not in colors:
+            return (LOSS, 0)
+        placed = sorted(placed)
+        table = self.generate(signature_of([piece for piece, _ in placed]))
+        return decode(table[state_index([sq for _, sq in placed], stm, must_capture)])
+
+    def _external_options(self, placed: List[Tuple[int, int]], mover: int) -> Tuple[int, int]:
+        """Best outcome for the mover over the declare choices after a move into another table"""
+        child_bbs = _position_bitboards([p for p, _ in placed], [sq for _, sq in placed])
+        opponent = mover ^ 1
+        best = _negate(self._lookup(placed, opponent, False))
+        if (bitboard.occupancy(child_bbs, opponent)
+                and bitboard.has_moves(child_bbs, opponent, bitboard.occupancy(child_bbs, mover))):
+            best = _better(best, _negate(self._lookup(placed, opponent, True)))
+        return best
+
+    def _moves(self, pieces, squares, bbs, stm, captures_only):
+        """Yield (piece slot, to square, captured slot or -1) for the side to move"""
+        own = bitboard.occupancy(bbs, stm)
+        enemy = bitboard.occupancy(bbs, stm ^ 1)
+        target = enemy if captures_only else bitboard.FULL
+        for i, (piece, sq) in enumerate(zip(pieces, squares)):
+            if piece // 6 != stm:
+                continue
+            targets = bitboard.piece_targets(piece % 6, stm, sq, own, enemy) & target
+            for to_sq in bitboard.iter_bits(targets):
+                captured = squares.index(to_sq) if enemy >> to_sq & 1 else -1
+                yield i, to_sq, captured
+
+    def _external_move_value(self, pieces, squares, stm, i, to_sq, captured) -> Tuple[int, int]:
+        """Best mover outcome for a capture and/or promotion, over promotion choices"""
+        placed = [(p, sq) for j, (p, sq) in enumerate(zip(pieces, squares)) if j != i and j != captured]
+        piece = pieces[i]
+        if piece % 6 == bitboard.PAWN and to_sq >> 3 == bitboard.PAWN_PROMOTION_ROW[stm]:
+            best = None
+            for promotion in PROMOTIONS:
+                best = _better(best, self._external_options(placed + [(stm * 6 + promotion, to_sq)], stm))
+            return best
+        return self._external_options(placed + [(piece, to_sq)], stm)
+
+    def _generate_table(self, signature: str) -> bytearray:
+        started = time.monotonic()
+        pieces = parse_signature(signature)
+        n = len(pieces)
+        weights = [64 ** (n - 1 - i) for i in range(n)]
+        values = bytearray(64 ** n * 4)
+        nodes = 64 ** n * 2
+        promotion_rows = bitboard.PAWN_PROMOTION_ROW
+
+        # Pass 1: must-capture states only have captures, which all leave this table
+        for pos, squares in enumerate(itertools.product(range(64), repeat=n)):
+            if not _valid_position(pieces, squares):
+                continue
+            bbs = _position_bitboards(pieces, squares)
+            for stm in (bitboard.WHITE, bitboard.BLACK):
+                best = None
+                for i, to_sq, captured in self._moves(pieces, squares, bbs, stm, True):
+                    best = _better(best, self._external_move_value(pieces, squares, stm, i, to_sq, captured))
+                values[(pos * 2 + stm) * 2 + 1] = encode(*(best or (DRAW, 0)))
+
+        # Pass 2: free-move states. Quiet non-promoting moves stay in this table
+        # (internal edges); everything else already has a known value.
+        ext_result = bytearray(nodes)        # 0 = no external option, else result + 1
+        ext_distance = array("H", bytes(2 * nodes))
+        remaining = array("H", bytes(2 * nodes))
+        edge_from = array("I")
+        edge_to = array("I")
+        valid = bytearray(nodes)
+        for pos, squares in enumerate(itertools.product(range(64), repeat=n)):
+            if not _valid_position(pieces, squares):
+                continue
+            bbs = _position_bitboards(pieces, squares)
+            for stm in (bitboard.WHITE, bitboard.BLACK):
+                node = pos * 2 + stm
+                valid[node] = 1
+                best = None
+                for i, to_sq, captured in self._moves(pieces, squares, bbs, stm, False):
+                    piece = pieces[i]
+                    promotes = piece % 6 == bitboard.PAWN and to_sq >> 3 == promotion_rows[stm]
+                    if captured >= 0 or promotes:
+                        best = _better(best, self._external_move_value(pieces, squares, stm, i, to_sq, captured))
+                        continue
+                    child_pos = pos + (to_sq - squares[i]) * weights[i]
+                    child = child_pos * 2 + (stm ^ 1)
+                    edge_from.append(node)
+                    edge_to.append(child)
+                    remaining[node] += 1
+                    # Declaring after a quiet move leads to a must-capture state from pass 1
+                    child_bbs = bbs[:]
+                    child_bbs[piece] ^= (1 << squares[i]) | (1 << to_sq)
+                    if bitboard.has_moves(child_bbs, stm ^ 1, bitboard.occupancy(child_bbs, stm)):
+                        best = _better(best, _negate(decode(values[child * 2 + 1])))
+                if best is not None:
+                    ext_result[node] = best[0] + 1
+                    ext_distance[node] = best[1]
+
+        # Predecessor lists (CSR) for the internal edges
+        pred_start = array("I", bytes(4 * (nodes + 1)))
+        for child in edge_to:
+            pred_start[child + 1] += 1
+        for node in range(nodes):
+            pred_start[node + 1] += pred_start[node]
+        fill = array("I", pred_start)
+        preds = array("I", bytes(4 * len(edge_to)))
+        for parent, child in zip(edge_from, edge_to):
+            preds[fill[child]] = parent
+            fill[child] += 1
+        del edge_from, edge_to, fill
+
+        # Retrograde propagation in order of distance, so wins are shortest
+        # and losses are as long as possible
+        UNRESOLVED = 255
+        result = bytearray([UNRESOLVED]) * nodes
+        distance = array("H", bytes(2 * nodes))
+        longest_loss = array("H", bytes(2 * nodes))
+        buckets: Dict[int, List[Tuple[int, int]]] = {}
+
+        def push(d: int, node: int, kind: int) -> None:
+            buckets.setdefault(d, []).append((node, kind))
+
+        for node in range(nodes):
+            if not valid[node]:
+                continue
+            ext = ext_result[node] - 1
+            if ext == WIN:
+                push(ext_distance[node], node, WIN)
+            elif remaining[node] == 0:
+                if ext == LOSS:
+                    push(ext_distance[node], node, LOSS)
+                else:
+                    # Stalemate or only drawing options
+                    result[node] = DRAW
+
+        d = 0
+        while buckets:
+            for node, kind in buckets.pop(d, ()):
+                if result[node] != UNRESOLVED:
+                    continue
+                result[node] = kind
+                distance[node] = d
+                for k in range(pred_start[node], pred_start[node + 1]):
+                    parent = preds[k]
+                    if result[parent] != UNRESOLVED:
+                        continue
+                    if kind == LOSS:
+                        push(d + 1, parent, WIN)
+                    else:
+                        remaining[parent] -= 1
+                        if d + 1 > longest_loss[parent]:
+                            longest_loss[parent] = d + 1
+                        ext = ext_result[parent] - 1
+                        if remaining[parent] == 0 and ext in (-1, LOSS):
+                            loss_distance = longest_loss[parent]
+                            if ext == LOSS and ext_distance[parent] > loss_distance:
+                                loss_distance = ext_distance[parent]
+                            push(loss_distance, parent, LOSS)
+            d += 1
+
+        for node in range(nodes):
+            if valid[node]:
+                kind = result[node]
+                values[node * 2] = encode(DRAW, 0) if kind == UNRESOLVED else encode(kind, distance[node])
+
+        if self.verbose:
+            print(f"{signature}: {len(values)} states in {time.monotonic() - started:.1f}s")
+        return values
+
+    def write(self, path: str) -> None:
+        signatures = sorted(self.tables)
+        offset = HEADER.size + DIRECTORY_ENTRY.size * len(signatures)
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(signatures)))
+            for signature in signatures:
+                length = len(self.tables[signature])
+                f.write(DIRECTORY_ENTRY.pack(signature.encode("ascii"), offset, length))
+                offset += length
+            for signature in signatures:
+                f.write(self.tables[signature])
+
+
+def all_signatures(max_pieces: int) -> List[str]:
+    """Every material signature with both colors present and up to max_pieces pieces"""
+    signatures = set()
+    for total in range(2, max_pieces + 1):
+        for white_count in range(1, total):
+            for white in itertools.combinations_with_replacement(range(6), white_count):
+                for black in itertools.combinations_with_replacement(range(6, 12), total - white_count):
+                    signatures.add(signature_of(white + black))
+    return sorted(signatures, key=lambda s: (len(s), s))
+
+
+class Tablebase:
+    """Read-only, memory-mapped tablebase file"""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} Take-Me tablebase")
+        self.tables: Dict[str, int] = {}
+        self.max_pieces = 0
+        for i in range(count):
+            raw, offset, _ = DIRECTORY_ENTRY.unpack_from(self._mm, HEADER.size + i * DIRECTORY_ENTRY.size)
+            signature = raw.rstrip(b"\0").decode("ascii")
+            self.tables[signature] = offset
+            self.max_pieces = max(self.max_pieces, len(signature))
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def probe(self, core: CompactBoard, must_capture: bool) -> Optional[Tuple[int, int]]:
+        """(result, distance) for the side to move, or None if the position is not covered"""
+        squares = core.squares
+        placed = sorted((code - 1, sq) for sq, code in enumerate(squares) if code)
+        if len(placed) > self.max_pieces:
+            return None
+        offset = self.tables.get(signature_of([piece for piece, _ in placed]))
+        if offset is None:
+            return None
+        return decode(self._mm[offset + state_index([sq for _, sq in placed], core.turn, must_capture)])
+
+    def best_move(self, core: CompactBoard, must_capture: bool) -> Optional[Tuple[Tuple[int, int, int, bool], Tuple[int, int]]]:
+        """Best (from, to, promotion, declare) by tablebase value, with that value"""
+        if self.probe(core, must_capture) is None:
+            return None
+        mover = core.turn
+        target = core.occupancy(mover ^ 1) if must_capture else bitboard.FULL
+        best = None
+        best_value = None
+        for from_sq, to_sq in core.generate_moves(target):
+            promotions = PROMOTIONS if core.is_promotion(from_sq, to_sq) else (-1,)
+            for promotion in promotions:
+                core.make_move(from_sq, to_sq, promotion)
+                try:
+                    options = [False]
+                    if core.occupancy(core.turn) and core.has_moves(core.occupancy(mover)):
+                        options.append(True)
+                    for declare in options:
+                        child = self._child_value(core, declare)
+                        if child is None:
+                            continue
+                        value = _negate(child)
+                        if best_value is None or _better(best_value, value) is not best_value:
+                            best_value = value
+                            best = (from_sq, to_sq, promotion, declare)
+                finally:
+                    core.unmake_move()
+        if best is None:
+            return None
+        return best, best_value
+
+    def _child_value(self, core: CompactBoard, must_capture: bool) -> Optional[Tuple[int, int]]:
+        if not core.occupancy(core.turn):
+            return _TERMINAL_WIN
+        return self.probe(core, must_capture)
+
+
+_tablebase: Optional[Tablebase] = None
+_tablebase_loaded = False
+
+
+def get_tablebase() -> Optional[Tablebase]:
+    """The tablebase named by TABLEBASE_PATH, opened once per process"""
+    global _tablebase, _tablebase_loaded
+    if not _tablebase_loaded:
+        _tablebase_loaded = True
+        path = os.getenv("TABLEBASE_PATH")
+        if path and os.path.exists(path):
+            _tablebase = Tablebase(path)
+    return _tablebase
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate Take-Me Chess endgame tablebases")
+    parser.add_argument("output", help="path of the tablebase file to write")
+    parser.add_argument("--max-pieces", type=int, default=2, choices=range(2, 4),
+                        help="largest endgames to generate; 3 builds all 288 three-piece tables, "
+                             "which takes several hours (4 and up would need gigabytes per table)")
+    parser.add_argument("--signatures", nargs="*",
+                        help="only these material signatures (and what they depend on), e.g. KQk Kp")
+    args = parser.parse_args()
+    too_large = [signature for signature in args.signatures or () if len(signature) > 3]
+    if too_large:
+        parser.error(f"only endgames of up to 3 pieces can be generated: {' '.join(too_large)}")
+
+    generator = TablebaseGenerator(verbose=True)
+    for signature in args.signatures or all_signatures(args.max_pieces):
+        generator.generate(signature_of(parse_signature(signature)))
+    generator.write(args.output)
+    print(f"Wrote {len(generator.tables)} tables to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,39 @@ import pytest
 from fastapi.testclient import TestClient
 from main import app
 from models import *
-from database import db
+from database import AsyncSQLAlchemyDatabase, SQLAlchemyDatabase, count_statements, create_database, db, run_db
+from game_archive import ArchiveSettings
+from game_cache import CacheSettings, StaleGameError
+from game_events import hub
+from leaderboard_cache import LeaderboardCache, LeaderboardCacheSettings
+from state_codec import decode_state
+from database_models import DBGame, DBMove
+from turns import apply_turn, build_human_move, leaderboard_entries
+import json
+import asyncio
+from datetime import datetime, timedelta
+import sqlite3
+import sqlalchemy
 
 client = TestClient(app)
 
+# e4, d5, exd5: three plies ending in a capture
+CAPTURE_LINE = [((6, 4), (4, 4)), ((1, 3), (3, 3)), ((4, 4), (3, 3))]
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """A fresh SQLite database without the game cache, so every read hits the tables"""
+    return SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'games.db'}", CacheSettings(max_games=0))
+
+
+def _play_moves(db, game, moves, declare_take_me=False):
+    """Play (from, to) row/col pairs on game, saving each turn; returns the last saved state"""
+    for from_, to in moves:
+        move = build_human_move(game, Square(row=from_[0], col=from_[1]), Square(row=to[0], col=to[1]))
+        game = db.update_game(apply_turn(game, move, declare_take_me))
+    return game
+
 
 class TestGameAPI:
     def setup_method(self):
@@ -139,6 +168,136 @@ class TestGameAPI:
         assert "legal_moves" in data
         assert len(data["legal_moves"]) > 0
 
+    def test_all_legal_moves_with_must_capture(self):
+        """The turn's legal move index serves clicks, validation and the bulk endpoint"""
+        create_response = client.post("/games", json={
+            "game_mode": "2P",
+            "players": [{"name": "Alice"}, {"name": "Bob"}]
+        })
+        game_id = create_response.json()["id"]
+
+        data = client.get(f"/games/{game_id}/legal-moves/all").json()
+        assert data["current_turn"] == "white" and not data["must_capture"]
+        assert len(data["moves"]) == 10
+        assert sum(len(entry["to"]) for entry in data["moves"]) == 20
+        # The side not to move still gets its pseudo-legal targets
+        response = client.get(f"/games/{game_id}/legal-moves?row=1&col=4")
+        assert response.json() == {"legal_moves": [{"row": 2, "col": 4}, {"row": 3, "col": 4}]}
+
+        client.post(f"/games/{game_id}/moves", json={"from": {"row": 6, "col": 4}, "to": {"row": 4, "col": 4}})
+        client.post(f"/games/{game_id}/take-me", json={"from": {"row": 1, "col": 3}, "to": {"row": 3, "col": 3}})
+
+        data = client.get(f"/games/{game_id}/legal-moves/all").json()
+        assert data["must_capture"]
+        assert data["moves"] == [{"from": {"row": 4, "col": 4}, "to": [{"row": 3, "col": 3}]}]
+        assert client.get(f"/games/{game_id}/legal-moves?row=6&col=0").json() == {"legal_moves": []}
+
+        response = client.post(f"/games/{game_id}/moves/validate",
+                               json={"from": {"row": 6, "col": 0}, "to": {"row": 5, "col": 0}})
+        assert response.json()["valid"] == False
+        response = client.post(f"/games/{game_id}/moves",
+                               json={"from": {"row": 6, "col": 0}, "to": {"row": 5, "col": 0}})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Must capture exposed piece"
+        response = client.post(f"/games/{game_id}/moves",
+                               json={"from": {"row": 4, "col": 4}, "to": {"row": 3, "col": 3}})
+        assert response.status_code == 200
+
+    def test_conditional_get_and_since_ply(self):
+        """GET /games/{id} is versioned: a matching If-None-Match gets a 304, since_ply pages history"""
+        create_response = client.post("/games", json={
+            "game_mode": "2P",
+            "players": [{"name": "Alice"}, {"name": "Bob"}]
+        })
+        game_id = create_response.json()["id"]
+
+        response = client.get(f"/games/{game_id}")
+        etag = response.headers["etag"]
+        assert etag == f'"{response.json()["version"]}"'
+
+        response = client.get(f"/games/{game_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        client.post(f"/games/{game_id}/moves", json={"from": {"row": 6, "col": 4}, "to": {"row": 4, "col": 4}})
+        client.post(f"/games/{game_id}/moves", json={"from": {"row": 1, "col": 3}, "to": {"row": 3, "col": 3}})
+        response = client.get(f"/games/{game_id}", params={"since_ply": 1}, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        data = response.json()
+        assert data["version"] == 3 and data["move_count"] == 2
+        assert [move["from"] for move in data["move_history"]] == [{"row": 1, "col": 3}]
+        assert len(data["position_history"]) == 1
+
+        response = client.get(f"/games/{game_id}", headers={"If-None-Match": f'W/"0", {response.headers["etag"]}'})
+        assert response.status_code == 304
+        assert client.get("/games/nonexistent", headers={"If-None-Match": etag}).status_code == 404
+
+    def test_websocket_pushes_deltas(self):
+        """Subscribers get a sync, then one delta per update, and can resync from a ply"""
+        create_response = client.post("/games", json={
+            "game_mode": "2P",
+            "players": [{"name": "Alice"}, {"name": "Bob"}]
+        })
+        game_id = create_response.json()["id"]
+
+        with client.websocket_connect(f"/games/{game_id}/ws") as ws:
+            sync = ws.receive_json()
+            assert sync["type"] == "sync" and sync["seq"] == 0 and sync["moves"] == []
+            assert sync["board"][6][4] == {"type": "pawn", "color": "white"}
+
+            client.post(f"/games/{game_id}/moves", json={"from": {"row": 6, "col": 4}, "to": {"row": 4, "col": 4}})
+            delta = ws.receive_json()
+            assert delta["type"] == "delta"
+            assert (delta["from_ply"], delta["seq"]) == (0, 1)
+            assert delta["moves"][0]["from"] == {"row": 6, "col": 4}
+            assert delta["changed"] == [
+                {"row": 4, "col": 4, "piece": {"type": "pawn", "color": "white"}},
+                {"row": 6, "col": 4, "piece": None}
+            ]
+            assert delta["current_turn"] == "black"
+
+        client.post(f"/games/{game_id}/take-me", json={"from": {"row": 1, "col": 3}, "to": {"row": 3, "col": 3}})
+        with client.websocket_connect(f"/games/{game_id}/ws", params={"since": 1}) as ws:
+            sync = ws.receive_json()
+            assert (sync["from_ply"], sync["seq"]) == (1, 2)
+            assert [move["from"] for move in sync["moves"]] == [{"row": 1, "col": 3}]
+            assert sync["take_me_state"]["must_capture"]
+
+            client.delete(f"/games/{game_id}")
+            assert ws.receive_json() == {"type": "ended"}
+
+    def test_game_updates_published_during_the_read(self, monkeypatch):
+        """An update published while the snapshot is being read still reaches the client"""
+        game_id = client.post("/games", json={
+            "game_mode": "2P",
+            "players": [{"name": "Alice"}, {"name": "Bob"}]
+        }).json()["id"]
+        snapshot = db.get_game(game_id)
+        moved = apply_turn(snapshot, build_human_move(snapshot, Square(row=6, col=4), Square(row=4, col=4)), False)
+
+        async def get_game_while_moving(game_id):
+            hub.publish_update(snapshot, moved)
+            return snapshot
+
+        monkeypatch.setattr(db, "get_game", get_game_while_moving)
+        with client.websocket_connect(f"/games/{game_id}/ws") as ws:
+            assert ws.receive_json()["seq"] == 0
+            delta = ws.receive_json()
+            assert delta["type"] == "delta" and (delta["from_ply"], delta["seq"]) == (0, 1)
+
+    def test_game_updates_resync_of_deleted_game(self, monkeypatch):
+        """A game deleted between the game read and the missed-moves read ends the stream"""
+        game_id = client.post("/games", json={
+            "game_mode": "2P",
+            "players": [{"name": "Alice"}, {"name": "Bob"}]
+        }).json()["id"]
+        client.post(f"/games/{game_id}/moves", json={"from": {"row": 6, "col": 4}, "to": {"row": 4, "col": 4}})
+
+        monkeypatch.setattr(db, "get_moves", lambda *args: None)
+        with client.websocket_connect(f"/games/{game_id}/ws", params={"since": 0}) as ws:
+            assert ws.receive_json() == {"type": "ended"}
+
     def test_leaderboard(self):
         """Test leaderboard endpoints"""
         # Get leaderboard
@@ -157,6 +316,33 @@ class TestGameAPI:
         })
         assert response.status_code == 200
 
+    def test_leaderboard_pages_and_ranks(self):
+        """Keyset pages walk the whole leaderboard; ranks count the rows ahead of a player"""
+        for i in range(7):
+            client.post("/leaderboard", json={"player_name": f"P{i}", "wins": i % 4, "losses": 0, "draws": 0,
+                                              "score": i, "game_mode": "2P" if i % 2 else "1P"})
+        order = [e["player_name"] for e in client.get("/leaderboard", params={"limit": 100}).json()]
+        assert order == ["P3", "P6", "P2", "P5", "P1", "P4", "P0"]
+
+        names, cursor = [], None
+        while True:
+            page = client.get("/leaderboard/page", params={"limit": 3, **({"cursor": cursor} if cursor else {})}).json()
+            names += [e["player_name"] for e in page["entries"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert names == order
+        page = client.get("/leaderboard/page", params={"game_mode": "2P", "limit": 2}).json()
+        assert [e["player_name"] for e in page["entries"]] == ["P3", "P5"]
+        assert client.get("/leaderboard/page", params={"cursor": "bad"}).status_code == 400
+
+        response = client.get("/leaderboard/rank/P5")
+        assert response.status_code == 200
+        [rank] = response.json()["ranks"]
+        assert (rank["game_mode"], rank["rank"], rank["overall_rank"]) == ("2P", 2, 4)
+        assert client.get("/leaderboard/rank/P4", params={"game_mode": "2P"}).status_code == 404
+        assert client.get("/leaderboard/rank/Nobody").status_code == 404
+
     def test_health_check(self):
         """Test health check endpoint"""
         response = client.get("/health")
@@ -200,6 +386,374 @@ class TestGameAPI:
         # take_me_state.declared should be False (as we reset it on penalty)
         assert data["take_me_state"]["declared"] == False
 
+    def test_move_and_bot_reply_written_once(self, monkeypatch):
+        """A human move and the bot reply are loaded once and persisted in one write"""
+        create_response = client.post("/games", json={
+            "game_mode": "1P",
+            "players": [
+                {"name": "Player 1"},
+                {"name": "", "is_bot": True}
+            ]
+        })
+        game_id = create_response.json()["id"]
+
+        calls = {"get_game": 0, "update_game": 0}
+        for name in calls:
+            original = getattr(db, name)
+
+            def counted(*args, _name=name, _original=original, **kwargs):
+                calls[_name] += 1
+                return _original(*args, **kwargs)
+            monkeypatch.setattr(db, name, counted)
+
+        response = client.post(f"/games/{game_id}/moves", json={
+            "from": {"row": 6, "col": 4},
+            "to": {"row": 4, "col": 4}
+        })
+        assert response.status_code == 200
+        assert calls == {"get_game": 1, "update_game": 1}
+
+        data = response.json()
+        assert data["current_turn"] == "white"
+        assert len(data["move_history"]) == 2
+        stored = client.get(f"/games/{game_id}").json()
+        assert stored["board"] == data["board"]
+        assert stored["position_history"] == data["position_history"]
+
+    def test_async_backend(self, tmp_path):
+        """An async driver URL selects the asyncio backend with the same operations"""
+        pytest.importorskip("aiosqlite")
+        async_db = create_database(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+        assert isinstance(async_db, AsyncSQLAlchemyDatabase)
+
+        async def scenario():
+            await async_db.create_tables()
+            game = await run_db(async_db.create_game, GameMode.TWO_PLAYER,
+                                [{"name": "Alice"}, {"name": "Bob"}])
+            game.players[1].score = 3
+            game.message = "hello"
+            await run_db(async_db.update_game, game, [LeaderboardEntry(
+                player_name="Alice", wins=1, losses=0, draws=0, score=0,
+                game_mode=GameMode.TWO_PLAYER, last_played=game.created_at)])
+            loaded = await run_db(async_db.get_game, game.id)
+            leaderboard = await run_db(async_db.get_leaderboard)
+            deleted = await run_db(async_db.delete_game, game.id)
+            missing = await run_db(async_db.get_game, game.id)
+            await async_db.engine.dispose()
+            return loaded, leaderboard, deleted, missing
+
+        loaded, leaderboard, deleted, missing = asyncio.run(scenario())
+        assert loaded.message == "hello"
+        assert loaded.players[1].score == 3
+        assert [(e.player_name, e.wins) for e in leaderboard] == [("Alice", 1)]
+        assert deleted and missing is None
+
+    def test_game_cache_write_behind(self, tmp_path):
+        """Hot games skip the database; updates are flushed later, on game end or on eviction"""
+        cached_db = SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'cache.db'}",
+                                       CacheSettings(max_games=2, write_behind_ms=1000))
+        uncached_db = SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'cache.db'}", CacheSettings(max_games=0))
+        game = cached_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+
+        # Served from memory, and the update is only written on flush
+        assert cached_db.get_game(game.id) is game
+        moved = game.model_copy(update={"message": "pending"})
+        cached_db.update_game(moved)
+        assert cached_db.get_game(game.id) is moved
+        assert uncached_db.get_game(game.id).message is None
+        assert cached_db.flush_games() == 1
+        assert uncached_db.get_game(game.id).message == "pending"
+
+        # A dirty game pushed out by newer ones is written on eviction
+        cached_db.update_game(moved.model_copy(update={"message": "evicted"}))
+        cached_db.create_game(GameMode.TWO_PLAYER, [{"name": "Carol"}, {"name": "Dave"}])
+        cached_db.create_game(GameMode.TWO_PLAYER, [{"name": "Erin"}, {"name": "Frank"}])
+        assert len(cached_db.cache) == 2
+        assert uncached_db.get_game(game.id).message == "evicted"
+
+        # Finished games are written at once
+        finished = moved.model_copy(update={"status": GameStatus.DRAW})
+        cached_db.update_game(finished)
+        assert uncached_db.get_game(game.id).status == GameStatus.DRAW
+        assert cached_db.cache.stats()["dirty"] == 0
+
+    def test_stale_updates_are_rejected(self, tmp_path):
+        """A turn computed from an old version is not written, and a flush never overwrites a newer game"""
+        url = f"sqlite:///{tmp_path / 'versions.db'}"
+        first_db = SQLAlchemyDatabase(url, CacheSettings(max_games=0))
+        second_db = SQLAlchemyDatabase(url, CacheSettings(max_games=10, write_behind_ms=1000))
+        game = first_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+        loaded = second_db.get_game(game.id)
+
+        e4 = build_human_move(game, Square(row=6, col=4), Square(row=4, col=4))
+        d4 = build_human_move(game, Square(row=6, col=3), Square(row=4, col=3))
+        moved = first_db.update_game(apply_turn(game, e4, False), expected_version=game.version)
+        with pytest.raises(StaleGameError):
+            first_db.update_game(apply_turn(game, d4, False), expected_version=game.version)
+        e5 = build_human_move(moved, Square(row=1, col=4), Square(row=3, col=4))
+        moved = first_db.update_game(apply_turn(moved, e5, False), expected_version=moved.version)
+
+        # The other process still caches the first version; its flush must not overwrite newer moves
+        second_db.update_game(apply_turn(loaded, d4, False), expected_version=loaded.version)
+        with pytest.raises(StaleGameError):
+            second_db.update_game(apply_turn(loaded, d4, False), expected_version=loaded.version)
+        assert second_db.flush_games() == 1
+        assert len(second_db.cache) == 0
+
+        stored = first_db.get_game(game.id)
+        assert stored.version == game.version + 2
+        assert [move.to for move in stored.move_history] == [Square(row=4, col=4), Square(row=3, col=4)]
+
+    def test_move_log_is_append_only(self, sqlite_db):
+        """Each save inserts only new plies; legacy JSON histories are migrated once"""
+        move_db = sqlite_db
+        game = move_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+        game = _play_moves(move_db, game, CAPTURE_LINE)
+
+        session = move_db.get_session()
+        try:
+            rows = session.query(DBMove).filter(DBMove.game_id == game.id).order_by(DBMove.ply).all()
+            assert [row.ply for row in rows] == [0, 1, 2]
+            db_game = session.query(DBGame).filter(DBGame.id == game.id).first()
+            assert db_game.move_count == 3
+            assert json.loads(db_game.move_history_json) == []
+
+            # Turn it back into a pre-moves-table game
+            db_game.move_count = None
+            db_game.move_history_json = json.dumps([m.model_dump(by_alias=True) for m in game.move_history])
+            db_game.position_history_json = json.dumps(game.position_history)
+            session.query(DBMove).delete()
+            session.commit()
+        finally:
+            session.close()
+
+        loaded = move_db.get_game(game.id)
+        assert loaded.move_count == 3
+        assert loaded.position_history == game.position_history
+        assert move_db.get_moves(game.id, 1, 1) == ([game.move_history[1]], 3)
+        move_db.update_game(loaded)
+        reloaded = move_db.get_game(game.id)
+        assert reloaded.move_history == game.move_history
+        assert reloaded.position_history == game.position_history
+        assert move_db.get_moves(game.id, 2, 5) == ([game.move_history[2]], 3)
+
+    def test_fixed_statement_counts(self, sqlite_db, tmp_path):
+        """Each operation runs a fixed number of statements, whatever the history length"""
+        count_db = sqlite_db
+        with count_statements(count_db.engine) as statements:
+            game = count_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+        assert len(statements) == 2
+        for ply in CAPTURE_LINE:
+            with count_statements(count_db.engine) as statements:
+                game = _play_moves(count_db, game, [ply])
+            # lookup, moves insert and game update, plus one update for all changed scores
+            assert len(statements) == (4 if game.move_history[-1].captured_piece else 3)
+        with count_statements(count_db.engine) as statements:
+            assert count_db.get_game(game.id).move_count == 3
+        assert len(statements) == 2
+        with count_statements(count_db.engine) as statements:
+            assert count_db.get_moves(game.id, 0, 10)[1] == 3
+        assert len(statements) == 2
+        with count_statements(count_db.engine) as statements:
+            assert count_db.delete_game(game.id)
+        assert len(statements) == 3
+        assert not count_db.delete_game(game.id)
+
+        pytest.importorskip("aiosqlite")
+        async_db = AsyncSQLAlchemyDatabase(f"sqlite+aiosqlite:///{tmp_path / 'count_async.db'}",
+                                           CacheSettings(max_games=0))
+
+        async def scenario():
+            await async_db.create_tables()
+            game = await async_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+            move = build_human_move(game, Square(row=6, col=4), Square(row=4, col=4))
+            with count_statements(async_db.engine) as statements:
+                await async_db.update_game(apply_turn(game, move, False))
+            assert len(statements) == 3
+            with count_statements(async_db.engine) as statements:
+                assert (await async_db.get_game(game.id)).move_count == 1
+            assert len(statements) == 2
+            await async_db.engine.dispose()
+
+        asyncio.run(scenario())
+
+    def test_leaderboard_upsert(self, tmp_path):
+        """Results are added with one upsert per game; duplicate rows from older databases are merged"""
+        path = tmp_path / "leaderboard.db"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE leaderboard (id INTEGER PRIMARY KEY, player_name VARCHAR, game_mode VARCHAR, "
+                     "wins INTEGER, losses INTEGER, draws INTEGER, score INTEGER, last_played DATETIME)")
+        conn.executemany("INSERT INTO leaderboard (player_name, game_mode, wins, losses, draws, score, last_played) "
+                         "VALUES (?, '2P', ?, 0, 0, 1, '2024-01-01 00:00:00')", [("Alice", 1), ("Alice", 2), ("Bob", 1)])
+        conn.commit()
+        conn.close()
+
+        board_db = SQLAlchemyDatabase(f"sqlite:///{path}", CacheSettings(max_games=0))
+        assert [(e.player_name, e.wins, e.score) for e in board_db.get_leaderboard()] == [("Alice", 3, 2), ("Bob", 1, 1)]
+        indexes = {i["name"]: i["unique"] for i in sqlalchemy.inspect(board_db.engine).get_indexes("leaderboard")}
+        assert indexes["ux_leaderboard_player_mode"]
+
+        game = board_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Alice"}])
+        game = game.model_copy(update={"status": GameStatus.WIN, "winner": game.players[0]})
+        with count_statements(board_db.engine) as statements:
+            board_db.update_game(game, leaderboard_entries(game))
+        assert sum(statement.startswith("INSERT INTO leaderboard") for statement in statements) == 1
+        alice = board_db.get_leaderboard(GameMode.TWO_PLAYER)[0]
+        assert (alice.player_name, alice.wins, alice.losses) == ("Alice", 4, 1)
+
+    def test_leaderboard_cache(self, tmp_path):
+        """Top lists are served from memory and follow recorded results until they expire"""
+        board_db = SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'top.db'}", CacheSettings(max_games=0),
+                                      LeaderboardCacheSettings(size=2, ttl_seconds=60))
+
+        def record(name, wins, game_mode=GameMode.TWO_PLAYER, score=0):
+            board_db.add_leaderboard_entry(LeaderboardEntry(
+                player_name=name, wins=wins, losses=0, draws=0, score=score, game_mode=game_mode))
+
+        def names(game_mode=None, limit=2):
+            return [e.player_name for e in board_db.get_leaderboard(game_mode, limit)]
+
+        record("Alice", 3)
+        record("Bob", 2)
+        record("Carol", 1)
+        record("Dave", 5, GameMode.SINGLE_PLAYER)
+        assert names() == ["Dave", "Alice"]
+        assert names(GameMode.TWO_PLAYER) == ["Alice", "Bob"]
+        assert names(GameMode.SINGLE_PLAYER) == ["Dave"]  # fewer rows than the cache size
+        with count_statements(board_db.engine) as statements:
+            assert names(GameMode.TWO_PLAYER, 1) == ["Alice"]
+            record("Carol", 3)  # passes Bob and Alice and enters the list first
+            assert names(GameMode.TWO_PLAYER) == ["Carol", "Alice"]
+            record("Bob", 4, GameMode.SINGLE_PLAYER)  # a new row in a list holding every row
+            assert names(GameMode.SINGLE_PLAYER) == ["Dave", "Bob"]
+            assert names() == ["Dave", "Bob"]  # ties with Carol, and the later row ranks first
+            record("Alice", 0, score=-5)  # the last listed row drops: the list is reloaded
+            assert names(GameMode.TWO_PLAYER) == ["Carol", "Alice"]
+        assert [s.split()[0] for s in statements] == ["INSERT", "INSERT", "INSERT", "SELECT"]
+        # Larger limits than the cached list go to the database
+        assert names(GameMode.TWO_PLAYER, 3) == ["Carol", "Alice", "Bob"]
+
+        # Another process's write shows up once the list expires
+        other = SQLAlchemyDatabase(f"sqlite:///{tmp_path / 'top.db'}", CacheSettings(max_games=0))
+        other.add_leaderboard_entry(LeaderboardEntry(
+            player_name="Erin", wins=9, losses=0, draws=0, score=0, game_mode=GameMode.TWO_PLAYER))
+        assert names(GameMode.TWO_PLAYER)[0] != "Erin"
+        board_db.leaderboard_cache = LeaderboardCache(LeaderboardCacheSettings(size=2, ttl_seconds=0))
+        assert names(GameMode.TWO_PLAYER)[0] == "Erin"
+
+    def test_archive_finished_and_purge_abandoned(self, sqlite_db):
+        """Old finished games move to the archive and stay readable; old active games are deleted"""
+        archive_db = sqlite_db
+        players = [{"name": "Alice"}, {"name": "Bob"}]
+        finished, abandoned, recent = (archive_db.create_game(GameMode.TWO_PLAYER, players) for _ in range(3))
+        finished = _play_moves(archive_db, finished, CAPTURE_LINE)
+        archive_db.update_game(finished.model_copy(update={"status": GameStatus.WIN, "winner": finished.players[0]}))
+        _play_moves(archive_db, abandoned, [((6, 0), (5, 0))])
+
+        session = archive_db.get_session()
+        try:
+            session.query(DBGame).filter(DBGame.id.in_([finished.id, abandoned.id])).update(
+                {DBGame.updated_at: datetime.utcnow() - timedelta(days=10)})
+            session.commit()
+        finally:
+            session.close()
+        before = archive_db.get_game(finished.id)
+
+        settings = ArchiveSettings(finished_after_seconds=3600, abandoned_after_seconds=86400, batch_size=1)
+        assert archive_db.archive_games(settings) == (1, 1)
+        assert archive_db.archive_games(settings) == (0, 0)
+        session = archive_db.get_session()
+        try:
+            assert [row.id for row in session.query(DBGame.id)] == [recent.id]
+            assert session.query(DBMove).count() == 0
+        finally:
+            session.close()
+
+        after = archive_db.get_game(finished.id)
+        assert after.model_dump() == before.model_dump()
+        assert after.position_counts == before.position_counts
+        assert archive_db.get_game_version(finished.id) == before.version
+        assert archive_db.get_moves(finished.id, 1, 5) == (before.move_history[1:], 3)
+        assert archive_db.get_game(abandoned.id) is None
+        assert archive_db.delete_game(finished.id)
+        assert archive_db.get_game(finished.id) is None
+
+    def test_binary_state_encoding(self, sqlite_db):
+        """Board and Take Me! state are stored as one blob; JSON rows still load and migrate"""
+        state_db = sqlite_db
+        game = state_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+        game = _play_moves(state_db, game, CAPTURE_LINE[:1])
+        game = _play_moves(state_db, game, CAPTURE_LINE[1:2], declare_take_me=True)
+        assert game.take_me_state.must_capture
+
+        session = state_db.get_session()
+        try:
+            db_game = session.query(DBGame).filter(DBGame.id == game.id).first()
+            assert db_game.board_json is None
+            assert len(db_game.state_blob) < 100
+            assert decode_state(db_game.state_blob) == (game.board, game.take_me_state, game.piece_count)
+
+            # Turn it back into a JSON-encoded game
+            db_game.state_blob = None
+            db_game.board_json = json.dumps(game.board.model_dump())
+            db_game.take_me_state_json = game.take_me_state.model_dump_json()
+            db_game.piece_count_json = json.dumps(game.piece_count)
+            session.commit()
+        finally:
+            session.close()
+
+        loaded = state_db.get_game(game.id)
+        assert (loaded.board, loaded.take_me_state, loaded.piece_count) == \
+            (game.board, game.take_me_state, game.piece_count)
+        state_db.update_game(loaded)
+        session = state_db.get_session()
+        try:
+            db_game = session.query(DBGame).filter(DBGame.id == game.id).first()
+            assert db_game.state_blob is not None and db_game.take_me_state_json is None
+        finally:
+            session.close()
+
+    def test_trusted_load_matches_validation(self, sqlite_db):
+        """Games are loaded without revalidation but equal a fully validated load"""
+        load_db = sqlite_db
+        game = load_db.create_game(GameMode.TWO_PLAYER, [{"name": "Alice"}, {"name": "Bob"}])
+        game = _play_moves(load_db, game, CAPTURE_LINE)
+
+        loaded = load_db.get_game(game.id)
+        validated = GameState.model_validate(loaded.model_dump())
+        validated.position_counts = loaded.position_counts
+        assert loaded == validated
+        assert loaded.current_turn is PieceColor.BLACK
+        assert loaded.move_history[2].captured_piece == Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
+        assert loaded.model_dump_json() == validated.model_dump_json()
+
+    def test_history_pagination_and_truncation(self):
+        """Responses can leave out history, which is paged from its own endpoint"""
+        create_response = client.post("/games", json={
+            "game_mode": "1P",
+            "players": [
+                {"name": "Player 1"},
+                {"name": "", "is_bot": True}
+            ]
+        })
+        game_id = create_response.json()["id"]
+
+        response = client.post(f"/games/{game_id}/moves", params={"history_limit": 0}, json={
+            "from": {"row": 6, "col": 4},
+            "to": {"row": 4, "col": 4}
+        })
+        data = response.json()
+        assert data["move_history"] == []
+        assert data["move_count"] == 2
+
+        data = client.get(f"/games/{game_id}", params={"history_limit": 1}).json()
+        assert len(data["move_history"]) == 1
+        assert data["move_history"][0]["piece"]["color"] == "black"
+
+        page = client.get(f"/games/{game_id}/moves", params={"offset": 0, "limit": 1}).json()
+        assert page["move_count"] == 2
+        assert page["moves"][0]["from"] == {"row": 6, "col": 4}
+
 
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -0,0 +1,260 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from models import *
+from database import db
+from board_core import CompactBoard, initial_board
+import bot
+from bot import get_bot_move
+import bot_pool
+from bot_pool import compute_bot_move, configure_pool
+from search import SearchMove, SearchResult, TranspositionTable, expand_moves, search, EXACT
+import bitboard
+import tablebase
+import opening_book
+import selfplay
+
+client = TestClient(app)
+
+
+def empty_board() -> BoardState:
+    return BoardState(root=[[None for _ in range(8)] for _ in range(8)])
+
+
+class TestSearchBot:
+    def setup_method(self):
+        """Reset database before each test"""
+        db.clear_database()
+
+    def test_gives_away_last_piece_with_take_me(self):
+        """With one piece left the bot walks into a capture and declares"""
+        board = empty_board()
+        board[0][0] = Piece(type=PieceType.KING, color=PieceColor.BLACK)
+        board[2][1] = Piece(type=PieceType.ROOK, color=PieceColor.WHITE)
+        board[7][7] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+
+        result = get_bot_move(board, PieceColor.BLACK, difficulty=BotDifficulty.MEDIUM)
+        assert result.declare_take_me
+        core = CompactBoard.from_board_state(board, PieceColor.BLACK)
+        core.make_move(bitboard.square_index(result.move.from_), bitboard.square_index(result.move.to))
+        assert core.capture_mask(bitboard.WHITE)
+
+    def test_must_capture_restricts_search(self):
+        """After an opponent declaration the bot only plays captures"""
+        board = db._create_initial_board()
+        board[5][4] = Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
+        capturable = [Square(row=5, col=4)]
+
+        for difficulty in (BotDifficulty.MEDIUM, BotDifficulty.HARD):
+            result = get_bot_move(board, PieceColor.WHITE, True, capturable, difficulty)
+            assert result.move.to == Square(row=5, col=4)
+            assert result.move.captured_piece.color == PieceColor.BLACK
+
+    def test_node_budget_bounds_work(self):
+        """A node budget stops the search early but still returns a move"""
+        core = CompactBoard.from_board_state(db._create_initial_board())
+        result = search(core, depth=6, node_budget=2000)
+        assert result.move is not None
+        assert result.nodes <= 2000 + 1024
+
+    def test_time_budget_returns_last_completed_depth(self):
+        """Iterative deepening stops on the wall-clock budget with a usable move"""
+        core = CompactBoard.from_board_state(db._create_initial_board())
+        start = time.monotonic()
+        result = search(core, depth=20, time_budget_ms=50)
+        assert time.monotonic() - start < 0.5
+        assert result.move is not None
+        assert 1 <= result.depth < 20
+
+    def test_process_pool_search(self):
+        """Root moves split across a worker pool still give a legal move"""
+        board = db._create_initial_board()
+        configure_pool(2)
+        try:
+            result = asyncio.run(compute_bot_move(board, PieceColor.WHITE, difficulty=BotDifficulty.MEDIUM))
+        finally:
+            configure_pool(0)
+
+        assert result.nodes > 0
+        core = CompactBoard.from_board_state(board)
+        move = (bitboard.square_index(result.move.from_), bitboard.square_index(result.move.to))
+        assert move in core.generate_moves()
+
+    def test_share_results_compared_at_common_depth(self):
+        """A share that stopped early does not win on its shallow score"""
+        shallow_move, deep_move, other_move = (SearchMove(i, i + 8, 0, False) for i in range(3))
+        results = [
+            SearchResult(shallow_move, 300, 1, 10, ((shallow_move, 300),)),
+            SearchResult(deep_move, 40, 3, 90, ((other_move, 100), (other_move, 20), (deep_move, 40))),
+        ]
+        assert bot_pool.best_share_move(results) == (shallow_move, 1)
+        results[0] = SearchResult(shallow_move, 300, 2, 10, ((shallow_move, 50), (shallow_move, 10)))
+        assert bot_pool.best_share_move(results) == (other_move, 2)
+        assert bot_pool.best_share_move([SearchResult(deep_move, 0, 0, 5)]) == (deep_move, 0)
+
+    def test_in_process_search_runs_off_the_event_loop(self, monkeypatch):
+        """Without a worker pool the search runs on a worker thread"""
+        threads = []
+        monkeypatch.setattr(bot_pool, "get_bot_move", lambda *args: threads.append(threading.current_thread()))
+        asyncio.run(compute_bot_move(db._create_initial_board(), PieceColor.WHITE, difficulty=BotDifficulty.MEDIUM))
+        assert threads and threads[0] is not threading.main_thread()
+
+    def test_transposition_table_is_bounded(self):
+        """Deep entries survive shallower stores to the same bucket"""
+        tt = TranspositionTable(size_bits=2)
+        tt.new_search()
+        tt.store(0b100, 5, EXACT, 7, None)
+        tt.store(0b1000, 1, EXACT, 3, None)
+        assert tt.probe(0b100)[1] == 5
+        assert tt.probe(0b1000)[1] == 1
+        assert len(tt.entries) == 8
+
+    def test_bot_move_endpoint_difficulty(self):
+        """The bot endpoint accepts a difficulty override"""
+        create_response = client.post("/games", json={
+            "game_mode": "1P",
+            "bot_difficulty": "hard",
+            "players": [
+                {"name": "Player 1"},
+                {"name": "", "is_bot": True}
+            ]
+        })
+        data = create_response.json()
+        assert data["bot_difficulty"] == "hard"
+
+        response = client.post(f"/games/{data['id']}/moves", json={
+            "from": {"row": 6, "col": 4},
+            "to": {"row": 4, "col": 4}
+        })
+        assert response.status_code == 200
+        assert len(response.json()["move_history"]) == 2
+
+        create_response = client.post("/games", json={
+            "game_mode": "1P",
+            "players": [
+                {"name": "", "is_bot": True},
+                {"name": "Player 2"}
+            ]
+        })
+        game_id = create_response.json()["id"]
+        response = client.post(f"/games/{game_id}/bot-move", params={"difficulty": "medium"})
+        assert response.status_code == 200
+        bot_move = response.json()["botMove"]
+        assert bot_move["move"]["piece"]["color"] == "white"
+        assert bot_move["depth"] >= 1
+        assert bot_move["nodes"] > 0
+
+    def test_per_game_time_budget(self):
+        """A game's bot time budget is stored and used for bot turns"""
+        create_response = client.post("/games", json={
+            "game_mode": "1P",
+            "bot_difficulty": "hard",
+            "bot_time_budget_ms": 50,
+            "players": [
+                {"name": "", "is_bot": True},
+                {"name": "Player 2"}
+            ]
+        })
+        data = create_response.json()
+        assert data["bot_time_budget_ms"] == 50
+
+        start = time.monotonic()
+        response = client.post(f"/games/{data['id']}/bot-move")
+        assert response.status_code == 200
+        assert time.monotonic() - start < 1.0
+        assert response.json()["botMove"]["depth"] >= 1
+
+    def test_tablebase_plays_king_endgame(self, tmp_path):
+        """A generated, memory-mapped tablebase scores and plays a bare-king endgame"""
+        generator = tablebase.TablebaseGenerator()
+        generator.generate("Kk")
+        path = tmp_path / "tablebases.bin"
+        generator.write(str(path))
+
+        table = tablebase.Tablebase(str(path))
+        try:
+            squares = bytearray(64)
+            squares[0] = bitboard.KING + 1
+            squares[9] = bitboard.BLACK * 6 + bitboard.KING + 1
+            core = CompactBoard(squares, bitboard.WHITE)
+
+            # Forced to take the last black piece, white hands black the win
+            assert table.probe(core, True) == (tablebase.LOSS, 1)
+            # Otherwise white steps aside and declares Take Me
+            assert table.probe(core, False) == (tablebase.WIN, 2)
+            move, value = table.best_move(core, False)
+            assert move[3] and value == (tablebase.WIN, 2)
+
+            result = search(core, depth=3, tablebase=table)
+            assert result.score > 0
+        finally:
+            table.close()
+
+    def test_opening_book_answers_initial_position(self, tmp_path, monkeypatch):
+        """Book moves come back weighted from the mapped file and short-circuit search"""
+        core = CompactBoard.from_board_state(db._create_initial_board())
+        builder = opening_book.OpeningBookBuilder(depth=1)
+        builder.build(core, plies=1)
+        path = tmp_path / "opening_book.bin"
+        builder.write(str(path))
+
+        book = opening_book.OpeningBook(str(path))
+        try:
+            moves = book.moves(core, False)
+            assert moves == builder.entries[core.key]
+            assert max(weight for _, weight in moves) == opening_book.MAX_WEIGHT
+            assert book.moves(core, True) == []
+
+            monkeypatch.setattr(bot, "get_opening_book", lambda: book)
+            result = get_bot_move(db._create_initial_board(), PieceColor.WHITE,
+                                  difficulty=BotDifficulty.HARD)
+            assert result.nodes == 0
+            played = (bitboard.square_index(result.move.from_), bitboard.square_index(result.move.to))
+            assert played in [(move.from_sq, move.to_sq) for move, _ in moves]
+        finally:
+            book.close()
+
+    def test_opening_book_answers_every_first_move(self):
+        """The bot playing black is in book whatever white opens with; white's own choices are pruned"""
+        core = CompactBoard.from_board_state(db._create_initial_board())
+        builder = opening_book.OpeningBookBuilder(depth=2)
+        builder.build(core, plies=2)
+
+        first_moves = expand_moves(core, False)
+        assert len(builder.entries[core.key]) < len(first_moves)
+        for from_sq, to_sq, promotion in first_moves:
+            core.make_move(from_sq, to_sq, promotion)
+            try:
+                assert builder.entries.get(opening_book.book_key(core, False))
+            finally:
+                core.unmake_move()
+
+    def test_selfplay_games_are_reproducible(self, tmp_path):
+        """Self-play follows the game rules, is seeded, and round-trips through a dump"""
+        records = selfplay.run_selfplay(3, 0, BotDifficulty.EASY, BotDifficulty.EASY, max_plies=200)
+        assert records[0].moves == selfplay.play_game(0, max_plies=200).moves
+
+        path = tmp_path / "games.bin"
+        selfplay.write_games(str(path), records)
+        games = selfplay.read_games(str(path))
+        assert [result for result, _ in games] == [record.result for record in records]
+
+        for result, plies in games:
+            core = initial_board()
+            for from_sq, to_sq, flags in plies:
+                assert (from_sq, to_sq) in core.generate_moves()
+                core.make_move(from_sq, to_sq, (flags & 0x7) - 1)
+            if result == selfplay.WHITE_WIN:
+                assert not core.occupancy(bitboard.WHITE)
+            elif result == selfplay.BLACK_WIN:
+                assert not core.occupancy(bitboard.BLACK)
+
+        report = selfplay.summarize(records, 1.0)
+        assert "games/sec: 3.00" in report
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,175 @@
+import pytest
+from pydantic import ValidationError
+from models import *
+from database import db
+from game_logic import (
+    get_legal_moves, get_capture_moves, check_stalemate, build_attack_map,
+    find_exposed_pieces, get_capturable_pieces_after_take_me, execute_move,
+    get_board_hash, get_position_hash, next_position_hash
+)
+import bitboard
+import zobrist
+from board_core import CompactBoard
+
+
+def empty_board() -> BoardState:
+    return BoardState(root=[[None for _ in range(8)] for _ in range(8)])
+
+
+def squares(moves):
+    return sorted((m.row, m.col) for m in moves)
+
+
+class TestBitboardMoveGeneration:
+    def test_initial_position_move_count(self):
+        """White has the usual 20 opening moves"""
+        board = db._create_initial_board()
+        bbs = bitboard.from_board(board)
+        assert len(bitboard.generate_moves(bbs, bitboard.WHITE)) == 20
+        assert len(bitboard.generate_moves(bbs, bitboard.BLACK)) == 20
+
+    def test_pawn_double_move_blocked(self):
+        """A pawn cannot jump over a piece on its double move"""
+        board = empty_board()
+        board[6][4] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        board[5][4] = Piece(type=PieceType.KNIGHT, color=PieceColor.BLACK)
+        board[5][3] = Piece(type=PieceType.ROOK, color=PieceColor.BLACK)
+        assert squares(get_legal_moves(board, Square(row=6, col=4))) == [(5, 3)]
+
+    def test_sliders_stop_at_blockers(self):
+        """Rook rays stop on the first piece and only capture enemies"""
+        board = empty_board()
+        board[4][4] = Piece(type=PieceType.ROOK, color=PieceColor.WHITE)
+        board[4][6] = Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
+        board[2][4] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        moves = squares(get_legal_moves(board, Square(row=4, col=4)))
+        assert (4, 6) in moves and (4, 7) not in moves
+        assert (3, 4) in moves and (2, 4) not in moves
+        assert len(moves) == 2 + 1 + 3 + 4
+
+    def test_king_is_an_ordinary_piece(self):
+        """Kings may move next to enemy kings and be captured; no castling"""
+        board = db._create_initial_board()
+        board[7][5] = None
+        board[7][6] = None
+        assert get_legal_moves(board, Square(row=7, col=4)) == [Square(row=7, col=5)]
+
+        board = empty_board()
+        board[4][4] = Piece(type=PieceType.KING, color=PieceColor.WHITE)
+        board[3][4] = Piece(type=PieceType.KING, color=PieceColor.BLACK)
+        captures = get_capture_moves(board, PieceColor.WHITE)
+        assert [(f.row, f.col, t.row, t.col) for f, t in captures] == [(4, 4, 3, 4)]
+
+    def test_stalemate(self):
+        """A blocked pawn with no captures has no moves"""
+        board = empty_board()
+        board[6][0] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        board[5][0] = Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
+        assert check_stalemate(board, PieceColor.WHITE)
+        assert check_stalemate(board, PieceColor.BLACK)
+
+
+class TestAttackMap:
+    def test_counts_and_exposure(self):
+        """One map answers both exposure and capturability queries"""
+        board = empty_board()
+        board[4][4] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        board[3][3] = Piece(type=PieceType.KNIGHT, color=PieceColor.BLACK)
+        board[0][3] = Piece(type=PieceType.ROOK, color=PieceColor.WHITE)
+        board[1][1] = Piece(type=PieceType.BISHOP, color=PieceColor.WHITE)
+        board[5][4] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        attack_map = build_attack_map(board)
+
+        assert attack_map.attackers(bitboard.WHITE, 3 * 8 + 3) == 3
+        assert find_exposed_pieces(board, PieceColor.BLACK, attack_map) == [Square(row=3, col=3)]
+        assert get_capturable_pieces_after_take_me(board, PieceColor.WHITE, attack_map) == [Square(row=3, col=3)]
+        assert find_exposed_pieces(board, PieceColor.WHITE, attack_map) == [Square(row=5, col=4)]
+
+    def test_capturable_pieces_in_board_order(self):
+        """Capturable pieces come back sorted by row, then column, whatever attacks them"""
+        board = empty_board()
+        board[6][6] = Piece(type=PieceType.ROOK, color=PieceColor.WHITE)
+        board[6][1] = Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
+        board[2][6] = Piece(type=PieceType.KNIGHT, color=PieceColor.BLACK)
+        board[5][5] = Piece(type=PieceType.BISHOP, color=PieceColor.BLACK)
+        board[7][6] = Piece(type=PieceType.PAWN, color=PieceColor.BLACK)
+
+        assert get_capturable_pieces_after_take_me(board, PieceColor.WHITE) == [
+            Square(row=2, col=6), Square(row=6, col=1), Square(row=7, col=6)
+        ]
+
+
+class TestPositionHash:
+    def test_incremental_hash_matches_full_hash(self):
+        """Capture and promotion deltas give the same key as hashing from scratch"""
+        board = empty_board()
+        board[1][0] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        board[0][1] = Piece(type=PieceType.ROOK, color=PieceColor.BLACK)
+        start = get_position_hash(board, PieceColor.WHITE, True)
+        move = Move(
+            from_=Square(row=1, col=0),
+            to=Square(row=0, col=1),
+            piece=board[1][0],
+            captured_piece=board[0][1],
+            is_promotion=True,
+            promotion_piece=PieceType.KING
+        )
+        new_board = execute_move(board, move)
+
+        incremental = next_position_hash(start, move, new_board, PieceColor.BLACK, True, False)
+        assert incremental == get_position_hash(new_board, PieceColor.BLACK, False)
+        assert incremental != get_position_hash(new_board, PieceColor.WHITE, False)
+        assert incremental != get_position_hash(new_board, PieceColor.BLACK, True)
+
+    def test_legacy_history_keeps_legacy_hashes(self):
+        """Games stored with string hashes continue with string hashes"""
+        board = db._create_initial_board()
+        legacy = get_board_hash(board, PieceColor.WHITE, False)
+        move = Move(from_=Square(row=6, col=4), to=Square(row=4, col=4), piece=board[6][4])
+        new_board = execute_move(board, move)
+
+        assert next_position_hash(legacy, move, new_board, PieceColor.BLACK, False, False) == \
+            get_board_hash(new_board, PieceColor.BLACK, False)
+
+
+class TestCompactBoard:
+    def test_make_unmake_round_trip(self):
+        """make_move/unmake_move restore squares, bitboards and the Zobrist key"""
+        board = db._create_initial_board()
+        board[1][0] = Piece(type=PieceType.PAWN, color=PieceColor.WHITE)
+        core = CompactBoard.from_board_state(board)
+        before = (bytes(core.squares), core.bbs[:], core.key, core.turn)
+
+        captured = core.make_move(1 * 8 + 0, 0 * 8 + 1, bitboard.KING)
+        assert core.piece(1) == Piece(type=PieceType.KING, color=PieceColor.WHITE)
+        assert captured and core.piece_count(bitboard.BLACK) == 14
+        assert core.key == zobrist.hash_bitboards(core.bbs, bitboard.BLACK, False)
+
+        core.unmake_move()
+        assert (bytes(core.squares), core.bbs, core.key, core.turn) == before
+        assert core.to_board_state() == board
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
+
+
+class TestInterning:
+    def test_squares_and_pieces_are_shared(self):
+        board = db._create_initial_board()
+        assert board[6][0] is board[6][7] is PIECES[(PieceType.PAWN, PieceColor.WHITE)]
+        targets = get_legal_moves(board, Square(row=7, col=1))
+        assert targets[0] is SQUARES[targets[0].row * 8 + targets[0].col]
+        assert CompactBoard.from_board_state(board).to_board_state()[0][4] is board[0][4]
+
+        move = Move.model_validate_json(
+            '{"from": {"row": 6, "col": 4}, "to": {"row": 4, "col": 4}, '
+            '"piece": {"type": "pawn", "color": "white"}}'
+        )
+        assert move.from_ is SQUARES[52] and move.to is SQUARES[36]
+        assert move.piece is PIECES[(PieceType.PAWN, PieceColor.WHITE)]
+        with pytest.raises(ValidationError):
+            Move.model_validate({"from": {"row": 8, "col": 0}, "to": {"row": 0, "col": 0},
+                                 "piece": {"type": "pawn", "color": "white"}})
+        with pytest.raises(ValidationError):
+            SQUARES[0].row = 1
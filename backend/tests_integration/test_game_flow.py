@@ -114,6 +114,31 @@ class TestGameFlow:
         # However, if we wanted to verify the penalty logic specifically, we'd need to force a declaration.
         pass
 
+    def test_threefold_repetition_is_a_draw(self, client):
+        """Shuffling knights back to the start position three times draws the game"""
+        create_response = client.post("/games", json={
+            "game_mode": "2P",
+            "players": [{"name": "P1"}, {"name": "P2"}]
+        })
+        game_id = create_response.json()["id"]
+
+        shuffle = [
+            ((7, 6), (5, 5)), ((0, 6), (2, 5)),
+            ((5, 5), (7, 6)), ((2, 5), (0, 6)),
+        ]
+        for _ in range(2):
+            for (fr, fc), (tr, tc) in shuffle:
+                response = client.post(f"/games/{game_id}/moves", json={
+                    "from": {"row": fr, "col": fc},
+                    "to": {"row": tr, "col": tc}
+                })
+                assert response.status_code == 200
+
+        data = response.json()
+        assert data["status"] == "draw"
+        assert "position_counts" not in data
+        assert len(data["position_history"]) == 9
+
     def test_invalid_game_id(self, client):
         """Test requesting a non-existent game"""
         response = client.get("/games/game_nonexistent_12345")
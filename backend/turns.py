@@ -0,0 +1,215 @@
+"""Turn execution shared by the move, Take Me! and bot endpoints.
+
+A turn is validated, played on a CompactBoard, scored and checked for game
+over entirely in memory; the caller persists the resulting GameState once.
+A human move in a 1P game and the bot's reply are processed in one pass
+(``play_turn``), so the game is loaded once and written in one transaction.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from models import (
+    BotMoveResponse, GameMode, GameState, GameStatus, LeaderboardEntry, Move,
+    PieceColor, PieceType, Square, TakeMeState
+)
+from game_logic import (
+    PIECE_VALUES, apply_move, evaluate_game_over, find_exposed_pieces, get_capturable_pieces_after_take_me,
+    get_legal_moves, legal_move_index, must_capture_mask, next_position_hash, record_position, should_promote
+)
+from board_core import CompactBoard
+import bitboard
+from bitboard import WHITE, BLACK
+from bot_pool import compute_bot_move
+
+TAKE_WHO_PENALTY = 5
+TAKE_WHO_MESSAGE = "take who??"
+
+
+class TurnError(Exception):
+    """A rejected turn; the endpoints turn it into an HTTP error"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def build_human_move(game_state: GameState, from_: Square, to: Square,
+                     promotion_piece: Optional[PieceType] = None) -> Move:
+    """Validate a human move for the side to move and build it"""
+    if game_state.status != GameStatus.ACTIVE:
+        raise TurnError(400, "Game is not active")
+
+    # Check if it's the player's turn
+    piece = game_state.board[from_.row][from_.col]
+    if not piece or piece.color != game_state.current_turn:
+        raise TurnError(403, "Not your turn")
+
+    # Validate the move against the turn's legal move index (must-capture already applied)
+    targets = legal_move_index(game_state).get(bitboard.square_index(from_), 0)
+    if not targets >> bitboard.square_index(to) & 1:
+        if (game_state.take_me_state.must_capture
+                and any(move.row == to.row and move.col == to.col
+                        for move in get_legal_moves(game_state.board, from_))):
+            raise TurnError(400, "Must capture exposed piece")
+        raise TurnError(400, "Invalid move")
+
+    promotes = should_promote(piece, to.row)
+    return Move(
+        from_=from_,
+        to=to,
+        piece=piece,
+        captured_piece=game_state.board[to.row][to.col],
+        is_promotion=promotes,
+        promotion_piece=promotion_piece if promotes else None
+    )
+
+
+def apply_turn(game_state: GameState, move: Move, declare_take_me: bool) -> GameState:
+    """Play a validated move (and optional Take Me! declaration) and return the new state"""
+    mover = game_state.current_turn
+    next_turn = PieceColor.BLACK if mover == PieceColor.WHITE else PieceColor.WHITE
+
+    # Execute the move on the compact board
+    core = CompactBoard.from_board_state(game_state.board, mover)
+    apply_move(core, move)
+    new_board = core.to_board_state()
+    new_piece_count = {"white": core.piece_count(WHITE), "black": core.piece_count(BLACK)}
+
+    take_me_state = TakeMeState(declared=False, exposed_pieces=[], capturable_pieces=[], must_capture=False)
+    if declare_take_me:
+        # Find exposed pieces and capturable pieces from a single attack map
+        attack_map = core.attack_map()
+        capturable_pieces = get_capturable_pieces_after_take_me(new_board, next_turn, attack_map)
+        take_me_state = TakeMeState(
+            declared=True,
+            declarer=mover,
+            exposed_pieces=find_exposed_pieces(new_board, mover, attack_map),
+            capturable_pieces=capturable_pieces,
+            must_capture=len(capturable_pieces) > 0
+        )
+
+    new_position_hash = next_position_hash(
+        game_state.position_history[-1] if game_state.position_history else None,
+        move, new_board, next_turn,
+        game_state.take_me_state.must_capture, take_me_state.must_capture
+    )
+    new_position_history, new_position_counts = record_position(game_state, new_position_hash)
+
+    game_over = evaluate_game_over(core, game_state.players, must_capture_mask(take_me_state),
+                                   new_position_counts[new_position_hash])
+
+    players = [player.model_copy() for player in game_state.players]
+
+    # Award points to the player whose piece was captured
+    if move.captured_piece:
+        for player in players:
+            if player.color == move.captured_piece.color:
+                player.score += PIECE_VALUES.get(move.captured_piece.type, 0)
+                break
+
+    # CHECK FOR PENALTY: "Take Me!" but no captures possible
+    message = None
+    if take_me_state.declared and not take_me_state.must_capture:
+        take_me_state.declared = False
+        message = TAKE_WHO_MESSAGE
+        for player in players:
+            if player.color == mover:
+                player.score -= TAKE_WHO_PENALTY
+                break
+
+    winner = None
+    if game_over and game_over[1]:
+        winner = next(p for p in players if p.id == game_over[1].id)
+
+    return game_state.model_copy(update={
+        "board": new_board,
+        "current_turn": next_turn,
+        "players": players,
+        "selected_piece": None,
+        "legal_moves": [],
+        "legal_move_index": None,
+        "take_me_state": take_me_state,
+        "message": message,
+        "move_history": game_state.move_history + [move],
+        "move_count": game_state.move_count + 1,
+        "version": game_state.version + 1,
+        "position_history": new_position_history,
+        "position_counts": new_position_counts,
+        "piece_count": new_piece_count,
+        "status": game_over[0] if game_over else GameStatus.ACTIVE,
+        "winner": winner,
+        "updated_at": datetime.now()
+    })
+
+
+def is_bot_turn(game_state: GameState) -> bool:
+    return (game_state.status == GameStatus.ACTIVE
+            and any(p.is_bot and p.color == game_state.current_turn for p in game_state.players))
+
+
+async def play_bot_turn(game_state: GameState, difficulty=None) -> Tuple[GameState, Optional[BotMoveResponse]]:
+    """Let the bot to move reply; the game is drawn when it has no moves"""
+    bot_result = await compute_bot_move(
+        game_state.board,
+        game_state.current_turn,
+        game_state.take_me_state.must_capture,
+        game_state.take_me_state.capturable_pieces,
+        difficulty or game_state.bot_difficulty,
+        game_state.bot_time_budget_ms
+    )
+    if not bot_result:
+        return game_state.model_copy(update={
+            "status": GameStatus.DRAW,
+            "version": game_state.version + 1,
+            "updated_at": datetime.now()
+        }), None
+
+    updated_game = apply_turn(game_state, bot_result.move, bot_result.declare_take_me)
+    if updated_game.message is None:
+        # A bot reply only replaces the human's message with its own penalty
+        updated_game.message = game_state.message
+    return updated_game, bot_result
+
+
+async def play_turn(game_state: GameState, from_: Square, to: Square,
+                    promotion_piece: Optional[PieceType], declare_take_me: bool) -> GameState:
+    """A human move followed by the bot's reply when the bot is next"""
+    move = build_human_move(game_state, from_, to, promotion_piece)
+    updated_game = apply_turn(game_state, move, declare_take_me)
+    if is_bot_turn(updated_game):
+        updated_game, _ = await play_bot_turn(updated_game)
+    return updated_game
+
+
+def leaderboard_entries(game_state: GameState) -> List[LeaderboardEntry]:
+    """Leaderboard entries for all human players once the game has ended"""
+    if game_state.status not in [GameStatus.WIN, GameStatus.DRAW]:
+        return []
+
+    # Map game mode
+    game_mode = GameMode.SINGLE_PLAYER if any(p.is_bot for p in game_state.players) else GameMode.TWO_PLAYER
+
+    entries = []
+    for player in game_state.players:
+        if player.is_bot:
+            continue
+
+        wins = losses = draws = 0
+        if game_state.status == GameStatus.DRAW:
+            draws = 1
+        elif game_state.winner and game_state.winner.id == player.id:
+            wins = 1
+        else:
+            losses = 1
+
+        entries.append(LeaderboardEntry(
+            player_name=player.name,
+            wins=wins,
+            losses=losses,
+            draws=draws,
+            score=player.score,
+            game_mode=game_mode,
+            last_played=datetime.now()
+        ))
+    return entries
@@ -0,0 +1,63 @@
+"""Zobrist hashing of Take-Me positions.
+
+A position key XORs one random 64-bit value per (piece, square) plus a key for
+black to move and one for a pending must-capture. Keys are persisted in
+``position_history``, so the tables come from a fixed seed and stay identical
+across processes and restarts.
+"""
+import random
+from typing import List
+import bitboard
+
+_rng = random.Random(0x54414B454D45)
+
+PIECE_KEYS = tuple(tuple(_rng.getrandbits(64) for _ in range(64)) for _ in range(12))
+BLACK_TO_MOVE = _rng.getrandbits(64)
+MUST_CAPTURE = _rng.getrandbits(64)
+
+# Stored hashes are "z" + 16 hex digits; anything else is a legacy board string
+HASH_PREFIX = "z"
+
+
+def hash_bitboards(bbs: List[int], color_to_move: int, must_capture: bool) -> int:
+    """Compute a position key from scratch"""
+    key = BLACK_TO_MOVE if color_to_move == bitboard.BLACK else 0
+    if must_capture:
+        key ^= MUST_CAPTURE
+    for index in range(12):
+        piece_keys = PIECE_KEYS[index]
+        for sq in bitboard.iter_bits(bbs[index]):
+            key ^= piece_keys[sq]
+    return key
+
+
+def move_delta(moved: int, from_sq: int, to_sq: int, placed: int, captured: int = -1) -> int:
+    """XOR delta for a move: piece leaves from_sq, placed lands on to_sq, side flips.
+
+    ``moved``, ``placed`` and ``captured`` are bitboard piece indices; ``placed``
+    differs from ``moved`` only on promotion and ``captured`` is -1 for quiet moves.
+    """
+    delta = PIECE_KEYS[moved][from_sq] ^ PIECE_KEYS[placed][to_sq] ^ BLACK_TO_MOVE
+    if captured >= 0:
+        delta ^= PIECE_KEYS[captured][to_sq]
+    return delta
+
+
+def update_hash(key: int, delta: int, must_capture_before: bool, must_capture_after: bool) -> int:
+    """Apply a move delta and the change in the must-capture flag"""
+    key ^= delta
+    if must_capture_before != must_capture_after:
+        key ^= MUST_CAPTURE
+    return key
+
+
+def format_hash(key: int) -> str:
+    return f"{HASH_PREFIX}{key:016x}"
+
+
+def is_zobrist_hash(value: str) -> bool:
+    return len(value) == 17 and value.startswith(HASH_PREFIX)
+
+
+def parse_hash(value: str) -> int:
+    return int(value[1:], 16)